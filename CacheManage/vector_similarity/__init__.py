@@ -1,8 +1,9 @@
 from .matcher import VectorSimilarityMatcher
-from .embeddings import EmbeddingProvider, SentenceTransformerEmbedding
+from .embeddings import EmbeddingProvider, SentenceTransformerEmbedding, quantize_int8
 
 __all__ = [
     'VectorSimilarityMatcher',
     'EmbeddingProvider',
-    'SentenceTransformerEmbedding'
+    'SentenceTransformerEmbedding',
+    'quantize_int8'
 ]
\ No newline at end of file
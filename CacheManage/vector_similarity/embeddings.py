@@ -5,6 +5,19 @@ from sentence_transformers import SentenceTransformer
 import threading
 
 
+def quantize_int8(embeddings: np.ndarray) -> np.ndarray:
+    """
+    对向量做逐向量对称int8量化
+    
+    每个向量按自身最大绝对值缩放到[-127, 127]。余弦相似度与向量缩放无关，
+    因此量化结果可直接用于余弦计算，例如 simsimd.cdist(q1, q2, metric='cosine')。
+    """
+    embeddings = np.asarray(embeddings, dtype=np.float32)
+    max_abs = np.max(np.abs(embeddings), axis=-1, keepdims=True)
+    max_abs[max_abs == 0] = 1.0
+    return np.round(embeddings * (127.0 / max_abs)).astype(np.int8)
+
+
 class EmbeddingProvider(ABC):
     """嵌入向量提供者抽象基类"""
     
@@ -13,6 +26,10 @@ class EmbeddingProvider(ABC):
         """将文本编码为向量"""
         pass
     
+    def encode_many(self, texts: List[str], batch_size: int = 64) -> np.ndarray:
+        """批量编码文本为向量"""
+        return self.encode(texts)
+    
     @abstractmethod
     def get_dimension(self) -> int:
         """获取向量维度"""
@@ -26,12 +43,18 @@ class SentenceTransformerEmbedding(EmbeddingProvider):
     _lock = threading.Lock()
     
     def __new__(cls, model_name: str = 'all-MiniLM-L6-v2'):
-        """单例模式，避免重复加载模型"""
+        """单例模式，避免重复加载模型（双重检查锁，实例创建后无需加锁）"""
+        instance = cls._instances.get(model_name)
+        if instance is not None:
+            return instance
+        
         with cls._lock:
-            if model_name not in cls._instances:
-                cls._instances[model_name] = super().__new__(cls)
-                cls._instances[model_name]._initialized = False
-            return cls._instances[model_name]
+            instance = cls._instances.get(model_name)
+            if instance is None:
+                instance = super().__new__(cls)
+                instance._initialized = False
+                cls._instances[model_name] = instance
+            return instance
     
     def __init__(self, model_name: str = 'all-MiniLM-L6-v2'):
         if hasattr(self, '_initialized') and self._initialized:
@@ -42,18 +65,38 @@ class SentenceTransformerEmbedding(EmbeddingProvider):
         self._dimension = None
         self._initialized = True
     
-    def encode(self, texts: Union[str, List[str]]) -> np.ndarray:
-        """编码文本为向量"""
+    def encode(self, texts: Union[str, List[str]], dtype: str = "float32") -> np.ndarray:
+        """
+        编码文本为向量
+        
+        参数:
+            texts: 单条文本或文本列表
+            dtype: 输出类型，"float32"或"int8"（量化后用于SIMD余弦计算）
+        """
         if isinstance(texts, str):
             texts = [texts]
         
-        embeddings = self.model.encode(texts, convert_to_numpy=True, normalize_embeddings=True)
+        embeddings = self.encode_many(texts)
+        if dtype == "int8":
+            return quantize_int8(embeddings)
         return embeddings
     
+    def encode_int8(self, texts: Union[str, List[str]]) -> np.ndarray:
+        """编码文本为int8量化向量"""
+        return self.encode(texts, dtype="int8")
+    
+    def encode_many(self, texts: List[str], batch_size: int = 64) -> np.ndarray:
+        """批量编码文本为向量，一次调用完成整批前向计算"""
+        return self.model.encode(
+            texts,
+            batch_size=batch_size,
+            convert_to_numpy=True,
+            normalize_embeddings=True
+        )
+    
     def get_dimension(self) -> int:
         """获取向量维度"""
         if self._dimension is None:
-            # 使用一个简单文本获取维度
-            test_embedding = self.encode("test")
-            self._dimension = test_embedding.shape[-1]
+            # 直接读取模型配置，避免一次额外的前向计算
+            self._dimension = self.model.get_sentence_embedding_dimension()
         return self._dimension
\ No newline at end of file
@@ -217,9 +217,8 @@ class VectorSimilarityMatcher:
         # 重新创建索引
         self.index = faiss.IndexFlatIP(self.dimension)
         
-        # 重新添加所有向量
-        for cache_key, query in self.key_to_query.items():
-            embedding = self.embedding_provider.encode(query)
-            if embedding.ndim == 1:
-                embedding = embedding.reshape(1, -1)
-            self.index.add(embedding)
\ No newline at end of file
+        # 批量编码并重新添加所有向量
+        embeddings = self.embedding_provider.encode_many(list(self.key_to_query.values()))
+        if embeddings.ndim == 1:
+            embeddings = embeddings.reshape(1, -1)
+        self.index.add(embeddings)
\ No newline at end of file
@@ -1,16 +1,73 @@
 from typing import Dict, List, Any, Optional, AsyncGenerator
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from itertools import groupby
 import asyncio
+import copy
+import hashlib
 import time
 import json
 import re
 
 from model.get_models import get_llm_model, get_stream_llm_model, get_embeddings_model
+from agent.utils import TTLCache, response_text
 from search.tool.deeper_research_tool import DeeperResearchTool
 from search.tool.local_search_tool import LocalSearchTool
 from search.tool.global_search_tool import GlobalSearchTool
 from search.tool.reasoning.chain_of_exploration import ChainOfExplorationSearcher
 from search.tool.reasoning.thinking import ThinkingEngine
 
+try:
+    import re2
+    RE2_AVAILABLE = True
+except ImportError:
+    RE2_AVAILABLE = False
+
+
+# 任务类型 -> (结果分组, 显示名称, 出错提示)
+_TASK_SPECS = {
+    "local_search": ("local", "本地搜索", "本地搜索出错"),
+    "global_search": ("global", "全局搜索", "全局搜索出错"),
+    "exploration": ("exploration", "深度探索", "探索出错"),
+    "chain_exploration": ("chain_exploration", "Chain of Exploration", "Chain of Exploration出错"),
+}
+
+# 从检索结果中提取实体的简单启发式规则，合并为单个正则以便每段文本只扫描一次
+# 安装了google-re2时使用其线性时间的DFA引擎，避免长文本上的回溯开销
+_ENTITY_RE = (re2 if RE2_AVAILABLE else re).compile(
+    r'实体\s*[:：]\s*(?P<cn>[^,，\n]+)'
+    r'|(?P<en>[A-Z][a-z]+(?:\s+[A-Z][a-z]+){1,2})'  # 英文专有名词
+    r'|【(?P<br>[^】]+)】'  # 中文方括号内容
+    r'|"(?P<q>[^"]+)"'  # 引号内容
+)
+
+# 提取实体的数量上限，下游只使用前几个实体作为探索起点
+_MAX_ENTITIES = 32
+
+# 单次查询最多保留的执行轨迹步数
+_MAX_TRACE_STEPS = 10000
+
+# 合成答案提示的固定结尾
+_SYNTHESIS_REQUIREMENTS = """请提供一个全面、准确的回答。确保:
+1. 综合所有相关信息
+2. 解决问题的核心
+3. 说明清晰，逻辑严密
+4. 适当引用信息来源
+5. 结构清晰，使用段落和标题组织内容"""
+
+
+def _bounded_json(obj: Any, limit: int) -> str:
+    """增量序列化对象为JSON，达到长度上限后停止，避免完整序列化大结果"""
+    buf = []
+    total = 0
+    for chunk in json.JSONEncoder(ensure_ascii=False, default=str).iterencode(obj):
+        buf.append(chunk)
+        total += len(chunk)
+        if total >= limit:
+            break
+    return "".join(buf)[:limit]
+
 
 class GraphRAGAgentCoordinator:
     """
@@ -19,12 +76,16 @@ class GraphRAGAgentCoordinator:
     协调多个专用Agent共同解决复杂问题，实现Fusion GraphRAG的多Agent协同架构
     """
     
-    def __init__(self, llm=None):
+    def __init__(self, llm=None, max_concurrency: int = 8, plan_cache: TTLCache = None):
         # 初始化语言模型
         self.llm = llm or get_llm_model()
         self.stream_llm = get_stream_llm_model()
         self.embeddings = get_embeddings_model()
         
+        # 检索计划缓存：按规范化查询精确匹配，跳过重复查询的规划LLM调用。
+        # 计划中的任务查询和关键实体都针对原问题，不做相似匹配，避免近似问题取到别人的计划
+        self.plan_cache = plan_cache if plan_cache is not None else TTLCache(maxsize=500, ttl=3600)
+        
         # 创建专用Agent
         self.retrieval_planner = self._create_retrieval_planner()
         self.local_searcher = self._create_local_searcher()
@@ -33,21 +94,63 @@ class GraphRAGAgentCoordinator:
         self.chain_explorer = self._create_chain_explorer()
         self.synthesizer = self._create_synthesizer()
         self.thinking_engine = self._create_thinking_engine()
+        # 初步思考在线程池中运行期间，任务产生的推理步骤先暂存于此，思考完成后按顺序写入，
+        # 避免事件循环线程与工作线程同时修改思考引擎
+        self._deferred_reasoning_steps = None
+        
+        # 同一优先级任务的最大并发数，避免触发LLM限流
+        self.max_concurrency = max_concurrency
+        # 复用的有界线程池，用于执行同步的检索与合成调用
+        self._executor = ThreadPoolExecutor(max_workers=max_concurrency, thread_name_prefix="graphrag")
         
         # 执行记录
-        self.execution_trace = []
+        # 执行轨迹以(时间戳ns, 类型, 描述, 数据)元组记录，长时间流式运行时也不会无限增长
+        self.execution_trace = deque(maxlen=_MAX_TRACE_STEPS)
         self.performance_metrics = {}
     
+    def close(self):
+        """释放线程池资源"""
+        self._executor.shutdown(wait=False)
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+    
+    def __del__(self):
+        executor = getattr(self, "_executor", None)
+        if executor is not None:
+            executor.shutdown(wait=False)
+    
     def _create_retrieval_planner(self):
         """创建检索计划生成器Agent"""
         class RetrievalPlannerAgent:
-            def __init__(self, llm):
+            def __init__(self, llm, plan_cache=None):
                 self.llm = llm
+                self.plan_cache = plan_cache
                 self.name = "retrieval_planner"
                 self.description = "负责分析查询并生成最佳检索计划的Agent"
             
             def plan(self, query: str) -> Dict[str, Any]:
-                """分析查询并生成检索计划"""
+                """分析查询并生成检索计划，规范化后相同的查询直接复用缓存的计划"""
+                # 折叠空白并转小写后取SHA-256摘要作为缓存键
+                cache_key = hashlib.sha256(" ".join(query.split()).lower().encode("utf-8")).hexdigest()
+                if self.plan_cache is not None:
+                    cached_plan = self.plan_cache.get(cache_key)
+                    if cached_plan is not None:
+                        return copy.deepcopy(cached_plan)
+                
+                plan = self._generate_plan(query)
+                if plan is None:
+                    return self._default_plan(query)
+                
+                if self.plan_cache is not None:
+                    self.plan_cache[cache_key] = plan
+                return copy.deepcopy(plan)
+            
+            def _generate_plan(self, query: str) -> Optional[Dict[str, Any]]:
+                """调用LLM生成检索计划，无法解析时返回None"""
                 prompt = f"""
                 分析以下查询，创建一个全面的检索计划以获取所需信息。
                 
@@ -77,40 +180,36 @@ class GraphRAGAgentCoordinator:
                 
                 try:
                     response = self.llm.invoke(prompt)
-                    content = response.content if hasattr(response, 'content') else str(response)
+                    content = response_text(response)
                     
-                    # 提取JSON
-                    import re
-                    import json
-                    json_match = re.search(r'({.*})', content, re.DOTALL)
-                    if json_match:
-                        plan = json.loads(json_match.group(1))
-                        return plan
-                    else:
-                        # 如果无法解析，返回基础计划
-                        return {
-                            "complexity_assessment": 0.5,
-                            "requires_global_view": False,
-                            "requires_path_tracking": False,
-                            "has_temporal_aspects": False,
-                            "tasks": [
-                                {"type": "local_search", "query": query, "priority": 3}
-                            ]
-                        }
+                    # 提取JSON：从第一个"{"开始做一次线性解析，忽略其后的多余文本
+                    start = content.find('{')
+                    if start >= 0:
+                        try:
+                            plan, _ = json.JSONDecoder().raw_decode(content, start)
+                            return plan
+                        except json.JSONDecodeError:
+                            pass
+                    # 如果无法解析，交由调用方返回基础计划
+                    return None
                 except Exception as e:
                     print(f"计划生成失败: {str(e)}")
-                    # 返回默认计划
-                    return {
-                        "complexity_assessment": 0.5,
-                        "requires_global_view": False,
-                        "requires_path_tracking": False,
-                        "has_temporal_aspects": False,
-                        "tasks": [
-                            {"type": "local_search", "query": query, "priority": 3}
-                        ]
-                    }
-        
-        return RetrievalPlannerAgent(self.llm)
+                    return None
+            
+            @staticmethod
+            def _default_plan(query: str) -> Dict[str, Any]:
+                """默认的基础检索计划"""
+                return {
+                    "complexity_assessment": 0.5,
+                    "requires_global_view": False,
+                    "requires_path_tracking": False,
+                    "has_temporal_aspects": False,
+                    "tasks": [
+                        {"type": "local_search", "query": query, "priority": 3}
+                    ]
+                }
+        
+        return RetrievalPlannerAgent(self.llm, self.plan_cache)
     
     def _create_local_searcher(self):
         """创建本地搜索Agent"""
@@ -146,54 +245,55 @@ class GraphRAGAgentCoordinator:
                 self.name = "synthesizer"
                 self.description = "负责整合所有检索结果并生成最终答案的Agent"
             
-            def synthesize(self, query: str, results: Dict[str, List], plan: Dict[str, Any],
+            def synthesize(self, query: str, results: Dict[str, List], plan_json: str,
                           thinking_process: str = None) -> str:
-                """整合结果并生成答案"""
-                # 构建提示
-                prompt = f"""
-                基于以下检索结果，回答用户的问题。
+                """整合结果并生成答案，plan_json为调用方预先序列化好的检索计划"""
+                # 先计算各部分内容，再一次性拼接提示，避免反复拼接大字符串
                 
-                用户问题: "{query}"
-                
-                ## 检索计划
-                {json.dumps(plan, ensure_ascii=False, indent=2)}
-                """
+                parts = [
+                    "基于以下检索结果，回答用户的问题。",
+                    f'用户问题: "{query}"',
+                    f"## 检索计划\n{plan_json}",
+                ]
                 
                 # 添加思考过程
                 if thinking_process:
-                    prompt += f"""
-                    ## 思考过程
-                    {thinking_process}
-                    """
+                    parts.append(f"## 思考过程\n{thinking_process}")
                 
-                # 添加检索结果
-                prompt += f"""
-                ## 本地检索结果
-                {self._format_results(results.get('local', []))}
+                # 添加检索结果：跨部分按内容哈希去重，并跳过没有结果的部分以减少提示长度
+                seen = set()
+                for key, title in (('local', "本地检索结果"),
+                                   ('global', "全局检索结果"),
+                                   ('exploration', "探索结果")):
+                    section = self._dedupe_results(results.get(key, []), seen)
+                    if section:
+                        parts.append(f"## {title}\n{self._format_results(section)}")
                 
-                ## 全局检索结果
-                {self._format_results(results.get('global', []))}
+                coe_results = results.get('chain_exploration', [])
+                if coe_results:
+                    parts.append(f"## Chain of Exploration结果\n{self._format_coe_results(coe_results)}")
                 
-                ## 探索结果
-                {self._format_results(results.get('exploration', []))}
-                
-                ## Chain of Exploration结果
-                {self._format_coe_results(results.get('chain_exploration', []))}
-                
-                请提供一个全面、准确的回答。确保:
-                1. 综合所有相关信息
-                2. 解决问题的核心
-                3. 说明清晰，逻辑严密
-                4. 适当引用信息来源
-                5. 结构清晰，使用段落和标题组织内容
-                """
+                parts.append(_SYNTHESIS_REQUIREMENTS)
+                prompt = "\n\n".join(parts)
                 
                 try:
                     response = self.llm.invoke(prompt)
-                    return response.content if hasattr(response, 'content') else str(response)
+                    return response_text(response)
                 except Exception as e:
                     return f"合成回答时出错: {str(e)}"
             
+            @staticmethod
+            def _dedupe_results(results: List, seen: set) -> List:
+                """按内容过滤已出现过的结果，seen在各部分之间共享"""
+                unique = []
+                for result in results:
+                    # 保存文本本身，集合比较时哈希相同仍会核对内容，不会误删不同的结果
+                    text = str(result)
+                    if text not in seen:
+                        seen.add(text)
+                        unique.append(result)
+                return unique
+            
             def _format_results(self, results: List) -> str:
                 """格式化结果列表"""
                 if not results:
@@ -208,30 +308,46 @@ class GraphRAGAgentCoordinator:
                 """格式化Chain of Exploration结果"""
                 if not results:
                     return "无Chain of Exploration结果"
-                    
-                formatted = []
-                for i, result in enumerate(results):
+                
+                buf = []
+                append = buf.append
+                for i, result in enumerate(results, 1):
                     if isinstance(result, dict):
-                        # 提取路径信息
-                        path_info = "探索路径:\n"
-                        for step in result.get('exploration_path', [])[:5]:  # 只显示前5步
-                            path_info += f"- 步骤{step.get('step')}: {step.get('node_id')} ({step.get('reasoning', '无理由')})\n"
+                        append("探索结果 %d:\n" % i)
+                        
+                        # 提取路径信息，只显示前5步
+                        append("探索路径:\n")
+                        for step in result.get('exploration_path', [])[:5]:
+                            append("- 步骤%s: %s (%s)\n" % (
+                                step.get('step'), step.get('node_id'), step.get('reasoning', '无理由')
+                            ))
                         
-                        # 提取内容
-                        content_info = "发现内容:\n"
-                        for j, content in enumerate(result.get('content', [])[:3]):  # 只显示前3个内容
-                            text = content.get('text', '')[:200]  # 限制长度
-                            content_info += f"  内容{j+1}: {text}...\n"
-                            
-                        formatted.append(f"探索结果 {i+1}:\n{path_info}\n{content_info}\n")
+                        # 提取内容，只显示前3个内容并限制长度
+                        append("\n发现内容:\n")
+                        for j, content in enumerate(result.get('content', [])[:3], 1):
+                            append("  内容%d: %s...\n" % (j, content.get('text', '')[:200]))
+                        append("\n\n")
                     else:
-                        formatted.append(f"探索结果 {i+1}:\n{str(result)[:500]}...\n")
+                        append("探索结果 %d:\n%s...\n\n" % (i, str(result)[:500]))
                 
-                return "\n".join(formatted)
+                # 与逐项"\n".join的输出保持一致，去掉最后一项多余的换行
+                return "".join(buf)[:-1]
         
         return SynthesizerAgent(self.llm)
     
-    def process_query(self, query: str) -> Dict[str, Any]:
+    def process_query_sync(self, query: str) -> Dict[str, Any]:
+        """
+        同步处理查询，供非异步调用方使用
+        
+        参数:
+            query: 用户查询
+            
+        返回:
+            Dict: 包含最终答案和处理记录的字典
+        """
+        return self._run_coroutine_sync(self.process_query(query))
+    
+    async def process_query(self, query: str) -> Dict[str, Any]:
         """
         处理查询，协调多个Agent完成任务
         
@@ -242,120 +358,45 @@ class GraphRAGAgentCoordinator:
             Dict: 包含最终答案和处理记录的字典
         """
         start_time = time.time()
-        self.execution_trace = []
+        self.execution_trace.clear()
         
         # 1. 生成检索计划
         self._log_step("generating_plan", "生成检索计划")
-        retrieval_plan = self.retrieval_planner.plan(query)
+        retrieval_plan = await self._run_blocking(self.retrieval_planner.plan, query)
+        plan_json = json.dumps(retrieval_plan, ensure_ascii=False, indent=2)
         self._log_step("plan_generated", "检索计划已生成", retrieval_plan)
         
         # 初始化思考引擎
         self._log_step("thinking_init", "初始化思考引擎")
         self.thinking_engine.initialize_with_query(query)
         
-        # 1.5 如果问题复杂度高，生成初步思考
+        # 1.5 如果问题复杂度高，在后台生成初步思考，与检索任务并行
         complexity = retrieval_plan.get("complexity_assessment", 0)
+        thinking_task = None
         if complexity > 0.7:
             self._log_step("initial_thinking", "生成初步思考")
-            initial_thinking = self.thinking_engine.generate_initial_thinking()
+            thinking_task = self._start_initial_thinking()
+        
+        # 2. 根据计划执行搜索任务（同一优先级的任务并发执行）
+        try:
+            all_results = await self._execute_tasks(retrieval_plan.get("tasks", []), query)
+        except BaseException:
+            if thinking_task is not None:
+                thinking_task.cancel()
+                self._deferred_reasoning_steps = None
+            raise
+        
+        # 3. 如果问题复杂度高，等待初步思考完成后生成最终思考
+        if thinking_task is not None:
+            initial_thinking = await self._finish_initial_thinking(thinking_task)
             self._log_step("initial_thinking_complete", "完成初步思考", {"thinking": initial_thinking})
-        else:
-            initial_thinking = None
-        
-        # 2. 根据计划执行搜索任务
-        local_results = []
-        global_results = []
-        exploration_results = []
-        chain_exploration_results = []
-        
-        # 按优先级排序任务
-        tasks = sorted(retrieval_plan.get("tasks", []), 
-                     key=lambda x: x.get("priority", 3), 
-                     reverse=True)
-        
-        for task in tasks:
-            task_type = task.get("type", "")
-            task_query = task.get("query", query)
             
-            # 添加任务进度到思考引擎
-            self.thinking_engine.add_reasoning_step(f"执行任务: {task_type} - {task_query}")
-            
-            if task_type == "local_search":
-                self._log_step("local_search", f"执行本地搜索: {task_query}")
-                try:
-                    result = self.local_searcher.search(task_query)
-                    if result:
-                        local_results.append(result)
-                        # 添加结果到思考引擎
-                        self.thinking_engine.add_reasoning_step(f"本地搜索结果摘要:\n{self._summarize_result(result)}")
-                    self._log_step("local_search_completed", "本地搜索完成")
-                except Exception as e:
-                    self._log_step("local_search_error", f"本地搜索出错: {str(e)}")
-                    
-            elif task_type == "global_search":
-                self._log_step("global_search", f"执行全局搜索: {task_query}")
-                try:
-                    result = self.global_searcher.search(task_query)
-                    if result:
-                        global_results.append(result)
-                        # 添加结果到思考引擎
-                        self.thinking_engine.add_reasoning_step(f"全局搜索结果摘要:\n{self._summarize_result(result)}")
-                    self._log_step("global_search_completed", "全局搜索完成")
-                except Exception as e:
-                    self._log_step("global_search_error", f"全局搜索出错: {str(e)}")
-                    
-            elif task_type == "exploration":
-                self._log_step("exploration", f"执行深度探索: {task_query}")
-                try:
-                    result = self.explorer.search(task_query)
-                    if result:
-                        exploration_results.append(result)
-                        # 添加结果到思考引擎
-                        self.thinking_engine.add_reasoning_step(f"深度探索结果摘要:\n{self._summarize_result(result)}")
-                    self._log_step("exploration_completed", "深度探索完成")
-                except Exception as e:
-                    self._log_step("exploration_error", f"探索出错: {str(e)}")
-                    
-            elif task_type == "chain_exploration":
-                self._log_step("chain_exploration", f"执行Chain of Exploration: {task_query}")
-                try:
-                    # 获取相关实体
-                    entities = task.get("entities", [])
-                    if not entities:
-                        # 如果任务没有指定实体，尝试从其他结果中提取
-                        entities = self._extract_entities_from_results(
-                            local_results, global_results, exploration_results
-                        )
-                    
-                    # 至少需要一个起始实体
-                    if not entities:
-                        self._log_step("chain_exploration_warning", "未找到起始实体，跳过Chain of Exploration")
-                        continue
-                        
-                    # 执行Chain of Exploration
-                    result = self.chain_explorer.explore(
-                        task_query, 
-                        entities[:3],  # 使用前3个实体作为起点
-                        max_steps=3
-                    )
-                    
-                    if result:
-                        chain_exploration_results.append(result)
-                        # 添加结果到思考引擎
-                        path_summary = "探索路径:\n"
-                        for step in result.get('exploration_path', [])[:5]:
-                            path_summary += f"- 步骤{step.get('step')}: {step.get('node_id')} ({step.get('reasoning', '无理由')})\n"
-                        self.thinking_engine.add_reasoning_step(f"Chain of Exploration结果:\n{path_summary}")
-                    self._log_step("chain_exploration_completed", "Chain of Exploration完成")
-                except Exception as e:
-                    self._log_step("chain_exploration_error", f"Chain of Exploration出错: {str(e)}")
-        
-        # 3. 如果问题复杂度高，生成最终思考
-        if complexity > 0.7:
             self._log_step("final_thinking", "生成最终思考")
             # 告诉思考引擎基于搜索结果更新想法
             self.thinking_engine.add_reasoning_step("基于所有搜索结果，更新我的思考")
-            updated_thinking = self.thinking_engine.update_thinking_based_on_verification([])
+            updated_thinking = await self._run_blocking(
+                self.thinking_engine.update_thinking_based_on_verification, []
+            )
             self._log_step("final_thinking_complete", "完成最终思考", {"thinking": updated_thinking})
             
             # 获取完整思考过程
@@ -363,17 +404,9 @@ class GraphRAGAgentCoordinator:
         else:
             thinking_process = None
         
-        # 4. 整合所有结果
-        all_results = {
-            "local": local_results,
-            "global": global_results,
-            "exploration": exploration_results,
-            "chain_exploration": chain_exploration_results
-        }
-        
-        # 5. 合成最终答案
+        # 4. 合成最终答案
         self._log_step("synthesizing", "合成最终答案")
-        final_answer = self.synthesizer.synthesize(query, all_results, retrieval_plan, thinking_process)
+        final_answer = await self._async_synthesize(query, all_results, plan_json, thinking_process)
         self._log_step("synthesis_completed", "答案合成完成")
         
         # 记录总耗时
@@ -385,7 +418,7 @@ class GraphRAGAgentCoordinator:
             "plan": retrieval_plan,
             "results": all_results,
             "thinking": thinking_process,
-            "execution_trace": self.execution_trace,
+            "execution_trace": self._trace_as_dicts(),
             "metrics": self.performance_metrics
         }
     
@@ -399,49 +432,242 @@ class GraphRAGAgentCoordinator:
             if len(result) > 500:
                 return result[:500] + "..."
             return result
-        elif isinstance(result, dict):
-            return json.dumps(result, ensure_ascii=False)[:500] + "..."
-        elif isinstance(result, list):
-            return str(result)[:500] + "..."
+        elif isinstance(result, (dict, list)):
+            # 增量序列化，只生成摘要需要的前500个字符
+            return _bounded_json(result, 500) + "..."
         else:
             return str(result)[:500] + "..."
     
     def _extract_entities_from_results(self, local_results, global_results, exploration_results):
-        """从现有结果中提取实体"""
-        entities = set()
-        
-        # 提取实体的简单启发式方法
-        entity_patterns = [
-            r'实体\s*[:：]\s*([^,，\n]+)',
-            r'([A-Z][a-z]+(?:\s+[A-Z][a-z]+){1,2})',  # 英文专有名词
-            r'【([^】]+)】',  # 中文方括号内容
-            r'"([^"]+)"'  # 引号内容
-        ]
+        """从现有结果中提取实体，达到数量上限后立即返回"""
+        # 使用dict去重并保留发现顺序，优先返回最先出现的实体
+        entities = {}
         
         # 处理所有结果
         all_text = []
         all_text.extend(local_results)
         all_text.extend(global_results)
+        all_text.extend(exploration_results)
+        texts = [text for text in all_text if isinstance(text, str)]
         
-        for result in exploration_results:
-            if isinstance(result, str):
-                all_text.append(result)
-                
         # 从文本中提取实体
-        for text in all_text:
-            if not isinstance(text, str):
-                continue
-                
-            for pattern in entity_patterns:
-                matches = re.findall(pattern, text)
-                for match in matches:
-                    # 清理并添加实体
-                    entity = match.strip()
-                    if len(entity) > 1 and len(entity) < 30:  # 合理长度限制
-                        entities.add(entity)
+        for text in texts:
+            for match in _ENTITY_RE.finditer(text):
+                # 清理并添加实体
+                entity = (match.group('cn') or match.group('en') or match.group('br') or match.group('q')).strip()
+                if len(entity) > 1 and len(entity) < 30:  # 合理长度限制
+                    entities[entity] = None
+                    if len(entities) >= _MAX_ENTITIES:
+                        return list(entities)
         
         return list(entities)
     
+    @staticmethod
+    def _run_coroutine_sync(coro):
+        """在同步上下文中运行协程，已有事件循环时转到独立线程执行"""
+        try:
+            asyncio.get_running_loop()
+        except RuntimeError:
+            return asyncio.run(coro)
+        with ThreadPoolExecutor(max_workers=1) as pool:
+            return pool.submit(asyncio.run, coro).result()
+    
+    @staticmethod
+    def _group_tasks_by_priority(tasks: List[Dict[str, Any]]) -> List[List[tuple]]:
+        """按优先级从高到低将任务分层，返回带序号的(序号, 任务)分层列表"""
+        priority = lambda x: x[1].get("priority", 3)
+        ordered = list(enumerate(sorted(tasks, key=lambda x: x.get("priority", 3), reverse=True), 1))
+        return [list(tier) for _, tier in groupby(ordered, key=priority)]
+    
+    async def _execute_tasks(self, tasks: List[Dict[str, Any]], query: str,
+                             progress: Optional[asyncio.Queue] = None) -> Dict[str, List]:
+        """
+        按优先级分层执行检索任务，同步与流式入口共用
+        
+        层与层之间保持优先级顺序，每一层通过一次asyncio.gather并发执行。
+        Chain of Exploration依赖已有结果提取起始实体，因此在同层其他任务完成后执行。
+        
+        参数:
+            tasks: 检索计划中的任务列表
+            query: 用户查询
+            progress: 可选的进度消息队列，流式输出时使用，结束时放入None
+        """
+        all_results = {"local": [], "global": [], "exploration": [], "chain_exploration": []}
+        semaphore = asyncio.Semaphore(self.max_concurrency)
+        total = len(tasks)
+        
+        try:
+            for tier in self._group_tasks_by_priority(tasks):
+                search_tasks = [(i, t) for i, t in tier if t.get("type") in _TASK_SPECS and t.get("type") != "chain_exploration"]
+                chain_tasks = [(i, t) for i, t in tier if t.get("type") == "chain_exploration"]
+                
+                for batch in (search_tasks, chain_tasks):
+                    if not batch:
+                        continue
+                    units = self._fuse_batchable_tasks(batch)
+                    outcomes = await asyncio.gather(
+                        *(self._run_unit(unit, query, all_results, semaphore, progress, total)
+                          for unit in units),
+                        return_exceptions=True
+                    )
+                    for unit, outcome in zip(units, outcomes):
+                        for (_, task), task_outcome in zip(unit, self._scatter_outcome(unit, outcome)):
+                            self._collect_task_result(task, task_outcome, all_results, progress)
+        finally:
+            self._emit(progress, None)
+        
+        return all_results
+    
+    def _batch_searcher(self, task_type: str):
+        """
+        返回支持批量查询的检索器，不支持时返回None
+        
+        检索工具可提供search_batch(queries) -> List，按输入顺序返回每个查询的结果，
+        并在一次后端往返中完成检索（如用UNWIND批量执行Neo4j向量检索，见LocalSearchTool.search_batch）；
+        未提供该方法的工具按任务逐个执行。
+        """
+        searcher = {
+            "local_search": self.local_searcher,
+            "global_search": self.global_searcher,
+        }.get(task_type)
+        return searcher if hasattr(searcher, "search_batch") else None
+    
+    def _fuse_batchable_tasks(self, batch: List[tuple]) -> List[List[tuple]]:
+        """
+        将同一层中类型相同、且检索器支持search_batch的任务合并为一个执行单元
+        
+        合并后的单元通过一次后端调用完成全部查询，其余任务各自成为独立单元。
+        """
+        units = []
+        fused = {}
+        for item in batch:
+            task_type = item[1].get("type")
+            if self._batch_searcher(task_type) is None:
+                units.append([item])
+            elif task_type in fused:
+                fused[task_type].append(item)
+            else:
+                fused[task_type] = [item]
+                units.append(fused[task_type])
+        return units
+    
+    async def _run_unit(self, unit: List[tuple], query: str, all_results: Dict[str, List],
+                        semaphore: asyncio.Semaphore, progress: Optional[asyncio.Queue], total: int):
+        """执行一个执行单元：单个任务直接执行，合并的任务走批量查询"""
+        if len(unit) == 1:
+            index, task = unit[0]
+            return await self._run_task(task, query, all_results, semaphore, progress, index, total)
+        
+        task_type = unit[0][1].get("type")
+        queries = []
+        for index, task in unit:
+            queries.append(task.get("query", query))
+            self._announce_task(task, query, progress, index, total)
+        
+        async with semaphore:
+            outcomes = await self._run_blocking(self._batch_searcher(task_type).search_batch, queries)
+        
+        # 结果数量与任务不一致时无法对应到各个任务，整个单元按失败处理，避免静默丢失任务
+        if len(outcomes) != len(unit):
+            raise ValueError(f"search_batch返回{len(outcomes)}条结果，与{len(unit)}个任务不一致")
+        return outcomes
+    
+    @staticmethod
+    def _scatter_outcome(unit: List[tuple], outcome: Any) -> List[Any]:
+        """将执行单元的结果拆回到各个任务，失败时每个任务都记录该异常"""
+        if len(unit) == 1 or isinstance(outcome, BaseException):
+            return [outcome] * len(unit)
+        return list(outcome)
+    
+    @staticmethod
+    def _emit(progress: Optional[asyncio.Queue], message: Optional[str]):
+        """向进度队列写入消息"""
+        if progress is not None:
+            progress.put_nowait(message)
+    
+    async def _run_task(self, task: Dict[str, Any], query: str, all_results: Dict[str, List],
+                        semaphore: asyncio.Semaphore, progress: Optional[asyncio.Queue] = None,
+                        index: int = 1, total: int = 1):
+        """执行单个检索任务，返回原始结果"""
+        task_type = task.get("type", "")
+        task_query = task.get("query", query)
+        self._announce_task(task, query, progress, index, total)
+        
+        async with semaphore:
+            if task_type == "local_search":
+                return await self._async_local_search(task_query)
+            if task_type == "global_search":
+                return await self._async_global_search(task_query)
+            if task_type == "exploration":
+                self._emit(progress, "**开始深度探索**...\n")
+                return await self._async_exploration(task_query)
+            
+            # chain_exploration: 获取相关实体
+            self._emit(progress, "**开始Chain of Exploration**...\n")
+            entities = task.get("entities", [])
+            if not entities:
+                # 如果任务没有指定实体，尝试从其他结果中提取
+                entities = self._extract_entities_from_results(
+                    all_results["local"], all_results["global"], all_results["exploration"]
+                )
+                if entities:
+                    self._emit(progress, f"- 从已有结果中提取实体: {', '.join(entities[:3])}"
+                               + ("..." if len(entities) > 3 else "") + "\n")
+            
+            # 至少需要一个起始实体
+            if not entities:
+                self._log_step("chain_exploration_warning", "未找到起始实体，跳过Chain of Exploration")
+                self._emit(progress, "⚠️ 未找到起始实体，跳过Chain of Exploration\n\n")
+                return None
+            
+            # 使用前3个实体作为起点
+            return await self._async_chain_exploration(task_query, entities[:3])
+    
+    def _announce_task(self, task: Dict[str, Any], query: str, progress: Optional[asyncio.Queue],
+                       index: int, total: int):
+        """记录任务开始执行"""
+        task_type = task.get("type", "")
+        task_query = task.get("query", query)
+        
+        # 添加任务进度到思考引擎
+        self._add_reasoning_step(f"执行任务: {task_type} - {task_query}")
+        self._log_step(task_type, f"执行{_TASK_SPECS[task_type][1]}: {task_query}")
+        self._emit(progress, f"**执行任务 {index}/{total}**: {task_type} - {task_query}\n")
+    
+    def _collect_task_result(self, task: Dict[str, Any], outcome: Any, all_results: Dict[str, List],
+                             progress: Optional[asyncio.Queue] = None):
+        """汇总单个任务的执行结果并同步到思考引擎"""
+        task_type = task.get("type", "")
+        result_key, label, error_prefix = _TASK_SPECS[task_type]
+        
+        if isinstance(outcome, BaseException):
+            self._log_step(f"{task_type}_error", f"{error_prefix}: {str(outcome)}")
+            self._emit(progress, f"❌ {task_type}任务执行失败: {str(outcome)}\n\n")
+            return
+        
+        if outcome:
+            all_results[result_key].append(outcome)
+            # 添加结果到思考引擎
+            if task_type == "chain_exploration":
+                path_summary = "探索路径:\n"
+                for step in outcome.get('exploration_path', [])[:5]:
+                    path_summary += f"- 步骤{step.get('step')}: {step.get('node_id')} ({step.get('reasoning', '无理由')})\n"
+                self._add_reasoning_step(f"Chain of Exploration结果:\n{path_summary}")
+                
+                # 显示探索路径摘要
+                if "exploration_path" in outcome:
+                    self._emit(progress, "- 探索路径:\n")
+                    for step in outcome["exploration_path"][:5]:
+                        self._emit(progress, f"  • 步骤{step.get('step')}: {step.get('node_id')}\n")
+                if "content" in outcome:
+                    self._emit(progress, f"- 找到 {len(outcome['content'])} 条相关内容\n")
+            else:
+                self._add_reasoning_step(f"{label}结果摘要:\n{self._summarize_result(outcome)}")
+            self._emit(progress, f"✓ {label}完成\n\n")
+        
+        if outcome is not None:
+            self._log_step(f"{task_type}_completed", f"{label}完成")
+    
     async def process_query_stream(self, query: str):
         """
         流式处理查询，返回处理过程和结果
@@ -454,7 +680,8 @@ class GraphRAGAgentCoordinator:
         """
         # 1. 生成检索计划
         yield "**正在分析问题和制定检索计划**...\n\n"
-        retrieval_plan = self.retrieval_planner.plan(query)
+        retrieval_plan = await self._run_blocking(self.retrieval_planner.plan, query)
+        plan_json = json.dumps(retrieval_plan, ensure_ascii=False, indent=2)
         
         # 提取和显示计划摘要
         complexity = retrieval_plan.get("complexity_assessment", 0.5)
@@ -477,10 +704,33 @@ class GraphRAGAgentCoordinator:
         # 初始化思考引擎
         self.thinking_engine.initialize_with_query(query)
         
-        # 如果复杂度高，添加初步思考
+        # 如果复杂度高，在后台进行初步思考，与检索任务并行
+        thinking_task = None
         if complexity > 0.7:
             yield "**正在进行初步思考分析**...\n\n"
-            initial_thinking = self.thinking_engine.generate_initial_thinking()
+            thinking_task = self._start_initial_thinking()
+        
+        # 2. 根据计划执行搜索任务，与同步入口共用同一调度逻辑
+        progress = asyncio.Queue()
+        runner = asyncio.create_task(
+            self._execute_tasks(retrieval_plan.get("tasks", []), query, progress)
+        )
+        try:
+            while (message := await progress.get()) is not None:
+                yield message
+            all_results = await runner
+        except BaseException:
+            if thinking_task is not None:
+                thinking_task.cancel()
+                self._deferred_reasoning_steps = None
+            raise
+        finally:
+            if not runner.done():
+                runner.cancel()
+        
+        # 如果复杂度高，返回初步思考摘要后生成最终思考
+        if thinking_task is not None:
+            initial_thinking = await self._finish_initial_thinking(thinking_task)
             
             # 返回思考摘要
             thinking_lines = initial_thinking.split('\n')
@@ -490,97 +740,12 @@ class GraphRAGAgentCoordinator:
                 thinking_summary = initial_thinking + "\n"
                 
             yield thinking_summary + "\n"
-        
-        # 2. 根据计划执行搜索任务
-        tasks = sorted(retrieval_plan.get("tasks", []), 
-                     key=lambda x: x.get("priority", 3), 
-                     reverse=True)
-        
-        all_results = {"local": [], "global": [], "exploration": [], "chain_exploration": []}
-        
-        for i, task in enumerate(tasks):
-            task_type = task.get("type", "")
-            task_query = task.get("query", query)
-            
-            task_msg = f"**执行任务 {i+1}/{len(tasks)}**: {task_type} - {task_query}\n"
-            yield task_msg
             
-            # 添加任务到思考引擎
-            self.thinking_engine.add_reasoning_step(f"执行任务: {task_type} - {task_query}")
-            
-            try:
-                if task_type == "local_search":
-                    result = await self._async_local_search(task_query)
-                    if result:
-                        all_results["local"].append(result)
-                        self.thinking_engine.add_reasoning_step(f"本地搜索结果摘要:\n{self._summarize_result(result)}")
-                        yield "✓ 本地搜索完成\n\n"
-                        
-                elif task_type == "global_search":
-                    result = await self._async_global_search(task_query)
-                    if result:
-                        all_results["global"].append(result)
-                        self.thinking_engine.add_reasoning_step(f"全局搜索结果摘要:\n{self._summarize_result(result)}")
-                        yield "✓ 全局搜索完成\n\n"
-                        
-                elif task_type == "exploration":
-                    yield "**开始深度探索**...\n"
-                    result = await self._async_exploration(task_query)
-                    if result:
-                        all_results["exploration"].append(result)
-                        self.thinking_engine.add_reasoning_step(f"深度探索结果摘要:\n{self._summarize_result(result)}")
-                        yield "✓ 深度探索完成\n\n"
-                        
-                elif task_type == "chain_exploration":
-                    yield "**开始Chain of Exploration**...\n"
-                    # 获取相关实体
-                    entities = task.get("entities", [])
-                    if not entities:
-                        # 如果任务没有指定实体，尝试从其他结果中提取
-                        entities = self._extract_entities_from_results(
-                            all_results["local"], 
-                            all_results["global"], 
-                            all_results["exploration"]
-                        )
-                        
-                        if entities:
-                            yield f"- 从已有结果中提取实体: {', '.join(entities[:3])}" + ("..." if len(entities) > 3 else "") + "\n"
-                    
-                    # 至少需要一个起始实体
-                    if not entities:
-                        yield "⚠️ 未找到起始实体，跳过Chain of Exploration\n\n"
-                        continue
-                        
-                    # 执行Chain of Exploration
-                    result = await self._async_chain_exploration(task_query, entities[:3])
-                    if result:
-                        all_results["chain_exploration"].append(result)
-                        
-                        # 添加结果到思考引擎
-                        path_summary = "探索路径:\n"
-                        for step in result.get('exploration_path', [])[:5]:
-                            path_summary += f"- 步骤{step.get('step')}: {step.get('node_id')} ({step.get('reasoning', '无理由')})\n"
-                        self.thinking_engine.add_reasoning_step(f"Chain of Exploration结果:\n{path_summary}")
-                        
-                        # 显示探索路径摘要
-                        if "exploration_path" in result:
-                            yield "- 探索路径:\n"
-                            for step in result["exploration_path"][:5]:
-                                yield f"  • 步骤{step.get('step')}: {step.get('node_id')}\n"
-                            
-                        if "content" in result:
-                            yield f"- 找到 {len(result['content'])} 条相关内容\n"
-                            
-                        yield "✓ Chain of Exploration完成\n\n"
-            
-            except Exception as e:
-                yield f"❌ {task_type}任务执行失败: {str(e)}\n\n"
-        
-        # 如果复杂度高，生成最终思考
-        if complexity > 0.7:
             yield "**正在基于所有搜索结果进行最终思考**...\n\n"
             self.thinking_engine.add_reasoning_step("基于所有搜索结果，更新我的思考")
-            updated_thinking = self.thinking_engine.update_thinking_based_on_verification([])
+            updated_thinking = await self._run_blocking(
+                self.thinking_engine.update_thinking_based_on_verification, []
+            )
             
             # 返回思考摘要
             thinking_lines = updated_thinking.split('\n')
@@ -597,7 +762,7 @@ class GraphRAGAgentCoordinator:
         # 获取思考过程
         thinking_process = self.thinking_engine.get_full_thinking() if complexity > 0.7 else None
         
-        final_answer = await self._async_synthesize(query, all_results, retrieval_plan, thinking_process)
+        final_answer = await self._async_synthesize(query, all_results, plan_json, thinking_process)
         
         # 清理答案 - 删除"引用数据"部分保留干净的回答
         clean_answer = final_answer
@@ -607,41 +772,64 @@ class GraphRAGAgentCoordinator:
         
         yield f"\n\n{clean_answer}"
     
+    def _add_reasoning_step(self, step: str):
+        """添加推理步骤，初步思考进行中时暂存"""
+        if self._deferred_reasoning_steps is not None:
+            self._deferred_reasoning_steps.append(step)
+        else:
+            self.thinking_engine.add_reasoning_step(step)
+    
+    def _start_initial_thinking(self) -> asyncio.Task:
+        """在线程池中开始生成初步思考，期间暂存任务的推理步骤"""
+        self._deferred_reasoning_steps = []
+        return asyncio.create_task(
+            self._run_blocking(self.thinking_engine.generate_initial_thinking)
+        )
+    
+    async def _finish_initial_thinking(self, thinking_task: asyncio.Task) -> str:
+        """等待初步思考完成，再按原顺序写入暂存的推理步骤"""
+        try:
+            return await thinking_task
+        finally:
+            deferred, self._deferred_reasoning_steps = self._deferred_reasoning_steps, None
+            # 等待被取消时工作线程可能仍在运行，此时不再写入
+            if thinking_task.done() and not thinking_task.cancelled():
+                for step in deferred or ():
+                    self.thinking_engine.add_reasoning_step(step)
+    
+    async def _run_blocking(self, func, *args, **kwargs):
+        """在协调器线程池中执行同步调用"""
+        return await asyncio.get_running_loop().run_in_executor(
+            self._executor, partial(func, *args, **kwargs)
+        )
+    
     async def _async_local_search(self, query):
         """异步执行本地搜索"""
-        def sync_search():
-            return self.local_searcher.search(query)
-        return await asyncio.get_event_loop().run_in_executor(None, sync_search)
+        return await self._run_blocking(self.local_searcher.search, query)
     
     async def _async_global_search(self, query):
         """异步执行全局搜索"""
-        def sync_search():
-            return self.global_searcher.search(query)
-        return await asyncio.get_event_loop().run_in_executor(None, sync_search)
+        return await self._run_blocking(self.global_searcher.search, query)
     
     async def _async_exploration(self, query):
         """异步执行探索"""
-        def sync_explore():
-            return self.explorer.search(query)
-        return await asyncio.get_event_loop().run_in_executor(None, sync_explore)
+        return await self._run_blocking(self.explorer.search, query)
     
     async def _async_chain_exploration(self, query, entities):
         """异步执行Chain of Exploration"""
-        def sync_explore():
-            return self.chain_explorer.explore(query, entities, max_steps=3)
-        return await asyncio.get_event_loop().run_in_executor(None, sync_explore)
+        return await self._run_blocking(self.chain_explorer.explore, query, entities, max_steps=3)
     
-    async def _async_synthesize(self, query, results, plan, thinking_process=None):
+    async def _async_synthesize(self, query, results, plan_json, thinking_process=None):
         """异步合成答案"""
-        def sync_synthesize():
-            return self.synthesizer.synthesize(query, results, plan, thinking_process)
-        return await asyncio.get_event_loop().run_in_executor(None, sync_synthesize)
+        return await self._run_blocking(self.synthesizer.synthesize, query, results, plan_json, thinking_process)
     
     def _log_step(self, step_type: str, description: str, data: Any = None):
-        """记录执行步骤"""
-        self.execution_trace.append({
-            "type": step_type,
-            "description": description,
-            "timestamp": time.time(),
-            "data": data
-        })
\ No newline at end of file
+        """记录执行步骤（单调时钟，不受系统时间调整影响）"""
+        self.execution_trace.append((time.monotonic_ns(), step_type, description, data))
+    
+    def _trace_as_dicts(self) -> List[Dict[str, Any]]:
+        """将执行轨迹转换为字典列表，timestamp为单调时钟秒数"""
+        return [
+            {"type": step_type, "description": description, "timestamp": ts / 1e9, "data": data}
+            for ts, step_type, description, data in self.execution_trace
+        ]
\ No newline at end of file
@@ -1,20 +1,163 @@
-from typing import List, Dict
+from typing import List, Dict, Any, TYPE_CHECKING
+from concurrent.futures import ThreadPoolExecutor
+from itertools import chain, count, islice
+import functools
+import hashlib
 import time
 import re
 import asyncio
-import traceback
+import logging
 import json
 
 from agent.base import BaseAgent
-from agent.agent_coordinator import GraphRAGAgentCoordinator
+from agent.utils import TTLCache, response_text
+from CacheManage.manager import CacheManager, SimpleCacheKeyStrategy
 from search.tool.local_search_tool import LocalSearchTool
 from search.tool.global_search_tool import GlobalSearchTool
-from search.tool.deeper_research_tool import DeeperResearchTool
-from search.tool.deep_research_tool import DeepResearchTool
-from search.tool.reasoning.chain_of_exploration import ChainOfExplorationSearcher
 from search.tool.reasoning.validator import complexity_estimate
-from search.tool.reasoning.evidence import EvidenceChainTracker
-from model.get_models import get_embeddings_model
+
+try:
+    import re2
+    RE2_AVAILABLE = True
+except ImportError:
+    RE2_AVAILABLE = False
+
+try:
+    import orjson
+    ORJSON_AVAILABLE = True
+except ImportError:
+    ORJSON_AVAILABLE = False
+
+# 深度研究工具、协调器、Chain of Exploration等模块会加载模型和图数据库驱动，
+# 在实际创建时才导入，以降低导入本模块的冷启动开销
+if TYPE_CHECKING:
+    from search.tool.deeper_research_tool import DeeperResearchTool
+    from search.tool.deep_research_tool import DeepResearchTool
+
+# 预编译的正则表达式
+_THINK_RE = re.compile(r'<think>.*?</think>\s*', re.DOTALL)  # 思考过程标签
+_SENT_SPLIT_RE = re.compile(r'([.!?。！？]\s*)')  # 句子切分（保留标点）
+# 假设列表的序号前缀，安装了google-re2时使用其线性时间的DFA引擎
+_HYPOTHESIS_PREFIX_RE = (re2 if RE2_AVAILABLE else re).compile(r'^\d+[\.\)、\-\s]+')
+_CONFIDENCE_RE = re.compile(r'可信度评分[^\d]{0,20}(\d{1,3})')  # 假设分析中的可信度评分（限定间隔，避免长文本回溯）
+
+# 流式输出合并阈值：累积字符数或距上次输出的时间达到任一阈值即输出
+_STREAM_BATCH_CHARS = 512
+_STREAM_BATCH_MS = 20
+
+# 流式处理中生产者与输出之间的队列容量，以及表示流结束的哨兵
+_STREAM_QUEUE_SIZE = 8
+_STREAM_END = object()
+
+# 缓存命中时，短于该长度的答案直接整体输出，不做分句
+_CACHED_STREAM_MIN_SPLIT = 256
+
+# 同步生成路径中等待后台矛盾检测的最长时间（秒），超时则不附加矛盾提示
+_CONTRADICTION_TIMEOUT = 30
+
+# LLM回答缓存：按调用类型划分命名空间，以提示中的可变输入（问题、假设、反事实分析）精确匹配。
+# 提示模板的固定说明占绝大部分，按整段提示做向量近似匹配会让不同问题互相命中
+_LLM_CACHE_NAMESPACES = ("hypothesis_generation", "counter_analysis", "hypothesis_analysis")
+_LLM_CACHE_MAX_ENTRIES = 10000
+_LLM_CACHE_MEMORY_SIZE = 500
+
+
+async def _batch_stream(stream, max_chars: int = _STREAM_BATCH_CHARS,
+                        max_delay_ms: float = _STREAM_BATCH_MS):
+    """
+    合并流式输出中的细碎文本片段，减少下游每个片段的事件循环往返和SSE帧开销
+    
+    非字符串片段（如最终结果字典）会先输出已累积的文本，再原样立即输出。
+    
+    参数:
+        stream: 异步生成器
+        max_chars: 累积字符数阈值
+        max_delay_ms: 累积文本的最长等待时间（毫秒）
+    """
+    iterator = stream.__aiter__()
+    max_delay = max_delay_ms / 1000
+    pending = []
+    pending_len = 0
+    deadline = None
+    next_task = None
+    try:
+        while True:
+            if next_task is None:
+                next_task = asyncio.ensure_future(iterator.__anext__())
+            
+            # 有累积内容时最多等到截止时间，超时则先输出已累积的内容
+            timeout = max(0.0, deadline - time.monotonic()) if pending else None
+            done, _ = await asyncio.wait({next_task}, timeout=timeout)
+            if not done:
+                yield "".join(pending)
+                pending.clear()
+                pending_len = 0
+                continue
+            
+            task, next_task = next_task, None
+            try:
+                chunk = task.result()
+            except StopAsyncIteration:
+                break
+            except Exception:
+                # 上游出错时先输出已累积的内容，再抛出异常
+                if pending:
+                    yield "".join(pending)
+                    pending.clear()
+                raise
+            
+            if isinstance(chunk, str):
+                if not pending:
+                    deadline = time.monotonic() + max_delay
+                pending.append(chunk)
+                pending_len += len(chunk)
+                if pending_len >= max_chars:
+                    yield "".join(pending)
+                    pending.clear()
+                    pending_len = 0
+            else:
+                if pending:
+                    yield "".join(pending)
+                    pending.clear()
+                    pending_len = 0
+                yield chunk
+        
+        # 输出任何剩余内容
+        if pending:
+            yield "".join(pending)
+    finally:
+        if next_task is not None:
+            next_task.cancel()
+
+
+# 进程内唯一ID：启动时刻加自增序号，同一秒内的多个查询也不会冲突
+_START_NS = time.monotonic_ns()
+_ID_COUNTER = count()
+
+
+def _new_id(prefix: str) -> str:
+    """生成进程内唯一的查询ID或分支名"""
+    return f"{prefix}_{_START_NS}_{next(_ID_COUNTER)}"
+
+
+def _dumps_json(obj: Any) -> str:
+    """序列化为JSON字符串（保留中文），安装了orjson时使用orjson"""
+    if ORJSON_AVAILABLE:
+        return orjson.dumps(obj, default=str, option=orjson.OPT_NON_STR_KEYS).decode("utf-8")
+    return json.dumps(obj, ensure_ascii=False, default=str)
+
+
+def _new_deep_research_tool() -> "DeepResearchTool":
+    """创建标准版深度研究工具（延迟导入）"""
+    from search.tool.deep_research_tool import DeepResearchTool
+    return DeepResearchTool()
+
+
+def _new_deeper_research_tool() -> "DeeperResearchTool":
+    """创建增强版深度研究工具（延迟导入）"""
+    from search.tool.deeper_research_tool import DeeperResearchTool
+    return DeeperResearchTool()
+
 
 class FusionGraphRAGAgent(BaseAgent):
     """
@@ -31,38 +174,45 @@ class FusionGraphRAGAgent(BaseAgent):
 
         self.use_deeper_tool = True
         self.has_all_tools = False
-        self.research_tool = DeepResearchTool()
+        # 标准版深度研究工具，_setup_tools在父类构造函数中注册它的工具。
+        # 研究工具保存了按查询变化的上下文和提取缓存，每个智能体实例各自创建，不跨实例共享；
+        # 无状态的LLM和嵌入模型客户端由get_models在进程内共享
+        self.research_tool = _new_deep_research_tool()
         
         # 调用父类构造函数
         super().__init__(cache_dir=self.cache_dir)
         
         # 创建协调器
+        from agent.agent_coordinator import GraphRAGAgentCoordinator
         self.coordinator = GraphRAGAgentCoordinator(self.llm)
         
-        # 初始化基础搜索工具 - 用于关键词提取
-        self.search_tool = LocalSearchTool()
+        # 基础搜索工具 - 用于关键词提取，与_setup_tools中的本地搜索工具为同一实例
+        self.search_tool = self.local_tool
         
         # 初始化深度研究工具 - 使用增强版本
         try:
             # 尝试加载增强版深度研究工具
-            self.research_tool = DeeperResearchTool()
+            self.research_tool = _new_deeper_research_tool()
             print("已加载增强版深度研究工具")
 
             # 获取各种专用工具
             self.chain_explorer = self.research_tool.get_exploration_tool()  # 知识图谱探索工具
             self.reasoning_analysis_tool = self.research_tool.get_reasoning_analysis_tool()  # 推理链分析工具
             self.stream_tool = self.research_tool.get_stream_tool()  # 流式处理工具
+            from search.tool.reasoning.evidence import EvidenceChainTracker
             self.evidence_tracker = EvidenceChainTracker()  # 证据链跟踪器
             
             # 设置为True表示成功加载了所有增强工具
             self.has_all_tools = True
         except Exception as e:
-            print(f"加载增强版研究工具失败: {e}，将使用标准版")
-            self.research_tool = DeepResearchTool()
+            logging.warning("加载增强版研究工具失败: %s，将使用标准版", e)
+            self.research_tool = _new_deep_research_tool()
             self.use_deeper_tool = False
             self.has_all_tools = False
             
             # 使用标准版的chain explorer
+            from search.tool.reasoning.chain_of_exploration import ChainOfExplorationSearcher
+            from model.get_models import get_embeddings_model
             self.chain_explorer = ChainOfExplorationSearcher(
                 self.graph, self.llm, get_embeddings_model()
             )
@@ -73,17 +223,43 @@ class FusionGraphRAGAgent(BaseAgent):
             except:
                 self.stream_tool = None
         
+        # 研究工具的能力在构造后即固定，预先取得可选方法的引用，避免每次请求重复探测
+        self._enhance_fn = getattr(self.research_tool, '_enhance_search_with_coe', None)
+        self._detect_fn = getattr(self.research_tool, '_detect_and_resolve_contradictions', None)
+        
         # 设置思考可见性
         self.show_thinking = False
         
-        # 添加查询历史记录，用于跟踪会话上下文
-        self.query_context = {}
+        # 记录各会话当前的查询ID，用于跟踪会话上下文
+        self.query_context = TTLCache(maxsize=1024, ttl=3600)
         
         # 跟踪已探索的查询分支
-        self.explored_branches = {}
+        self.explored_branches = TTLCache(maxsize=1024, ttl=3600)
         
-        # 矛盾检测结果缓存
-        self.contradiction_cache = {}
+        # 矛盾检测结果缓存，键为("q", 查询的SHA-256摘要)或("qid", 查询ID)
+        self.contradiction_cache = TTLCache(maxsize=1024, ttl=3600)
+        
+        # 关键词与复杂度的按查询记忆化结果，同一请求内多个环节重复调用时不再重复计算
+        self._keywords_memo = TTLCache(maxsize=2048, ttl=3600)
+        self._complexity_memo = TTLCache(maxsize=2048, ttl=3600)
+        # 同一会话重复提出同一问题（如切换模式重试）时复用已生成的假设结果
+        self._hypothesis_memo = TTLCache(maxsize=2048, ttl=3600)
+        
+        # 有界线程池，用于在流式处理中并发执行增强搜索、矛盾检测等阻塞调用
+        self._io_pool = ThreadPoolExecutor(max_workers=4, thread_name_prefix="fusion-io")
+        
+        # 假设生成与分支分析的LLM回答缓存，各命名空间相互独立，避免不同类型的回答互相命中；
+        # 只做精确匹配，不启用向量相似匹配
+        self.llm_caches = {
+            namespace: CacheManager(
+                key_strategy=SimpleCacheKeyStrategy(),
+                cache_dir=f"{self.cache_dir}/llm/{namespace}",
+                max_memory_size=_LLM_CACHE_MEMORY_SIZE,
+                max_disk_size=_LLM_CACHE_MAX_ENTRIES,
+                enable_vector_similarity=False
+            )
+            for namespace in _LLM_CACHE_NAMESPACES
+        }
     
     def _setup_tools(self) -> List:
         """设置工具"""
@@ -109,7 +285,7 @@ class FusionGraphRAGAgent(BaseAgent):
             tools.append(self.research_tool.get_tool())
         else:
             # 使用标准研究工具
-            self.deep_research = DeepResearchTool()
+            self.deep_research = _new_deep_research_tool()
             tools.append(self.deep_research.get_tool())
             
             # 如果有流式工具也添加
@@ -123,10 +299,30 @@ class FusionGraphRAGAgent(BaseAgent):
         # 简单的从检索直接到生成，具体逻辑由协调器处理
         workflow.add_edge("retrieve", "generate")
     
+    @staticmethod
+    def _canonical_key(query: str) -> str:
+        """
+        规范化查询作为回答缓存的键，使同步和流式路径命中同一缓存项
+        
+        CacheManager的键策略会自行哈希，并且向量相似匹配需要查询原文，
+        因此这里只做与BaseAgent一致的首尾空白清理，不做哈希
+        """
+        return query.strip()
+    
+    @staticmethod
+    def _query_digest(query: str) -> str:
+        """计算规范化查询的SHA-256摘要，用作内部缓存键，避免在内存中以原文保存查询"""
+        return hashlib.sha256(query.strip().lower().encode("utf-8")).hexdigest()
+    
     def _extract_keywords(self, query: str) -> Dict[str, List[str]]:
-        """提取查询关键词"""
-        # 使用搜索工具提取关键词
-        return self.search_tool.extract_keywords(query)
+        """提取查询关键词（按规范化查询记忆化）"""
+        key = self._canonical_key(query)
+        keywords = self._keywords_memo.get(key)
+        if keywords is None:
+            # 使用搜索工具提取关键词
+            keywords = self.search_tool.extract_keywords(query)
+            self._keywords_memo[key] = keywords
+        return keywords
     
     def _estimate_complexity(self, query: str) -> float:
         """
@@ -138,8 +334,13 @@ class FusionGraphRAGAgent(BaseAgent):
         返回:
             float: 复杂度评分 (0.0-1.0)
         """
-        # 使用复杂度估计器
-        return complexity_estimate(query)
+        key = self._canonical_key(query)
+        complexity = self._complexity_memo.get(key)
+        if complexity is None:
+            # 使用复杂度估计器
+            complexity = complexity_estimate(query)
+            self._complexity_memo[key] = complexity
+        return complexity
     
     def _generate_node(self, state):
         """生成回答节点逻辑"""
@@ -157,27 +358,28 @@ class FusionGraphRAGAgent(BaseAgent):
         except Exception:
             docs = "无法获取检索结果"
 
-        # 首先尝试全局缓存
-        global_result = self.global_cache_manager.get(question)
-        if global_result:
-            self._log_execution("generate", 
-                            {"question": question, "docs_length": len(docs)}, 
-                            "全局缓存命中")
-            return {"messages": [{"role": "assistant", "content": global_result}]}
-            
+        cache_key = self._canonical_key(question)
+
         # 获取当前会话ID
         thread_id = state.get("configurable", {}).get("thread_id", "default")
             
-        # 然后检查会话缓存
-        cached_result = self.cache_manager.get(question, thread_id=thread_id)
+        # 首先检查命中率更高的会话缓存；本Agent生成的回答总是同时写入两级缓存，
+        # 命中会话缓存时无需再同步到全局缓存
+        cached_result = self.cache_manager.get(cache_key, thread_id=thread_id)
         if cached_result:
             self._log_execution("generate", 
                             {"question": question, "docs_length": len(docs)}, 
                             "会话缓存命中")
-            # 将命中内容同步到全局缓存
-            self.global_cache_manager.set(question, cached_result)
             return {"messages": [{"role": "assistant", "content": cached_result}]}
         
+        # 然后尝试全局缓存
+        global_result = self.global_cache_manager.get(cache_key)
+        if global_result:
+            self._log_execution("generate", 
+                            {"question": question, "docs_length": len(docs)}, 
+                            "全局缓存命中")
+            return {"messages": [{"role": "assistant", "content": global_result}]}
+        
         # 使用协调器处理
         try:
             start_time = time.time()
@@ -192,37 +394,38 @@ class FusionGraphRAGAgent(BaseAgent):
                               "使用增强版深度研究工具")
                 
                 # 创建新的查询ID，用于跟踪
-                query_id = f"query_{int(time.time())}"
-                self.query_context[thread_id] = {"current_query_id": query_id}
+                query_id = _new_id("query")
+                self.query_context[thread_id] = query_id
                 
                 # 执行深度研究
                 result = self.research_tool.thinking(question)
                 answer = result.get("answer", "未能生成回答")
                 
-                # 如果有矛盾检测功能，进行矛盾检测
-                if hasattr(self.research_tool, '_detect_and_resolve_contradictions'):
+                # 如果有矛盾检测功能，在后台进行矛盾检测，同时清理答案
+                contradiction_future = None
+                if self._detect_fn is not None:
+                    contradiction_future = self._io_pool.submit(self._detect_fn, query_id)
+                
+                # 清理答案 - 删除思考过程部分（无匹配时subn返回原字符串）
+                clean_answer, _ = _THINK_RE.subn('', answer)
+                
+                if contradiction_future is not None:
                     try:
-                        contradiction_result = self.research_tool._detect_and_resolve_contradictions(query_id)
+                        contradiction_result = contradiction_future.result(timeout=_CONTRADICTION_TIMEOUT)
                         if contradiction_result and contradiction_result.get("contradictions"):
                             # 缓存矛盾检测结果
-                            self.contradiction_cache[question] = contradiction_result
+                            self.contradiction_cache[("q", self._query_digest(question))] = contradiction_result
                             # 如果发现矛盾，在答案中添加提示
                             if "<think>" not in answer:  # 确保不重复添加
-                                answer += "\n\n**注意**: 在分析过程中发现了信息来源中存在一些不一致之处。以上答案已尝试综合各方观点，提供最准确的信息。"
+                                clean_answer += "\n\n**注意**: 在分析过程中发现了信息来源中存在一些不一致之处。以上答案已尝试综合各方观点，提供最准确的信息。"
                     except Exception as e:
-                        print(f"矛盾检测失败: {e}")
-                
-                # 清理答案 - 删除思考过程部分
-                if "<think>" in answer and "</think>" in answer:
-                    clean_answer = re.sub(r'<think>.*?</think>\s*', '', answer, flags=re.DOTALL)
-                else:
-                    clean_answer = answer
+                        logging.warning("矛盾检测失败: %s", e)
             else:
                 # 使用协调器处理标准复杂度的查询
                 self._log_execution("coordinator", 
                               {"question": question, "complexity": complexity}, 
                               "使用标准协调器")
-                result = self.coordinator.process_query(question)
+                result = self.coordinator.process_query_sync(question)
                 answer = result.get("answer", "未能生成回答")
                 clean_answer = answer
             
@@ -234,9 +437,9 @@ class FusionGraphRAGAgent(BaseAgent):
             
             # 缓存结果 - 同时更新会话缓存和全局缓存
             # 更新会话缓存
-            self.cache_manager.set(question, clean_answer, thread_id=thread_id)
+            self.cache_manager.set(cache_key, clean_answer, thread_id=thread_id)
             # 更新全局缓存
-            self.global_cache_manager.set(question, clean_answer)
+            self.global_cache_manager.set(cache_key, clean_answer)
             
             self._log_execution("generate", 
                             {"question": question, "docs_length": len(docs)}, 
@@ -245,7 +448,9 @@ class FusionGraphRAGAgent(BaseAgent):
             return {"messages": [{"role": "assistant", "content": clean_answer}]}
             
         except Exception as e:
-            error_msg = f"生成回答时出错: {str(e)}\n{traceback.format_exc()}"
+            # 完整堆栈只写入日志，执行记录中保留简短错误信息
+            logging.exception("生成回答时出错: %s", e)
+            error_msg = f"生成回答时出错: {e!s}"
             self._log_execution("generate_error", 
                             {"question": question, "docs_length": len(docs)}, 
                             error_msg)
@@ -262,46 +467,74 @@ class FusionGraphRAGAgent(BaseAgent):
         返回:
             Dict: 增强搜索结果
         """
-        # 提取查询的关键词
-        keywords = self._extract_keywords(query)
-        
         # 使用Chain of Exploration增强搜索
-        async def enhance_wrapper():
+        def enhance_wrapper():
             # 防止报错的兜底逻辑
             try:
-                if hasattr(self.research_tool, '_enhance_search_with_coe'):
-                    return self.research_tool._enhance_search_with_coe(query, keywords)
+                # 提取查询的关键词
+                keywords = self._extract_keywords(query)
+                
+                if self._enhance_fn is not None:
+                    return self._enhance_fn(query, keywords)
                 else:
                     # 如果方法不存在，使用标准链式探索
-                    focus_entities = keywords.get("high_level", []) + keywords.get("low_level", [])
+                    # 使用前3个关注实体作为起点
+                    focus_entities = list(islice(
+                        chain(keywords.get("high_level", ()), keywords.get("low_level", ())), 3
+                    ))
                     if focus_entities:
                         return self.chain_explorer.explore(
                             query, 
-                            focus_entities[:3],  # 使用前3个关注实体作为起点
+                            focus_entities,
                             max_steps=3
                         )
                     return {}
             except Exception as e:
-                print(f"增强搜索失败: {e}")
+                logging.warning("增强搜索失败: %s", e)
                 return {}
         
-        return await asyncio.get_event_loop().run_in_executor(None, enhance_wrapper)
+        return await asyncio.get_running_loop().run_in_executor(self._io_pool, enhance_wrapper)
     
     async def _async_detect_contradictions(self, query_id):
         """异步检测矛盾"""
         # 检查缓存
-        if hasattr(self, '_contradiction_cache') and query_id in self._contradiction_cache:
-            return self._contradiction_cache[query_id]
+        cache_key = ("qid", query_id)
+        cached_result = self.contradiction_cache.get(cache_key)
+        if cached_result is not None:
+            return cached_result
             
         def detect_wrapper():
-            result = self._detect_and_resolve_contradictions(query_id)
+            result = self._detect_fn(query_id)
             # 更新缓存
-            if not hasattr(self, '_contradiction_cache'):
-                self._contradiction_cache = {}
-            self._contradiction_cache[query_id] = result
+            self.contradiction_cache[cache_key] = result
             return result
         
-        return await asyncio.get_event_loop().run_in_executor(None, detect_wrapper)
+        return await asyncio.get_running_loop().run_in_executor(self._io_pool, detect_wrapper)
+    
+    async def _consume_enhance_task(self, enhance_task) -> str:
+        """等待增强搜索任务并返回格式化后的知识路径消息，失败时返回空字符串"""
+        try:
+            return self._format_enhanced_path(await enhance_task)
+        except Exception as e:
+            # 打印错误但继续处理，不返回错误消息给用户
+            logging.warning("增强搜索失败: %s", e)
+            return ""
+    
+    def _format_enhanced_path(self, enhanced_context) -> str:
+        """将增强搜索结果中的探索路径格式化为流式输出消息，无可展示内容时返回空字符串"""
+        if not enhanced_context or "exploration_results" not in enhanced_context:
+            return ""
+        
+        # 提取探索路径
+        exp_results = enhanced_context["exploration_results"]
+        if "exploration_path" not in exp_results or len(exp_results["exploration_path"]) <= 1:
+            return ""
+        
+        path_msg = "\n**发现相关知识路径**:\n"
+        for i, step in enumerate(exp_results["exploration_path"][:5]):
+            if i > 0:  # 跳过起始实体
+                path_msg += f"- {step.get('node_id')}: {step.get('reasoning')[:50]}...\n"
+        return path_msg
     
     async def _stream_process(self, inputs, config):
         """流式处理过程"""
@@ -315,25 +548,35 @@ class FusionGraphRAGAgent(BaseAgent):
         thread_id = config.get("configurable", {}).get("thread_id", "default")
             
         # 检查缓存
-        cached_result = self.cache_manager.get(query.strip(), thread_id=thread_id)
+        cache_key = self._canonical_key(query)
+        cached_result = self.cache_manager.get(cache_key, thread_id=thread_id)
         if cached_result:
             self._log_execution("stream_cache_hit", {"query": query}, "缓存命中")
+            # 较短的答案一次性返回，无需切分
+            if len(cached_result) < _CACHED_STREAM_MIN_SPLIT:
+                yield cached_result
+                return
+            
             # 分块返回缓存结果
-            sentences = re.split(r'([.!?。！？]\s*)', cached_result)
-            buffer = ""
+            # 用列表暂存片段，避免反复拼接字符串
+            pending = []
+            pending_len = 0
             
-            for i in range(0, len(sentences)):
-                buffer += sentences[i]
+            for i, part in enumerate(_SENT_SPLIT_RE.split(cached_result)):
+                pending.append(part)
+                pending_len += len(part)
                 
                 # 当缓冲区包含完整句子或达到合理大小时输出
-                if (i % 2 == 1) or len(buffer) >= 40:
-                    yield buffer
-                    buffer = ""
-                    await asyncio.sleep(0.01)
+                if (i & 1) or pending_len >= 40:
+                    yield "".join(pending)
+                    pending.clear()
+                    pending_len = 0
+                    # 仅让出事件循环，不人为限速
+                    await asyncio.sleep(0)
             
             # 输出任何剩余内容
-            if buffer:
-                yield buffer
+            if pending:
+                yield "".join(pending)
             return
         
         # 估计查询复杂度
@@ -345,77 +588,97 @@ class FusionGraphRAGAgent(BaseAgent):
             yield "**开始进行深度分析**...\n\n"
             
             # 创建新的查询ID，用于跟踪
-            query_id = f"query_{int(time.time())}"
-            self.query_context[thread_id] = {"current_query_id": query_id}
+            query_id = _new_id("query")
+            self.query_context[thread_id] = query_id
             
-            try:
-                # 尝试使用社区感知增强搜索
-                yield "**分析相关知识社区与实体关联**...\n"
-                enhanced_context = await self._async_enhance_search(query, thread_id)
-                
-                if enhanced_context:
-                    # 如果找到了相关社区或实体
-                    if "exploration_results" in enhanced_context:
-                        # 提取探索路径
-                        exp_results = enhanced_context["exploration_results"]
-                        if "exploration_path" in exp_results and len(exp_results["exploration_path"]) > 1:
-                            path_msg = "\n**发现相关知识路径**:\n"
-                            for i, step in enumerate(exp_results["exploration_path"][:5]):
-                                if i > 0:  # 跳过起始实体
-                                    path_msg += f"- {step.get('node_id')}: {step.get('reasoning')[:50]}...\n"
-                            yield path_msg
-            except Exception as e:
-                # 打印错误但继续处理
-                print(f"增强搜索失败: {e}")
-                # 不返回错误消息给用户，继续正常流程
+            # 矛盾检测与整个LLM流并行执行
+            contradiction_task = None
+            if self._detect_fn is not None:
+                contradiction_task = asyncio.create_task(self._async_detect_contradictions(query_id))
             
-            # 使用深度研究工具的流式思考方法
+            # 尝试使用社区感知增强搜索，与深度研究的思考流并行执行
+            yield "**分析相关知识社区与实体关联**...\n"
+            enhance_task = asyncio.create_task(self._async_enhance_search(query, thread_id))
+            
+            # 使用深度研究工具的流式思考方法：生产者在后台任务中拉取思考流写入有界队列，
+            # 这里的输出和答案后处理不会阻塞上游的流式生成
+            queue = asyncio.Queue(maxsize=_STREAM_QUEUE_SIZE)
+            
+            async def produce():
+                try:
+                    async for item in _batch_stream(self.research_tool.thinking_stream(query)):
+                        await queue.put(item)
+                finally:
+                    await queue.put(_STREAM_END)
+            
+            producer = asyncio.create_task(produce())
             try:
-                last_chunk = None
-                async for chunk in self.research_tool.thinking_stream(query):
+                final_chunk = None
+                while (chunk := await queue.get()) is not _STREAM_END:
+                    # 增强搜索完成后，在下一个输出点插入发现的知识路径
+                    if enhance_task is not None and enhance_task.done():
+                        path_msg = await self._consume_enhance_task(enhance_task)
+                        enhance_task = None
+                        if path_msg:
+                            yield path_msg
+                    
                     if isinstance(chunk, dict) and "answer" in chunk:
-                        # 这是最终结果对象
-                        final_answer = chunk["answer"]
-                        last_chunk = chunk
-                        
-                        # 在最终答案之前添加矛盾检测结果
+                        # 这是最终结果对象，在流结束后处理
+                        final_chunk = chunk
+                    else:
+                        # 返回思考过程
+                        yield chunk
+                
+                # 传播生产者中的异常
+                await producer
+                
+                # 增强搜索的结果最晚在最终答案之前输出
+                if enhance_task is not None:
+                    path_msg = await self._consume_enhance_task(enhance_task)
+                    enhance_task = None
+                    if path_msg:
+                        yield path_msg
+                
+                if final_chunk is not None:
+                    final_answer = final_chunk["answer"]
+                    
+                    # 在最终答案之前添加矛盾检测结果
+                    if contradiction_task is not None:
                         try:
-                            # 检测矛盾
-                            contradiction_result = await self._async_detect_contradictions(query_id)
+                            contradiction_result = await contradiction_task
                             
                             if contradiction_result["contradictions"]:
                                 yield "\n**信息一致性分析**：发现信息中存在一些不一致之处。在综合答案时已考虑这些因素。\n\n"
                         except Exception as e:
                             # 矛盾检测失败，不影响正常流程
-                            print(f"矛盾检测失败: {e}")
-                        
-                        # 清理答案，移除思考过程
-                        if "<think>" in final_answer and "</think>" in final_answer:
-                            clean_answer = re.sub(r'<think>.*?</think>\s*', '', final_answer, flags=re.DOTALL)
-                            
-                            # 缓存清理后的答案
-                            self.cache_manager.set(query, clean_answer, thread_id=thread_id)
-                            self.global_cache_manager.set(query, clean_answer)
-                            
-                            yield clean_answer
-                        else:
-                            # 没有思考标记，直接使用
-                            self.cache_manager.set(query, final_answer, thread_id=thread_id)
-                            self.global_cache_manager.set(query, final_answer)
-                            
-                            yield final_answer
-                    else:
-                        # 返回思考过程
-                        yield chunk
+                            logging.warning("矛盾检测失败: %s", e)
+                        contradiction_task = None
+                    
+                    # 清理答案，移除思考过程；没有思考标记时直接使用原答案
+                    clean_answer, _ = _THINK_RE.subn('', final_answer)
+                    
+                    # 缓存清理后的答案
+                    self.cache_manager.set(cache_key, clean_answer, thread_id=thread_id)
+                    self.global_cache_manager.set(cache_key, clean_answer)
+                    
+                    yield clean_answer
             except Exception as e:
-                error_msg = f"深度研究过程中出错: {str(e)}"
-                print(error_msg)
+                logging.warning("深度研究过程中出错: %s", e)
                 yield f"**处理查询时出错**: {str(e)}"
+            finally:
+                # 流提前结束时取消尚未消费的后台任务，已完成的任务取走异常避免未处理告警
+                for task in (producer, enhance_task, contradiction_task):
+                    if task is None:
+                        continue
+                    if not task.done():
+                        task.cancel()
+                    elif not task.cancelled():
+                        task.exception()
         else:
             # 使用协调器的标准流式处理
             try:
                 self._log_execution("stream_process_start", {"query": query}, "开始流式处理")
-                async for chunk in self.coordinator.process_query_stream(query):
+                async for chunk in _batch_stream(self.coordinator.process_query_stream(query)):
                     yield chunk
                 
                 # 注意：协调器内部会处理缓存
@@ -439,8 +702,8 @@ class FusionGraphRAGAgent(BaseAgent):
         """
         # 提取关键词作为起始实体
         keywords = self._extract_keywords(query)
-        entities = keywords.get("high_level", []) + keywords.get("low_level", [])
-        entities = entities[:3]  # 最多使用3个实体
+        # 最多使用3个实体，只取所需的前几项，不拼接完整列表
+        entities = list(islice(chain(keywords.get("high_level", ()), keywords.get("low_level", ())), 3))
         
         # 检查是否有实体
         if not entities:
@@ -502,8 +765,7 @@ class FusionGraphRAGAgent(BaseAgent):
                 yield "未找到清晰的知识探索路径。"
                 
         except Exception as e:
-            error_msg = f"知识探索过程中出错: {str(e)}"
-            print(error_msg)
+            logging.warning("知识探索过程中出错: %s", e)
             yield f"**探索过程中出错**: {str(e)}"
     
     async def analyze_reasoning_chain(self, query_id=None, thread_id="default"):
@@ -524,9 +786,8 @@ class FusionGraphRAGAgent(BaseAgent):
             
         # 如果未提供查询ID，尝试从会话上下文获取
         if not query_id:
-            if thread_id in self.query_context and "current_query_id" in self.query_context[thread_id]:
-                query_id = self.query_context[thread_id]["current_query_id"]
-            else:
+            query_id = self.query_context.get(thread_id)
+            if not query_id:
                 yield "未找到有效的查询ID，请先执行一次深度研究查询。"
                 return
         
@@ -580,8 +841,8 @@ class FusionGraphRAGAgent(BaseAgent):
                 stats = results["evidence_stats"]
                 yield "**证据来源统计**:\n\n"
                 
-                for source, count in stats.items():
-                    yield f"- {source}: {count}项\n"
+                for source, source_count in stats.items():
+                    yield f"- {source}: {source_count}项\n"
                 
                 yield "\n"
                 
@@ -601,8 +862,7 @@ class FusionGraphRAGAgent(BaseAgent):
                     yield f"(共有 {len(steps)} 个推理步骤，仅显示前5个)\n"
             
         except Exception as e:
-            error_msg = f"分析推理链时出错: {str(e)}"
-            print(error_msg)
+            logging.warning("分析推理链时出错: %s", e)
             yield f"**分析过程中出错**: {str(e)}"
     
     async def detect_contradictions(self, query, thread_id="default"):
@@ -622,8 +882,9 @@ class FusionGraphRAGAgent(BaseAgent):
             return
             
         # 首先检查缓存
-        if query in self.contradiction_cache:
-            cached_result = self.contradiction_cache[query]
+        cache_key = ("q", self._query_digest(query))
+        cached_result = self.contradiction_cache.get(cache_key)
+        if cached_result is not None:
             yield f"**从缓存中获取矛盾分析结果**\n\n"
             
             # 显示缓存的矛盾结果
@@ -645,8 +906,8 @@ class FusionGraphRAGAgent(BaseAgent):
         yield "**开始检测信息矛盾**...\n\n"
         
         # 创建新的查询ID用于此次分析
-        query_id = f"query_{int(time.time())}"
-        self.query_context[thread_id] = {"current_query_id": query_id}
+        query_id = _new_id("query")
+        self.query_context[thread_id] = query_id
         
         if hasattr(self.research_tool, 'detect_contradictions'):
             # 如果直接有矛盾检测方法
@@ -654,7 +915,7 @@ class FusionGraphRAGAgent(BaseAgent):
                 result = self.research_tool.detect_contradictions(query, thread_id)
                 
                 # 缓存结果
-                self.contradiction_cache[query] = result
+                self.contradiction_cache[cache_key] = result
                 
                 # 显示矛盾分析结果
                 if result["has_contradictions"]:
@@ -675,7 +936,7 @@ class FusionGraphRAGAgent(BaseAgent):
                 else:
                     yield "**分析结果**: 未在信息来源中检测到明显矛盾。"
             except Exception as e:
-                print(f"矛盾检测失败: {e}")
+                logging.warning("矛盾检测失败: %s", e)
                 yield f"**检测过程中出错**: {str(e)}"
         else:
             # 没有专用方法，执行深度思考后检测矛盾
@@ -695,8 +956,12 @@ class FusionGraphRAGAgent(BaseAgent):
                     # 提取矛盾信息
                     contradictions = analysis_result.get("contradictions", [])
                     
-                    # 缓存矛盾结果
-                    self.contradiction_cache[query] = {"contradictions": contradictions}
+                    # 缓存矛盾结果，同时保存序列化后的矛盾列表供提示构建复用
+                    contradictions_json = _dumps_json(contradictions)
+                    self.contradiction_cache[cache_key] = {
+                        "contradictions": contradictions,
+                        "contradictions_json": contradictions_json
+                    }
                     
                     if contradictions:
                         yield f"**发现 {len(contradictions)} 个信息矛盾**:\n\n"
@@ -714,13 +979,13 @@ class FusionGraphRAGAgent(BaseAgent):
                         impact_prompt = f"""
                         在回答关于"{query}"的问题时，发现以下信息矛盾:
                         
-                        {json.dumps(contradictions, ensure_ascii=False)}
+                        {contradictions_json}
                         
                         请分析这些矛盾对最终答案可能产生的影响，以及如何在存在这些矛盾的情况下给出最准确的回答。
                         """
                         
                         impact_response = self.llm.invoke(impact_prompt)
-                        impact_analysis = impact_response.content if hasattr(impact_response, 'content') else str(impact_response)
+                        impact_analysis = response_text(impact_response)
                         
                         yield "\n**矛盾对结论的影响分析**:\n\n"
                         yield impact_analysis
@@ -729,10 +994,39 @@ class FusionGraphRAGAgent(BaseAgent):
                 else:
                     yield "**注意**: 无法执行详细的矛盾分析，因为缺少推理分析工具。"
             except Exception as e:
-                print(f"矛盾检测失败: {e}")
+                logging.warning("矛盾检测失败: %s", e)
                 yield f"**检测过程中出错**: {str(e)}"
 
-    def generate_multi_hypothesis(self, query, thread_id="default", max_hypotheses=3):
+    async def _generate_hypotheses(self, query, hypothesis_prompt, max_hypotheses) -> List[str]:
+        """调用查询生成器或LLM生成假设列表"""
+        # 使用查询生成器生成假设，其内部为同步LLM调用，放到线程池中执行
+        if hasattr(self.research_tool, 'query_generator'):
+            return await asyncio.get_running_loop().run_in_executor(
+                self._io_pool,
+                functools.partial(
+                    self.research_tool.query_generator.generate_multiple_hypotheses,
+                    query, self.llm, max_hypotheses=max_hypotheses
+                )
+            )
+        
+        # 直接使用LLM生成假设
+        hypothesis_text = await self._ainvoke_text(hypothesis_prompt)
+        
+        # 解析假设：移除数字、破折号等前缀，按出现顺序去重，达到最大数量后不再解析剩余行
+        strip_prefix = _HYPOTHESIS_PREFIX_RE.sub
+        seen = set()
+        hypotheses = []
+        for line in hypothesis_text.splitlines():
+            clean_line = strip_prefix('', line).strip()
+            if clean_line and clean_line not in seen:
+                seen.add(clean_line)
+                hypotheses.append(clean_line)
+                if len(hypotheses) >= max_hypotheses:
+                    break
+        return hypotheses
+    
+    async def generate_multi_hypothesis(self, query, thread_id="default", max_hypotheses=3,
+                                        update_context=True):
         """
         为复杂查询生成多个假设
         
@@ -740,6 +1034,8 @@ class FusionGraphRAGAgent(BaseAgent):
             query: 用户问题
             thread_id: 会话ID
             max_hypotheses: 最大假设数
+            update_context: 是否将本次查询ID记为该会话的当前查询；
+                结果只用于展示、由其他流程产生回答时应传False
             
         返回:
             Dict: 假设结果
@@ -755,14 +1051,15 @@ class FusionGraphRAGAgent(BaseAgent):
             if complexity < 0.5:
                 return {"error": "查询复杂度较低，不需要多假设分析", "complexity": complexity}
             
-            # 使用查询生成器生成假设
-            if hasattr(self.research_tool, 'query_generator'):
-                hypotheses = self.research_tool.query_generator.generate_multiple_hypotheses(
-                    query, self.llm, max_hypotheses=max_hypotheses
-                )
-            else:
-                # 直接使用LLM生成假设
-                hypothesis_prompt = f"""
+            memo_key = (thread_id, self._canonical_key(query), max_hypotheses)
+            memoized = self._hypothesis_memo.get(memo_key)
+            if memoized is not None:
+                # 恢复该结果对应的查询ID，使后续的推理链分析指向同一查询
+                if update_context:
+                    self.query_context[thread_id] = memoized["query_id"]
+                return memoized
+            
+            hypothesis_prompt = f"""
                 针对问题: "{query}"
                 
                 请生成 {max_hypotheses} 个不同的假设或可能的答案路径。这些假设应该:
@@ -772,25 +1069,23 @@ class FusionGraphRAGAgent(BaseAgent):
                 
                 请直接列出假设，无需额外解释。
                 """
-                
-                response = self.llm.invoke(hypothesis_prompt)
-                response_text = response.content if hasattr(response, 'content') else str(response)
-                
-                # 解析假设
-                hypotheses = []
-                lines = response_text.strip().split('\n')
-                for line in lines:
-                    # 移除数字、破折号等前缀
-                    clean_line = re.sub(r'^\d+[\.\)、\-\s]+', '', line).strip()
-                    if clean_line and clean_line not in hypotheses:
-                        hypotheses.append(clean_line)
-                
-                # 限制最大数量
-                hypotheses = hypotheses[:max_hypotheses]
+            
+            # 相同的问题直接复用已生成的假设
+            hypothesis_cache, cache_key = self._llm_cache_entry(("hypothesis_generation", query, max_hypotheses))
+            loop = asyncio.get_running_loop()
+            hypotheses = await loop.run_in_executor(
+                self._io_pool, functools.partial(hypothesis_cache.get, cache_key, skip_validation=True)
+            )
+            
+            if hypotheses is None:
+                hypotheses = await self._generate_hypotheses(query, hypothesis_prompt, max_hypotheses)
+                if hypotheses:
+                    await loop.run_in_executor(self._io_pool, hypothesis_cache.set, cache_key, hypotheses)
             
             # 创建新的查询ID
-            query_id = f"query_{int(time.time())}"
-            self.query_context[thread_id] = {"current_query_id": query_id}
+            query_id = _new_id("query")
+            if update_context:
+                self.query_context[thread_id] = query_id
             
             # 为假设创建分支
             branch_results = {}
@@ -805,14 +1100,17 @@ class FusionGraphRAGAgent(BaseAgent):
                     "branch_id": i+1
                 }
             
-            return {
+            result = {
                 "query_id": query_id,
                 "hypotheses": hypotheses,
                 "branches": branch_results,
                 "complexity": complexity
             }
+            if hypotheses:
+                self._hypothesis_memo[memo_key] = result
+            return result
         except Exception as e:
-            print(f"假设生成失败: {e}")
+            logging.warning("假设生成失败: %s", e)
             return {"error": f"假设生成失败: {str(e)}"}
 
     async def analyze_branch(self, branch_data, thread_id="default"):
@@ -820,7 +1118,8 @@ class FusionGraphRAGAgent(BaseAgent):
         分析特定假设分支
         
         参数:
-            branch_data: 分支信息，包含query和hypothesis
+            branch_data: 分支信息，包含query和hypothesis；可选chained为True时，
+                假设分析基于反事实分析的结果依次进行，否则两者并发执行
             thread_id: 会话ID
             
         返回:
@@ -836,75 +1135,297 @@ class FusionGraphRAGAgent(BaseAgent):
         
         yield f"**开始分析假设**: {hypothesis}\n\n"
         
-        # 创建反事实思考提示
-        counter_prompt = f"""
-        请分析以下问题和假设:
+        if branch_data.get("chained"):
+            async for chunk in self._analyze_branch_chained(query, hypothesis):
+                yield chunk
+            return
         
-        问题: {query}
-        假设: {hypothesis}
+        # 反事实分析与假设分析相互独立，并发流式调用LLM：
+        # 反事实分析实时输出，假设分析在此期间写入队列缓冲，随后接着输出
+        sections = (
+            ("**正在进行反事实分析**...\n\n", self._counter_prompt(query, hypothesis),
+             ("counter_analysis", query, hypothesis)),
+            ("**假设分析**:\n\n", self._hypothesis_analysis_prompt(query, hypothesis),
+             ("hypothesis_analysis", query, hypothesis, None)),
+        )
+        queues = [asyncio.Queue() for _ in sections]
+        pumps = [
+            asyncio.create_task(self._pump_stream(self._astream_text(prompt, cache_key), queue))
+            for (_, prompt, cache_key), queue in zip(sections, queues)
+        ]
+        try:
+            texts = []
+            for (title, _, _), queue in zip(sections, queues):
+                yield title
+                pieces = []
+                async for piece in self._drain_queue(queue):
+                    pieces.append(piece)
+                    yield piece
+                yield "\n\n"
+                texts.append("".join(pieces))
+            
+            # 更新分支信息
+            self._record_branch(hypothesis, *texts)
+            
+        except Exception as e:
+            logging.warning("分支分析失败: %s", e)
+            yield f"**分析过程中出错**: {str(e)}"
+        finally:
+            for pump in pumps:
+                pump.cancel()
+    
+    async def _analyze_branch_chained(self, query, hypothesis):
+        """先生成反事实分析，再基于其结果进行假设分析的串行分支分析"""
+        try:
+            # 使用LLM生成反事实分析
+            yield "**正在进行反事实分析**...\n\n"
+            pieces = []
+            async for piece in _batch_stream(self._astream_text(
+                self._counter_prompt(query, hypothesis), ("counter_analysis", query, hypothesis)
+            )):
+                pieces.append(piece)
+                yield piece
+            counter_analysis = "".join(pieces)
+            yield "\n\n"
+            
+            # 使用LLM生成假设分析
+            yield "**假设分析**:\n\n"
+            pieces = []
+            async for piece in _batch_stream(self._astream_text(
+                self._hypothesis_analysis_prompt(query, hypothesis, counter_analysis),
+                ("hypothesis_analysis", query, hypothesis, counter_analysis)
+            )):
+                pieces.append(piece)
+                yield piece
+            
+            # 更新分支信息
+            self._record_branch(hypothesis, counter_analysis, "".join(pieces))
+            
+        except Exception as e:
+            logging.warning("分支分析失败: %s", e)
+            yield f"**分析过程中出错**: {str(e)}"
+    
+    @staticmethod
+    async def _pump_stream(stream, queue, batch=True):
+        """
+        将流式片段写入队列，结束时写入哨兵；上游出错时先写入异常对象
+        
+        参数:
+            stream: 异步生成器
+            queue: 目标队列
+            batch: 是否先合并细碎片段，上游已合并过时传False
+        """
+        try:
+            async for piece in (_batch_stream(stream) if batch else stream):
+                queue.put_nowait(piece)
+        except Exception as e:
+            queue.put_nowait(e)
+        finally:
+            queue.put_nowait(_STREAM_END)
+    
+    @staticmethod
+    async def _drain_queue(queue):
+        """依次输出队列中的片段直到哨兵，遇到异常对象时抛出"""
+        while True:
+            piece = await queue.get()
+            if piece is _STREAM_END:
+                return
+            if isinstance(piece, Exception):
+                raise piece
+            yield piece
+    
+    async def analyze_all_branches(self, query, hypotheses, thread_id="default"):
+        """
+        并发分析多个假设分支，每个分支完成后立即按分支输出其分析结果
+        
+        参数:
+            query: 用户问题
+            hypotheses: 假设列表
+            thread_id: 会话ID
+            
+        返回:
+            AsyncGenerator: 流式分析结果
+        """
+        tasks = [
+            asyncio.create_task(self._analyze_branch_collect(query, hypothesis, branch_id))
+            for branch_id, hypothesis in enumerate(hypotheses, 1)
+        ]
+        try:
+            for next_done in asyncio.as_completed(tasks):
+                result = await next_done
+                yield f"**[假设{result['branch_id']}] {result['hypothesis']}**\n\n"
+                
+                if "error" in result:
+                    yield f"**分析过程中出错**: {result['error']}\n\n"
+                    continue
+                
+                yield "**反事实分析**:\n\n"
+                yield result["counter_analysis"] + "\n\n"
+                yield "**假设分析**:\n\n"
+                yield result["hypothesis_analysis"] + "\n\n"
+        finally:
+            for task in tasks:
+                task.cancel()
+    
+    async def _analyze_branch_collect(self, query, hypothesis, branch_id) -> Dict[str, Any]:
+        """完整分析单个假设分支并返回结果字典，出错时在结果中记录错误信息"""
+        result = {"branch_id": branch_id, "hypothesis": hypothesis}
+        try:
+            # 反事实分析与假设分析并发执行
+            counter_analysis, hypothesis_analysis = await asyncio.gather(
+                self._ainvoke_text(self._counter_prompt(query, hypothesis),
+                                   ("counter_analysis", query, hypothesis)),
+                self._ainvoke_text(self._hypothesis_analysis_prompt(query, hypothesis),
+                                   ("hypothesis_analysis", query, hypothesis, None))
+            )
+            result.update(self._record_branch(hypothesis, counter_analysis, hypothesis_analysis))
+        except Exception as e:
+            logging.warning("分支分析失败: %s", e)
+            result["error"] = str(e)
+        return result
+    
+    def _llm_cache_entry(self, cache_key):
+        """
+        取LLM回答缓存及其键
+        
+        参数:
+            cache_key: (命名空间, 可变输入...)，为None时不使用缓存
+            
+        返回:
+            tuple: (缓存, 可变输入的SHA-256摘要)，不使用缓存时为(None, None)
+        """
+        if cache_key is None:
+            return None, None
+        namespace, *inputs = cache_key
+        digest = hashlib.sha256(_dumps_json(inputs).encode("utf-8")).hexdigest()
+        return self.llm_caches.get(namespace), digest
+    
+    async def _ainvoke_text(self, prompt, cache_key=None) -> str:
+        """
+        异步调用LLM并返回文本内容，LLM不支持ainvoke时在线程池中执行
+        
+        参数:
+            prompt: 提示文本
+            cache_key: (命名空间, 可变输入...)，按可变输入精确匹配缓存；为None时不使用缓存
+            
+        返回:
+            str: LLM回答文本
+        """
+        loop = asyncio.get_running_loop()
+        cache, key = self._llm_cache_entry(cache_key)
+        if cache is not None:
+            # 磁盘读取是阻塞操作，放到线程池中执行
+            cached = await loop.run_in_executor(
+                self._io_pool, functools.partial(cache.get, key, skip_validation=True)
+            )
+            if cached is not None:
+                return cached
+        
+        ainvoke = getattr(self.llm, 'ainvoke', None)
+        if ainvoke is not None:
+            response = await ainvoke(prompt)
+        else:
+            response = await loop.run_in_executor(self._io_pool, self.llm.invoke, prompt)
+        text = response_text(response)
+        
+        if cache is not None and text:
+            await loop.run_in_executor(self._io_pool, cache.set, key, text)
+        return text
+    
+    async def _astream_text(self, prompt, cache_key=None):
+        """
+        流式调用LLM并逐段输出回答文本；命中缓存或LLM不支持astream时一次性输出完整回答
+        
+        参数:
+            prompt: 提示文本
+            cache_key: (命名空间, 可变输入...)，按可变输入精确匹配缓存；为None时不使用缓存
+            
+        返回:
+            AsyncGenerator: 回答文本片段
+        """
+        astream = getattr(self.llm, 'astream', None)
+        if astream is None:
+            yield await self._ainvoke_text(prompt, cache_key)
+            return
+        
+        loop = asyncio.get_running_loop()
+        cache, key = self._llm_cache_entry(cache_key)
+        if cache is not None:
+            cached = await loop.run_in_executor(
+                self._io_pool, functools.partial(cache.get, key, skip_validation=True)
+            )
+            if cached is not None:
+                yield cached
+                return
         
-        请进行反事实分析，思考如果该假设不成立会怎样。具体来说:
+        pieces = []
+        async for chunk in astream(prompt):
+            piece = response_text(chunk)
+            if piece:
+                pieces.append(piece)
+                yield piece
+        
+        text = "".join(pieces)
+        if cache is not None and text:
+            await loop.run_in_executor(self._io_pool, cache.set, key, text)
+    
+    @staticmethod
+    def _counter_prompt(query, hypothesis) -> str:
+        """创建反事实思考提示（固定说明和问题在前、假设在后，各分支共享相同的提示前缀）"""
+        return f"""
+        请针对下面的问题和假设进行反事实分析，思考如果该假设不成立会怎样。具体来说:
         1. 如果假设不正确，哪些条件必须不成立？
         2. 有哪些证据可能直接反驳这个假设？
         3. 这个假设可能忽略了哪些重要因素？
         
         请提供详细分析。
+        
+        问题: {query}
+        假设: {hypothesis}
         """
+    
+    @staticmethod
+    def _hypothesis_analysis_prompt(query, hypothesis, counter_analysis=None) -> str:
+        """
+        构建假设分析提示，未提供反事实分析时仅基于问题和假设进行评估
         
-        try:
-            # 使用LLM生成反事实分析
-            response = self.llm.invoke(counter_prompt)
-            counter_analysis = response.content if hasattr(response, 'content') else str(response)
-            
-            # 构建分析提示
-            analysis_prompt = f"""
-            请基于以下问题和假设进行深入分析:
-            
-            问题: {query}
-            假设: {hypothesis}
-            
+        固定说明和问题在前、假设及反事实分析在后，各分支共享相同的提示前缀
+        """
+        counter_section = f"""
             反事实分析: {counter_analysis}
-            
-            请评估这个假设的可靠性和可能的证据支持:
+            """ if counter_analysis is not None else ""
+        return f"""
+            请基于下面的问题和假设进行深入分析，评估这个假设的可靠性和可能的证据支持:
             1. 支持该假设的可能证据有哪些？
             2. 该假设解释了问题的哪些方面？
             3. 该假设忽略了哪些关键因素？
             4. 总体可信度评分(0-100)
-            """
-            
-            yield "**正在进行反事实分析**...\n\n"
-            yield counter_analysis + "\n\n"
-            
-            # 使用LLM生成假设分析
-            response = self.llm.invoke(analysis_prompt)
-            hypothesis_analysis = response.content if hasattr(response, 'content') else str(response)
             
-            yield "**假设分析**:\n\n"
-            yield hypothesis_analysis
-            
-            # 提取可信度评分
-            confidence_match = re.search(r'可信度评分.*?(\d+)', hypothesis_analysis)
-            confidence = int(confidence_match.group(1)) if confidence_match else 50
-            
-            # 更新分支信息
-            branch_name = f"branch_{int(time.time())}"
-            self.explored_branches[branch_name] = {
-                "hypothesis": hypothesis,
-                "counter_analysis": counter_analysis,
-                "hypothesis_analysis": hypothesis_analysis,
-                "confidence": confidence
-            }
-            
-        except Exception as e:
-            print(f"分支分析失败: {e}")
-            yield f"**分析过程中出错**: {str(e)}"
+            问题: {query}
+            假设: {hypothesis}
+            {counter_section}"""
+    
+    def _record_branch(self, hypothesis, counter_analysis, hypothesis_analysis) -> Dict[str, Any]:
+        """提取可信度评分并记录已探索的分支，返回分支信息"""
+        confidence_match = _CONFIDENCE_RE.search(hypothesis_analysis)
+        confidence = min(100, max(0, int(confidence_match.group(1)))) if confidence_match else 50
+        
+        branch = {
+            "hypothesis": hypothesis,
+            "counter_analysis": counter_analysis,
+            "hypothesis_analysis": hypothesis_analysis,
+            "confidence": confidence
+        }
+        self.explored_branches[_new_id("branch")] = branch
+        return branch
 
     async def run_advanced_query(self, advanced_query, thread_id="default"):
         """
         运行高级查询，支持各种增强功能
         
         参数:
-            advanced_query: 高级查询信息，包含query和mode字段
+            advanced_query: 高级查询信息，包含query和mode字段；multi_hypothesis模式下
+                可设置analyze_branches为True，并发分析生成的所有假设
             thread_id: 会话ID
             
         返回:
@@ -935,7 +1456,7 @@ class FusionGraphRAGAgent(BaseAgent):
         elif mode == "multi_hypothesis":
             # 多假设生成模式
             max_hyp = advanced_query.get("max_hypotheses", 3)
-            result = self.generate_multi_hypothesis(query, thread_id, max_hyp)
+            result = await self.generate_multi_hypothesis(query, thread_id, max_hyp)
             
             if "error" in result:
                 yield f"**错误**: {result['error']}"
@@ -947,6 +1468,12 @@ class FusionGraphRAGAgent(BaseAgent):
                 
                 yield f"\n**查询复杂度**: {result['complexity']:.2f}/1.0\n"
                 yield f"**查询ID**: {result['query_id']}\n"
+                
+                # 可选：并发分析所有假设分支
+                if advanced_query.get("analyze_branches") and result["hypotheses"]:
+                    yield "\n**并行分析各假设分支**...\n\n"
+                    async for chunk in self.analyze_all_branches(query, result["hypotheses"], thread_id):
+                        yield chunk
         elif mode == "branch_analysis":
             # 分支分析模式
             hypothesis = advanced_query.get("hypothesis")
@@ -965,20 +1492,31 @@ class FusionGraphRAGAgent(BaseAgent):
                 yield f"**检测到复杂查询 (复杂度: {complexity:.2f}/1.0)**\n\n"
                 yield "**生成多角度分析假设**...\n\n"
                 
-                result = self.generate_multi_hypothesis(query, thread_id)
-                
-                if "error" not in result and "hypotheses" in result and result["hypotheses"]:
-                    yield f"**从以下 {len(result['hypotheses'])} 个角度分析问题**:\n\n"
+                # 标准流程只依赖问题本身，在生成假设期间提前在后台执行，输出先缓冲在队列中。
+                # 其输出已在内部合并过，不再重新合并
+                standard_queue = asyncio.Queue()
+                standard_task = asyncio.create_task(self._pump_stream(
+                    self._stream_process({"messages": [{"role": "user", "content": query}]},
+                                         {"configurable": {"thread_id": thread_id}}),
+                    standard_queue, batch=False
+                ))
+                try:
+                    # 回答来自标准流程，由它记录会话的当前查询ID，假设生成不写入
+                    result = await self.generate_multi_hypothesis(query, thread_id, update_context=False)
                     
-                    for i, hyp in enumerate(result["hypotheses"][:3]):
-                        yield f"{i+1}. {hyp}\n"
+                    if "error" not in result and "hypotheses" in result and result["hypotheses"]:
+                        yield f"**从以下 {len(result['hypotheses'])} 个角度分析问题**:\n\n"
+                        
+                        for i, hyp in enumerate(result["hypotheses"][:3]):
+                            yield f"{i+1}. {hyp}\n"
+                        
+                        yield "\n**开始深度分析**...\n\n"
                     
-                    yield "\n**开始深度分析**...\n\n"
-                
-                # 然后执行标准流程
-                async for chunk in self._stream_process({"messages": [{"role": "user", "content": query}]}, 
-                                                    {"configurable": {"thread_id": thread_id}}):
-                    yield chunk
+                    # 然后输出标准流程的结果
+                    async for chunk in self._drain_queue(standard_queue):
+                        yield chunk
+                finally:
+                    standard_task.cancel()
             else:
                 # 标准复杂度，直接执行标准流程
                 async for chunk in self._stream_process({"messages": [{"role": "user", "content": query}]}, 
@@ -996,4 +1534,9 @@ class FusionGraphRAGAgent(BaseAgent):
         if hasattr(self, 'global_tool'):
             self.global_tool.close()
         if hasattr(self, 'research_tool'):
-            self.research_tool.close()
\ No newline at end of file
+            self.research_tool.close()
+        if hasattr(self, '_io_pool'):
+            self._io_pool.shutdown(wait=False)
+        # 持久化LLM回答缓存
+        for cache in getattr(self, 'llm_caches', {}).values():
+            cache.flush()
\ No newline at end of file
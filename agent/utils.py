@@ -0,0 +1,61 @@
+from collections import OrderedDict
+import threading
+import time
+from typing import Any
+
+
+def response_text(response: Any) -> str:
+    """取LLM回答（或流式片段）的文本内容，非消息对象时转为字符串"""
+    content = getattr(response, 'content', None)
+    return content if content is not None else str(response)
+
+
+class TTLCache:
+    """
+    带容量上限和过期时间的LRU字典，用于限制长期运行服务中会话状态的内存占用
+    
+    参数:
+        maxsize: 最大项数，超出时淘汰最久未使用的项
+        ttl: 过期时间（秒）
+    """
+    
+    def __init__(self, maxsize: int = 1024, ttl: float = 3600):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()  # key -> (过期时间, 值)
+        self._lock = threading.Lock()
+    
+    def _lookup(self, key):
+        """查找未过期的项并标记为最近使用，返回(是否命中, 值)"""
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return False, None
+            if entry[0] < time.monotonic():
+                del self._data[key]
+                return False, None
+            self._data.move_to_end(key)
+            return True, entry[1]
+    
+    def __contains__(self, key) -> bool:
+        return self._lookup(key)[0]
+    
+    def __getitem__(self, key):
+        found, value = self._lookup(key)
+        if not found:
+            raise KeyError(key)
+        return value
+    
+    def get(self, key, default=None):
+        found, value = self._lookup(key)
+        return value if found else default
+    
+    def __setitem__(self, key, value):
+        with self._lock:
+            self._data[key] = (time.monotonic() + self.ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+    
+    def __len__(self) -> int:
+        return len(self._data)
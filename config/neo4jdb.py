@@ -1,41 +1,68 @@
+import asyncio
 import os
+import threading
+import weakref
 from typing import Dict, Any
 import pandas as pd
-from neo4j import GraphDatabase, Result
+from neo4j import GraphDatabase, AsyncGraphDatabase
 from langchain_neo4j import Neo4jGraph
 from dotenv import load_dotenv
 
+# 导入时加载一次环境变量并读取连接信息，单例初始化时直接使用
+load_dotenv()
+_ENV = {
+    key: os.getenv(key)
+    for key in ('NEO4J_URI', 'NEO4J_USERNAME', 'NEO4J_PASSWORD', 'NEO4J_DATABASE')
+}
+
 
 class DBConnectionManager:
     """数据库连接管理器，实现单例模式"""
     
     _instance = None
+    _lock = threading.Lock()
     
     def __new__(cls):
+        """单例模式（双重检查锁，实例创建后无需加锁）"""
         if cls._instance is None:
-            cls._instance = super(DBConnectionManager, cls).__new__(cls)
-            cls._instance._initialized = False
+            with cls._lock:
+                if cls._instance is None:
+                    instance = super(DBConnectionManager, cls).__new__(cls)
+                    instance._initialized = False
+                    cls._instance = instance
         return cls._instance
     
     def __init__(self):
         # 避免重复初始化
         if self._initialized:
             return
-            
-        # 加载环境变量
-        load_dotenv()
         
-        # 从环境变量获取连接信息
-        self.neo4j_uri = os.getenv('NEO4J_URI')
-        self.neo4j_username = os.getenv('NEO4J_USERNAME')
-        self.neo4j_password = os.getenv('NEO4J_PASSWORD')
+        with self._lock:
+            if self._initialized:
+                return
+            self._initialize()
+    
+    def _initialize(self):
+        """创建驱动和图实例，只在首次构造时调用"""
+        # 连接信息
+        self.neo4j_uri = _ENV['NEO4J_URI']
+        self.neo4j_username = _ENV['NEO4J_USERNAME']
+        self.neo4j_password = _ENV['NEO4J_PASSWORD']
+        self.neo4j_database = _ENV['NEO4J_DATABASE'] or 'neo4j'
         
-        # 初始化Neo4j驱动
+        # 初始化Neo4j驱动，连接由驱动内置的连接池管理
         self.driver = GraphDatabase.driver(
             self.neo4j_uri,
-            auth=(self.neo4j_username, self.neo4j_password)
+            auth=(self.neo4j_username, self.neo4j_password),
+            max_connection_pool_size=50,
+            connection_acquisition_timeout=60,
+            max_connection_lifetime=3600
         )
         
+        # 异步驱动供asyncio流程使用，避免图查询阻塞事件循环。驱动的连接绑定在使用它的事件循环上，
+        # 因此在首次aexecute_query时按事件循环分别创建，未使用异步查询时不占用连接池
+        self._async_drivers = weakref.WeakKeyDictionary()
+        
         # 初始化LangChain Neo4j图实例
         self.graph = Neo4jGraph(
             url=self.neo4j_uri,
@@ -44,10 +71,6 @@ class DBConnectionManager:
             refresh_schema=False,
         )
         
-        # 连接池配置
-        self.session_pool = []
-        self.max_pool_size = 10
-        
         # 标记为已初始化
         self._initialized = True
     
@@ -70,55 +93,90 @@ class DBConnectionManager:
         返回:
             pd.DataFrame: 查询结果DataFrame
         """
-        return self.driver.execute_query(
+        records, _, keys = self.driver.execute_query(
             cypher,
             parameters_=params,
-            result_transformer_=Result.to_df
+            database_=self.neo4j_database
         )
+        return self._records_to_df(records, keys)
     
-    def get_session(self):
+    async def aexecute_query(self, cypher: str, params: Dict[str, Any] = {}) -> pd.DataFrame:
         """
-        从连接池获取会话
+        异步执行Cypher查询并返回结果
         
+        参数:
+            cypher: Cypher查询语句
+            params: 查询参数
+            
         返回:
-            neo4j.Session: Neo4j会话
+            pd.DataFrame: 查询结果DataFrame
         """
-        if self.session_pool:
-            # 从池中获取会话
-            return self.session_pool.pop()
-        else:
-            # 创建新会话
-            return self.driver.session()
+        records, _, keys = await self._get_async_driver().execute_query(
+            cypher,
+            parameters_=params,
+            database_=self.neo4j_database
+        )
+        return self._records_to_df(records, keys)
     
-    def release_session(self, session):
-        """
-        释放会话回连接池
-        
-        参数:
-            session: Neo4j会话
-        """
-        if len(self.session_pool) < self.max_pool_size:
-            self.session_pool.append(session)
+    def _get_async_driver(self):
+        """获取当前事件循环的异步驱动，首次调用时创建"""
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            driver = self._async_drivers.get(loop)
+            if driver is None:
+                driver = AsyncGraphDatabase.driver(
+                    self.neo4j_uri,
+                    auth=(self.neo4j_username, self.neo4j_password),
+                    max_connection_pool_size=50,
+                    connection_acquisition_timeout=60,
+                    max_connection_lifetime=3600
+                )
+                self._async_drivers[loop] = driver
+        return driver
+    
+    @staticmethod
+    def _close_async_driver(loop, driver):
+        """在异步驱动所属的事件循环上关闭驱动，事件循环已关闭时其连接已失效，直接丢弃"""
+        if loop.is_closed():
+            return
+        if not loop.is_running():
+            loop.run_until_complete(driver.close())
+            return
+        try:
+            running_loop = asyncio.get_running_loop()
+        except RuntimeError:
+            running_loop = None
+        if running_loop is loop:
+            # 在该事件循环的协程中同步调用close时无法等待，交由事件循环完成关闭
+            loop.create_task(driver.close())
         else:
-            # 池已满，关闭会话
-            session.close()
+            asyncio.run_coroutine_threadsafe(driver.close(), loop).result()
+    
+    @staticmethod
+    def _records_to_df(records, keys) -> pd.DataFrame:
+        """按行批量构建DataFrame，避免逐行转换为字典的开销"""
+        return pd.DataFrame.from_records([record.values() for record in records], columns=keys)
     
     def close(self):
-        """关闭所有资源"""
-        # 关闭所有池中的会话
-        for session in self.session_pool:
-            try:
-                session.close()
-            except:
-                pass
-        
-        # 清空池
-        self.session_pool = []
+        """关闭所有资源，包括各事件循环的异步驱动"""
+        with self._lock:
+            async_drivers = list(self._async_drivers.items())
+            self._async_drivers.clear()
+        for loop, driver in async_drivers:
+            self._close_async_driver(loop, driver)
         
         # 关闭驱动
         if self.driver:
             self.driver.close()
     
+    async def aclose(self):
+        """关闭所有资源，当前事件循环的异步驱动在此等待关闭完成"""
+        with self._lock:
+            driver = self._async_drivers.pop(asyncio.get_running_loop(), None)
+        if driver is not None:
+            await driver.close()
+        self.close()
+    
     def __enter__(self):
         """上下文管理器入口"""
         return self
@@ -1,3 +1,13 @@
+import re
+from string import Template
+from typing import Iterator, List, Optional, Tuple
+
+try:
+    import ahocorasick
+    AHOCORASICK_AVAILABLE = True
+except ImportError:
+    AHOCORASICK_AVAILABLE = False
+
 from config.settings import KB_NAME
 
 BEGIN_SEARCH_QUERY = "<|begin_search_query|>"
@@ -157,4 +167,132 @@ FINAL_ANSWER_PROMPT = """基于以下思考过程和检索到的信息，回答
         2. 适当使用标题结构化信息
         3. 不要说"根据检索的信息"等表达
         4. 直接给出确定的答案，不要使用"可能"、"或许"等不确定表达（除非确实存在不确定性）
-        """
\ No newline at end of file
+        """
+
+
+def _to_template(prompt: str) -> Template:
+    """将str.format风格的{name}占位符转换为预编译的string.Template"""
+    return Template(re.sub(r'\{(\w+)\}', r'${\1}', prompt.replace('$', '$$')))
+
+
+_RELEVANT_EXTRACTION_TEMPLATE = _to_template(RELEVANT_EXTRACTION_PROMPT)
+_FINAL_ANSWER_TEMPLATE = _to_template(FINAL_ANSWER_PROMPT)
+
+
+def build_relevant_extraction_prompt(prev_reasoning: str, search_query: str, document: str) -> str:
+    """使用预编译模板构建相关信息提取提示"""
+    return _RELEVANT_EXTRACTION_TEMPLATE.substitute(
+        prev_reasoning=prev_reasoning,
+        search_query=search_query,
+        document=document
+    )
+
+
+def build_final_answer_prompt(query: str, retrieved_content: str, thinking_process: str) -> str:
+    """使用预编译模板构建最终答案提示"""
+    return _FINAL_ANSWER_TEMPLATE.substitute(
+        query=query,
+        retrieved_content=retrieved_content,
+        thinking_process=thinking_process
+    )
+
+
+_SEARCH_TAGS = (BEGIN_SEARCH_QUERY, END_SEARCH_QUERY, BEGIN_SEARCH_RESULT, END_SEARCH_RESULT)
+
+if AHOCORASICK_AVAILABLE:
+    _TAG_AUTOMATON = ahocorasick.Automaton()
+    for _tag in _SEARCH_TAGS:
+        _TAG_AUTOMATON.add_word(_tag, _tag)
+    _TAG_AUTOMATON.make_automaton()
+else:
+    # 未安装pyahocorasick时退回预编译的多选正则，同样只需扫描一遍
+    _TAG_RE = re.compile('|'.join(map(re.escape, _SEARCH_TAGS)))
+
+
+def iter_tags(text: str) -> Iterator[Tuple[int, str]]:
+    """
+    单次扫描定位文本中的所有搜索标签
+
+    参数:
+        text: LLM输出文本
+
+    返回:
+        Iterator[Tuple[int, str]]: 按出现顺序产出(标签结束偏移, 标签)
+    """
+    if AHOCORASICK_AVAILABLE:
+        for end_index, tag in _TAG_AUTOMATON.iter(text):
+            yield end_index + 1, tag
+    else:
+        for match in _TAG_RE.finditer(text):
+            yield match.end(), match.group()
+
+
+def iter_tag_spans(text: str, begin_tag: str, end_tag: str) -> Iterator[Tuple[int, int, int, int]]:
+    """
+    定位成对的起止标签，配对规则与非贪婪正则 begin(.*?)end 一致
+
+    参数:
+        text: LLM输出文本
+        begin_tag: 起始标签
+        end_tag: 结束标签
+
+    返回:
+        Iterator[Tuple[int, int, int, int]]: 产出(起始标签开始, 内容开始, 内容结束, 结束标签结束)
+    """
+    content_start = None
+    for end, tag in iter_tags(text):
+        if content_start is None:
+            if tag == begin_tag:
+                content_start = end
+        elif tag == end_tag:
+            yield content_start - len(begin_tag), content_start, end - len(end_tag), end
+            content_start = None
+
+
+class SearchQueryStreamParser:
+    """
+    流式LLM输出的搜索查询解析器
+
+    逐块输入输出片段，每出现一个完整的搜索查询立即返回，无需等待生成结束。
+    每次只重新扫描新增部分及可能跨块的标签前缀。
+    """
+
+    _MAX_TAG_LEN = max(map(len, _SEARCH_TAGS))
+
+    def __init__(self):
+        self.buffer = ""
+        self._scan_from = 0
+        self._content_start: Optional[int] = None
+
+    def feed(self, chunk: str) -> List[str]:
+        """
+        输入一段新的输出
+
+        参数:
+            chunk: 新生成的文本片段
+
+        返回:
+            List[str]: 本次输入后新闭合的搜索查询
+        """
+        if not chunk:
+            return []
+
+        self.buffer += chunk
+        queries = []
+        offset = self._scan_from
+        # 未闭合的标签可能跨越块边界，保留最长标签长度的尾部下次重扫
+        next_scan_from = max(offset, len(self.buffer) - self._MAX_TAG_LEN + 1)
+
+        for end, tag in iter_tags(self.buffer[offset:]):
+            end += offset
+            if self._content_start is None:
+                if tag == BEGIN_SEARCH_QUERY:
+                    self._content_start = end
+            elif tag == END_SEARCH_QUERY:
+                queries.append(self.buffer[self._content_start:end - len(tag)])
+                self._content_start = None
+            # 已处理的标签不再重扫
+            next_scan_from = max(next_scan_from, end)
+
+        self._scan_from = next_scan_from
+        return queries
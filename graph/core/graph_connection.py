@@ -1,6 +1,12 @@
+import asyncio
 from typing import Any, Optional
+from neo4j import AsyncGraphDatabase
 from config.neo4jdb import get_db_manager
 
+# 并发创建需要新建一个临时异步驱动，索引数较少时建立连接的开销超过并发节省的往返，直接逐条创建
+ASYNC_INDEX_MIN_COUNT = 8
+
+
 class GraphConnectionManager:
     """
     图数据库连接管理器。
@@ -20,7 +26,10 @@ class GraphConnectionManager:
         """初始化连接管理器，只在第一次创建时执行"""
         if not getattr(self, "_initialized", False):
             db_manager = get_db_manager()
+            self.db_manager = db_manager
             self.graph = db_manager.graph
+            # 是否可用apoc.cypher.runSchema，首次批量创建索引时检测
+            self._run_schema_available = None
             self._initialized = True
     
     def get_connection(self):
@@ -65,8 +74,69 @@ class GraphConnectionManager:
         Args:
             index_queries: 索引创建查询列表
         """
+        if not index_queries:
+            return
+        
+        # 安装了APOC时一次往返提交全部语句；runMany不执行schema操作，需使用runSchema
+        if self._supports_run_schema():
+            try:
+                self.graph.query(
+                    "UNWIND $statements AS statement "
+                    "CALL apoc.cypher.runSchema(statement, {}) YIELD value "
+                    "RETURN count(*) AS executed",
+                    {"statements": index_queries}
+                )
+                return
+            except Exception as e:
+                # 服务器不允许在同一事务中执行多条schema语句时，退回逐条创建
+                print(f"apoc.cypher.runSchema批量创建索引失败，改为逐条创建: {e}")
+                self._run_schema_available = False
+        
+        if len(index_queries) >= ASYNC_INDEX_MIN_COUNT:
+            try:
+                asyncio.get_running_loop()
+            except RuntimeError:
+                asyncio.run(self.create_multiple_indexes_async(index_queries))
+                return
+        
+        # 索引较少，或已处于事件循环中无法嵌套asyncio.run时，逐条创建
         for query in index_queries:
             self.create_index(query)
+    
+    def _supports_run_schema(self) -> bool:
+        """检测apoc.cypher.runSchema是否可用，结果缓存在实例上"""
+        if self._run_schema_available is None:
+            try:
+                result = self.graph.query(
+                    "SHOW PROCEDURES YIELD name WHERE name = 'apoc.cypher.runSchema' RETURN count(*) > 0 AS available"
+                )
+                self._run_schema_available = bool(result and result[0]["available"])
+            except Exception:
+                self._run_schema_available = False
+        return self._run_schema_available
+    
+    async def create_multiple_indexes_async(self, index_queries: list) -> None:
+        """
+        并发创建多个索引，将多次网络往返重叠为一次
+        
+        Args:
+            index_queries: 索引创建查询列表
+        """
+        db = self.db_manager
+        # 使用临时异步驱动：驱动的连接绑定在创建它们的事件循环上，
+        # 每次asyncio.run都是新循环，不能复用全局异步驱动的连接
+        driver = AsyncGraphDatabase.driver(
+            db.neo4j_uri,
+            auth=(db.neo4j_username, db.neo4j_password)
+        )
+        try:
+            # 会话不支持并发查询，每条查询由execute_query从连接池取独立会话
+            await asyncio.gather(*(
+                driver.execute_query(query, database_=db.neo4j_database)
+                for query in index_queries
+            ))
+        finally:
+            await driver.close()
             
     def drop_index(self, index_name: str) -> None:
         """
@@ -1,6 +1,7 @@
 import time
 import os
 import pickle
+import functools
 import concurrent.futures
 from typing import List, Tuple, Optional
 try:
@@ -8,7 +9,6 @@ try:
         ChatPromptTemplate,
         HumanMessagePromptTemplate,
         MessagesPlaceholder,
-        SystemMessagePromptTemplate,
     )
 except ImportError:
     # 新版本langchain中的替代导入
@@ -16,12 +16,44 @@ except ImportError:
         ChatPromptTemplate,
         HumanMessagePromptTemplate,
         MessagesPlaceholder,
-        SystemMessagePromptTemplate,
     )
 
+from langchain_core.messages import SystemMessage
+
 from graph.core import retry, generate_hash
 from config.settings import MAX_WORKERS as DEFAULT_MAX_WORKERS, BATCH_SIZE as DEFAULT_BATCH_SIZE
 
+
+@functools.lru_cache(maxsize=32)
+def _render_prompts(system_template: str, human_template: str,
+                    entity_types: Tuple[str, ...], relationship_types: Tuple[str, ...],
+                    tuple_delimiter: str, record_delimiter: str,
+                    completion_delimiter: str) -> Tuple[str, str]:
+    """
+    预先填充提示模板中的固定参数，相同配置的提取器共享渲染结果
+    
+    Returns:
+        Tuple[str, str]: 渲染后的系统提示，以及只保留{input_text}占位符的用户提示模板
+    """
+    # 类型列表按原先的列表形式写入提示，花括号需转义以免被当作模板变量
+    entity_types_text = str(list(entity_types)).replace("{", "{{").replace("}", "}}")
+    relationship_types_text = str(list(relationship_types)).replace("{", "{{").replace("}", "}}")
+    
+    system_prompt = system_template.format(
+        entity_types=list(entity_types),
+        relationship_types=list(relationship_types),
+        tuple_delimiter=tuple_delimiter,
+        record_delimiter=record_delimiter,
+        completion_delimiter=completion_delimiter
+    )
+    human_prompt = human_template.format(
+        entity_types=entity_types_text,
+        relationship_types=relationship_types_text,
+        input_text="{input_text}"
+    )
+    return system_prompt, human_prompt
+
+
 class EntityRelationExtractor:
     """
     实体关系提取器，负责从文本中提取实体和关系。
@@ -54,12 +86,17 @@ class EntityRelationExtractor:
         self.record_delimiter = "\n"
         self.completion_delimiter = "\n\n"
         
-        # 创建提示模板
-        system_message_prompt = SystemMessagePromptTemplate.from_template(system_template)
-        human_message_prompt = HumanMessagePromptTemplate.from_template(human_template)
+        # 创建提示模板：固定参数在初始化时一次性填入，
+        # 之后每次调用只需替换用户提示中的输入文本
+        system_prompt, human_prompt = _render_prompts(
+            system_template, human_template,
+            tuple(entity_types), tuple(relationship_types),
+            self.tuple_delimiter, self.record_delimiter, self.completion_delimiter
+        )
+        human_message_prompt = HumanMessagePromptTemplate.from_template(human_prompt)
         
         self.chat_prompt = ChatPromptTemplate.from_messages([
-            system_message_prompt,
+            SystemMessage(content=system_prompt),
             MessagesPlaceholder("chat_history"),
             human_message_prompt
         ])
@@ -277,11 +314,6 @@ class EntityRelationExtractor:
                     # 使用原始提示模板处理批量输入
                     batch_response = self.chain.invoke({
                         "chat_history": self.chat_history,
-                        "entity_types": self.entity_types,
-                        "relationship_types": self.relationship_types,
-                        "tuple_delimiter": self.tuple_delimiter,
-                        "record_delimiter": self.record_delimiter,
-                        "completion_delimiter": self.completion_delimiter,
                         "input_text": batch_text
                     })
                     
@@ -364,11 +396,6 @@ class EntityRelationExtractor:
         # 未缓存，调用LLM处理
         response = self.chain.invoke({
             "chat_history": self.chat_history,
-            "entity_types": self.entity_types,
-            "relationship_types": self.relationship_types,
-            "tuple_delimiter": self.tuple_delimiter,
-            "record_delimiter": self.record_delimiter,
-            "completion_delimiter": self.completion_delimiter,
             "input_text": input_text
         })
         
@@ -8,18 +8,18 @@ try:
     from langchain.prompts import (
         ChatPromptTemplate,
         MessagesPlaceholder,
-        HumanMessagePromptTemplate,
-        SystemMessagePromptTemplate
+        HumanMessagePromptTemplate
     )
 except ImportError:
     # 新版本langchain中的替代导入
     from langchain_core.prompts import (
         ChatPromptTemplate,
         MessagesPlaceholder,
-        HumanMessagePromptTemplate,
-        SystemMessagePromptTemplate
+        HumanMessagePromptTemplate
     )
 
+from langchain_core.messages import SystemMessage
+
 from model.get_models import get_llm_model
 from config.prompt import system_template_build_index, user_template_build_index
 from config.settings import ENTITY_BATCH_SIZE, MAX_WORKERS as DEFAULT_MAX_WORKERS
@@ -77,17 +77,15 @@ class EntityMerger:
         if not hasattr(self.llm, 'with_structured_output'):
             print("当前LLM模型不支持结构化输出")
 
-        # 创建提示模板
-        system_message_prompt = SystemMessagePromptTemplate.from_template(
-            system_template_build_index
-        )
+        # 创建提示模板，系统提示不含变量，直接作为固定消息使用
+        system_message = SystemMessage(content=system_template_build_index)
         human_message_prompt = HumanMessagePromptTemplate.from_template(
             user_template_build_index
         )
         
         # 构建对话链
         self.chat_prompt = ChatPromptTemplate.from_messages([
-            system_message_prompt,
+            system_message,
             MessagesPlaceholder("chat_history"),
             human_message_prompt
         ])
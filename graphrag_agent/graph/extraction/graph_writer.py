@@ -14,6 +14,28 @@ class GraphWriter:
     处理实体和关系的解析、转换为GraphDocument，以及批量写入图数据库。
     """
     
+    # 节点写入：按标签MERGE实体，补充类型标签，并直接关联到来源Chunk
+    _NODE_WRITE_QUERY = """
+        UNWIND $rows AS row
+        MERGE (e:`__Entity__` {id: row.id})
+        SET e += row.properties
+        WITH e, row
+        CALL apoc.create.addLabels(e, [row.type]) YIELD node
+        WITH e, row
+        MATCH (c:`__Chunk__` {id: row.chunk_id})
+        MERGE (c)-[:MENTIONS]->(e)
+    """
+    
+    # 关系写入：关系类型动态，通过APOC合并，属性只在创建时设置
+    _RELATIONSHIP_WRITE_QUERY = """
+        UNWIND $rows AS row
+        MERGE (source:`__Entity__` {id: row.source})
+        MERGE (target:`__Entity__` {id: row.target})
+        WITH source, target, row
+        CALL apoc.merge.relationship(source, row.type, {}, row.properties, target) YIELD rel
+        RETURN count(rel)
+    """
+    
     def __init__(self, graph: Neo4jGraph = None, batch_size: int = 50, max_workers: int = 4):
         """
         初始化图写入器
@@ -138,12 +160,10 @@ class GraphWriter:
             file_contents: 文件内容列表
         """
         all_graph_documents = []
-        all_chunk_ids = []
         
         # 预分配列表大小
         total_chunks = sum(len(file_content[3]) for file_content in file_contents)
         all_graph_documents = [None] * total_chunks
-        all_chunk_ids = [None] * total_chunks
         
         chunk_index = 0
         error_count = 0
@@ -178,34 +198,29 @@ class GraphWriter:
                     # 只保留有效的图文档
                     if len(graph_document.nodes) > 0 or len(graph_document.relationships) > 0:
                         all_graph_documents[idx] = graph_document
-                        all_chunk_ids[idx] = graph_document.source.metadata.get("chunk_id")
                     else:
                         all_graph_documents[idx] = None
-                        all_chunk_ids[idx] = None
                         
                 except Exception as e:
                     error_count += 1
                     print(f"处理chunk时出错 (已有{error_count}个错误): {e}")
                     all_graph_documents[idx] = None
-                    all_chunk_ids[idx] = None
         
         # 过滤掉None值
         all_graph_documents = [doc for doc in all_graph_documents if doc is not None]
-        all_chunk_ids = [id for id in all_chunk_ids if id is not None]
         
         print(f"共处理 {total_chunks} 个chunks, 有效文档 {len(all_graph_documents)}, 错误 {error_count}")
         
-        # 批量写入图文档
+        # 批量写入图文档，实体直接挂到对应的Chunk节点上
         self._batch_write_graph_documents(all_graph_documents)
-        
-        # 批量合并chunk关系
-        if all_chunk_ids:
-            self.merge_chunk_relationships(all_chunk_ids)
     
     def _batch_write_graph_documents(self, documents: List[GraphDocument]) -> None:
         """
         批量写入图文档
         
+        每批文档的节点和关系各用一条UNWIND语句写入，实体与__Chunk__之间直接建立MENTIONS关系，
+        不再经过临时Document节点再合并
+        
         Args:
             documents: 图文档列表
         """
@@ -223,77 +238,44 @@ class GraphWriter:
             batch = documents[i:i+optimal_batch_size]
             if batch:
                 try:
-                    self.graph.add_graph_documents(
-                        batch,
-                        baseEntityLabel=True,
-                        include_source=True
-                    )
+                    self._write_documents(batch)
                     print(f"已写入批次 {i//optimal_batch_size + 1}/{total_batches}")
                 except Exception as e:
                     print(f"写入图文档批次时出错: {e}")
                     # 如果批次写入失败，尝试逐个写入以避免整批失败
                     for doc in batch:
                         try:
-                            self.graph.add_graph_documents(
-                                [doc],
-                                baseEntityLabel=True,
-                                include_source=True
-                            )
+                            self._write_documents([doc])
                         except Exception as e2:
                             print(f"单个文档写入失败: {e2}")
     
-    def merge_chunk_relationships(self, chunk_ids: List[str]) -> None:
+    def _write_documents(self, documents: List[GraphDocument]) -> None:
         """
-        合并Chunk节点与Document节点的关系
+        以两次往返写入一批图文档的全部节点和关系
         
         Args:
-            chunk_ids: 块ID列表
+            documents: 图文档列表
         """
-        if not chunk_ids:
-            return
-        
-        # 去除重复的chunk_id以减少操作数量
-        unique_chunk_ids = list(set(chunk_ids))
-        print(f"开始合并 {len(unique_chunk_ids)} 个唯一chunk关系")
-            
-        # 动态批处理大小
-        optimal_batch_size = min(self.batch_size, max(20, len(unique_chunk_ids) // 5))
-        total_batches = (len(unique_chunk_ids) + optimal_batch_size - 1) // optimal_batch_size
+        node_rows = []
+        relationship_rows = []
+        for doc in documents:
+            chunk_id = doc.source.metadata.get("chunk_id")
+            for node in doc.nodes:
+                node_rows.append({
+                    "chunk_id": chunk_id,
+                    "id": node.id,
+                    "type": node.type.replace("`", ""),
+                    "properties": node.properties
+                })
+            for rel in doc.relationships:
+                relationship_rows.append({
+                    "source": rel.source.id,
+                    "target": rel.target.id,
+                    "type": rel.type.replace(" ", "_").upper().replace("`", ""),
+                    "properties": rel.properties
+                })
         
-        print(f"合并关系批次大小: {optimal_batch_size}, 总批次: {total_batches}")
-        
-        # 分批处理，避免一次性处理过多数据
-        for i in range(0, len(unique_chunk_ids), optimal_batch_size):
-            batch_chunk_ids = unique_chunk_ids[i:i+optimal_batch_size]
-            batch_data = [{"chunk_id": chunk_id} for chunk_id in batch_chunk_ids]
-            
-            try:
-                # 使用原始的查询，确保兼容性
-                merge_query = """
-                    UNWIND $batch_data AS data
-                    MATCH (c:`__Chunk__` {id: data.chunk_id}), (d:Document{chunk_id:data.chunk_id})
-                    WITH c, d
-                    MATCH (d)-[r:MENTIONS]->(e)
-                    MERGE (c)-[newR:MENTIONS]->(e)
-                    ON CREATE SET newR += properties(r)
-                    DETACH DELETE d
-                """
-                
-                self.graph.query(merge_query, params={"batch_data": batch_data})
-                print(f"已处理合并关系批次 {i//optimal_batch_size + 1}/{total_batches}")
-            except Exception as e:
-                print(f"合并关系批次时出错: {e}")
-                # 如果批处理失败，尝试逐个处理
-                for chunk_id in batch_chunk_ids:
-                    try:
-                        single_query = """
-                            MATCH (c:`__Chunk__` {id: $chunk_id}), (d:Document{chunk_id:$chunk_id})
-                            WITH c, d
-                            MATCH (d)-[r:MENTIONS]->(e)
-                            MERGE (c)-[newR:MENTIONS]->(e)
-                            ON CREATE SET newR += properties(r)
-                            DETACH DELETE d
-                        """
-                        self.graph.query(single_query, params={"chunk_id": chunk_id})
-                    except Exception as e2:
-                        print(f"处理单个chunk关系时出错: {e2}")
\ No newline at end of file
+        if node_rows:
+            self.graph.query(self._NODE_WRITE_QUERY, params={"rows": node_rows})
+        if relationship_rows:
+            self.graph.query(self._RELATIONSHIP_WRITE_QUERY, params={"rows": relationship_rows})
\ No newline at end of file
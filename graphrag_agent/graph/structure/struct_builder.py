@@ -57,6 +57,22 @@ class GraphStructureBuilder:
         )
         return doc
         
+    def create_documents(self, documents: List[Dict]) -> None:
+        """
+        一次往返批量创建Document节点
+        
+        Args:
+            documents: 文档信息列表，每项包含type、uri、file_name、domain
+        """
+        if not documents:
+            return
+        query = """
+        UNWIND $documents AS doc
+        MERGE (d:`__Document__` {fileName: doc.file_name})
+        SET d.type = doc.type, d.uri = doc.uri, d.domain = doc.domain
+        """
+        self.graph.query(query, {"documents": documents})
+        
     def create_relation_between_chunks(self, file_name: str, chunks: List) -> List[Dict]:
         """
         创建Chunk节点并建立关系 - 批处理优化版本
@@ -70,6 +86,53 @@ class GraphStructureBuilder:
         """
         t0 = time.time()
         
+        lst_chunks_including_hash, batch_data, relationships = self._prepare_chunks(file_name, chunks)
+        self._write_chunk_rows(batch_data, relationships)
+        
+        t1 = time.time()
+        print(f"创建关系耗时: {t1-t0:.2f}秒")
+        
+        return lst_chunks_including_hash
+    
+    def create_relation_between_chunks_batch(self, files: List) -> List[List[Dict]]:
+        """
+        批量创建多个文件的Chunk节点和关系，小文件的数据合并到同一批次写入
+        
+        Args:
+            files: (文件名, 文本块列表)元组的列表
+            
+        Returns:
+            List[List[Dict]]: 与输入顺序对应的每个文件的带有ID和文档的块列表
+        """
+        t0 = time.time()
+        
+        results = []
+        all_batch_data = []
+        all_relationships = []
+        for file_name, chunks in files:
+            lst_chunks_including_hash, batch_data, relationships = self._prepare_chunks(file_name, chunks)
+            results.append(lst_chunks_including_hash)
+            all_batch_data.extend(batch_data)
+            all_relationships.extend(relationships)
+        
+        self._write_chunk_rows(all_batch_data, all_relationships)
+        
+        t1 = time.time()
+        print(f"批量创建 {len(files)} 个文件的关系耗时: {t1-t0:.2f}秒")
+        
+        return results
+    
+    def _prepare_chunks(self, file_name: str, chunks: List):
+        """
+        生成一个文件的chunk数据和关系数据
+        
+        Args:
+            file_name: 文件名
+            chunks: 文本块列表
+            
+        Returns:
+            Tuple: (带有ID和文档的块列表, chunk数据, 关系数据)
+        """
         current_chunk_id = ""
         lst_chunks_including_hash = []
         batch_data = []
@@ -118,35 +181,35 @@ class GraphStructureBuilder:
             
             # 创建关系数据
             if firstChunk:
-                relationships.append({"type": "FIRST_CHUNK", "chunk_id": current_chunk_id})
+                relationships.append({"type": "FIRST_CHUNK", "chunk_id": current_chunk_id, "f_name": file_name})
             else:
                 relationships.append({
                     "type": "NEXT_CHUNK",
                     "previous_chunk_id": previous_chunk_id,
                     "current_chunk_id": current_chunk_id
                 })
-            
-            # 当累积了一定量的数据时，进行批处理
-            if len(batch_data) >= self.batch_size:
-                self._process_batch(file_name, batch_data, relationships)
-                batch_data = []
-                relationships = []
-        
-        # 处理剩余的数据
-        if batch_data:
-            self._process_batch(file_name, batch_data, relationships)
         
-        t1 = time.time()
-        print(f"创建关系耗时: {t1-t0:.2f}秒")
+        return lst_chunks_including_hash, batch_data, relationships
+    
+    def _write_chunk_rows(self, batch_data: List[Dict], relationships: List[Dict]):
+        """
+        按批次大小分批写入chunk数据及对应关系
         
-        return lst_chunks_including_hash
+        Args:
+            batch_data: chunk数据，与relationships一一对应
+            relationships: 关系数据
+        """
+        for i in range(0, len(batch_data), self.batch_size):
+            self._process_batch(
+                batch_data[i:i + self.batch_size],
+                relationships[i:i + self.batch_size]
+            )
     
-    def _process_batch(self, file_name: str, batch_data: List[Dict], relationships: List[Dict]):
+    def _process_batch(self, batch_data: List[Dict], relationships: List[Dict]):
         """
-        批量处理一组chunks和关系
+        批量处理一组chunks和关系，批次内可包含多个文件的数据
         
         Args:
-            file_name: 文件名
             batch_data: 批处理数据
             relationships: 关系数据
         """
@@ -158,15 +221,14 @@ class GraphStructureBuilder:
         next_relationships = [r for r in relationships if r.get("type") == "NEXT_CHUNK"]
         
         # 使用优化的数据库操作
-        self._create_chunks_and_relationships_optimized(file_name, batch_data, first_relationships, next_relationships)
+        self._create_chunks_and_relationships_optimized(batch_data, first_relationships, next_relationships)
     
-    def _create_chunks_and_relationships_optimized(self, file_name: str, batch_data: List[Dict], 
+    def _create_chunks_and_relationships_optimized(self, batch_data: List[Dict], 
                                                   first_relationships: List[Dict], next_relationships: List[Dict]):
         """
         优化的创建chunks和关系的查询 - 减少数据库往返
         
         Args:
-            file_name: 文件名
             batch_data: 批处理数据
             first_relationships: FIRST_CHUNK关系列表
             next_relationships: NEXT_CHUNK关系列表
@@ -191,14 +253,11 @@ class GraphStructureBuilder:
         if first_relationships:
             query_first_chunk = """
             UNWIND $relationships AS relationship
-            MATCH (d:`__Document__` {fileName: $f_name})
+            MATCH (d:`__Document__` {fileName: relationship.f_name})
             MATCH (c:`__Chunk__` {id: relationship.chunk_id})
             MERGE (d)-[:FIRST_CHUNK]->(c)
             """
-            self.graph.query(query_first_chunk, params={
-                "f_name": file_name,
-                "relationships": first_relationships
-            })
+            self.graph.query(query_first_chunk, params={"relationships": first_relationships})
         
         # 处理NEXT_CHUNK关系
         if next_relationships:
@@ -315,6 +374,7 @@ class GraphStructureBuilder:
         all_batch_data = []
         all_relationships = []
         all_results = []
+        batch_outputs = [None] * len(chunk_batches)
         
         with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as executor:
             future_to_batch = {
@@ -322,16 +382,20 @@ class GraphStructureBuilder:
                 for i, batch in enumerate(chunk_batches)
             }
             
-            # 收集所有处理结果
+            # 收集所有处理结果，按批次序号放回原位，保证返回的块与实体抽取结果顺序一致
             for future in concurrent.futures.as_completed(future_to_batch):
                 try:
-                    result = future.result()
-                    all_batch_data.extend(result["batch_data"])
-                    all_relationships.extend(result["relationships"])
-                    all_results.extend(result["results"])
+                    batch_outputs[future_to_batch[future]] = future.result()
                 except Exception as e:
                     print(f"处理批次时出错: {e}")
         
+        for result in batch_outputs:
+            if result is None:
+                continue
+            all_batch_data.extend(result["batch_data"])
+            all_relationships.extend(result["relationships"])
+            all_results.extend(result["results"])
+        
         # 写入数据库
         print(f"并行处理完成，共 {len(all_batch_data)} 个块，开始写入数据库")
         
@@ -339,9 +403,8 @@ class GraphStructureBuilder:
         db_batch_size = 500
         for i in range(0, len(all_batch_data), db_batch_size):
             batch = all_batch_data[i:i+db_batch_size]
-            rel_batch = [r for r in all_relationships 
-                         if r.get("type") == "FIRST_CHUNK" and any(b["id"] == r["chunk_id"] for b in batch)
-                         or r.get("type") == "NEXT_CHUNK" and any(b["id"] == r["current_chunk_id"] for b in batch)]
+            # 每个块按顺序恰好对应一条关系，直接按相同区间切片，避免逐条关系扫描整个批次匹配块ID
+            rel_batch = all_relationships[i:i+db_batch_size]
             
             self._create_chunks_and_relationships(file_name, batch, rel_batch)
             print(f"已写入批次 {i//db_batch_size + 1}/{(len(all_batch_data) + db_batch_size - 1) // db_batch_size}")
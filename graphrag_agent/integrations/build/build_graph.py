@@ -1,5 +1,7 @@
 import time
 import os
+import queue
+import threading
 import psutil
 from typing import Dict, Any, List, Tuple
 
@@ -32,6 +34,11 @@ from graphrag_agent.graph import GraphWriter
 import shutup
 shutup.please()
 
+# 待写入文件组队列上限，抽取最多领先写入这么多组
+_WRITE_QUEUE_SIZE = 2
+# 流水线结束标记
+_PIPELINE_END = object()
+
 
 class KnowledgeGraphBuilder:
     """
@@ -138,6 +145,103 @@ class KnowledgeGraphBuilder:
         minutes, seconds = divmod(remainder, 60)
         return f"{int(hours):02d}:{int(minutes):02d}:{int(seconds):02d}.{int((seconds % 1) * 1000):03d}"
 
+    def _extract_group(self, docs: List[Dict[str, Any]], total_chunks: int, progress_callback) -> None:
+        """
+        抽取一组文档的实体和关系，结果写回文档的entity_data
+        
+        Args:
+            docs: 已分块的文档列表
+            total_chunks: 全部文档的chunk总数，用于选择处理方法
+            progress_callback: 进度回调函数
+        """
+        file_contents_format = [[doc["filename"], doc["content"], doc["chunks"]] for doc in docs]
+        
+        # 根据数据集大小选择处理方法
+        if total_chunks > 100:
+            # 对于大型数据集使用批处理模式
+            processed_file_contents = self.entity_extractor.process_chunks_batch(
+                file_contents_format,
+                progress_callback
+            )
+        else:
+            # 对于小型数据集使用标准并行处理
+            processed_file_contents = self.entity_extractor.process_chunks(
+                file_contents_format,
+                progress_callback
+            )
+        
+        # 将处理结果合并回文档数据
+        file_content_map = {}
+        for processed_file in processed_file_contents:
+            if len(processed_file) >= 4:  # 确保有足够的元素
+                file_content_map[processed_file[0]] = processed_file[3]
+        
+        for doc in docs:
+            if doc["filename"] in file_content_map:
+                doc["entity_data"] = file_content_map[doc["filename"]]
+            else:
+                self.console.print(f"[yellow]警告: 文件 {doc['filename']} 的实体抽取结果未找到[/yellow]")
+    
+    def _prepare_writer_data(self, docs: List[Dict[str, Any]]) -> List:
+        """
+        将文档数据转换为GraphWriter所需格式
+        
+        Args:
+            docs: 已完成实体抽取的文档列表
+            
+        Returns:
+            List: GraphWriter输入数据
+        """
+        graph_writer_data = []
+        for doc in docs:
+            if "entity_data" not in doc:
+                continue
+            
+            # 获取图构建结果（创建的chunk节点列表）
+            graph_result = doc.get("graph_result", [])
+            entity_data = doc.get("entity_data", [])
+            
+            # 确保graph_result和entity_data存在且长度相等
+            if not graph_result:
+                self.console.print(f"[yellow]警告: 文件 {doc['filename']} 的图结构结果缺失[/yellow]")
+                continue
+                
+            if not entity_data or not isinstance(entity_data, list):
+                self.console.print(f"[yellow]警告: 文件 {doc['filename']} 的实体数据缺失或格式不正确[/yellow]")
+                continue
+                
+            # 调整数据格式以匹配GraphWriter期望的结构
+            graph_writer_data.append([
+                doc["filename"],
+                doc["content"],
+                doc["chunks"],
+                graph_result,  # 这应该是chunks_with_hash数据
+                entity_data,    # 这应该是实体提取结果
+            ])
+        return graph_writer_data
+    
+    @staticmethod
+    def _write_worker(graph_writer: GraphWriter, write_queue: queue.Queue, write_errors: List) -> None:
+        """
+        写入线程：持续从队列取出文件组写入数据库，直到收到结束标记
+        
+        Args:
+            graph_writer: 图写入器
+            write_queue: 待写入数据队列
+            write_errors: 收集写入异常，由主线程在流水线结束后抛出
+        """
+        while True:
+            graph_writer_data = write_queue.get()
+            if graph_writer_data is _PIPELINE_END:
+                return
+            # 出错后继续取出剩余数据，避免抽取线程阻塞在已满的队列上
+            if write_errors:
+                continue
+            try:
+                graph_writer.process_and_write_graph_documents(graph_writer_data)
+            except Exception as e:
+                write_errors.append(e)
+
     def build_base_graph(self) -> List:
         """
         构建基础知识图谱
@@ -190,93 +294,107 @@ class KnowledgeGraphBuilder:
             with self._create_progress() as progress:
                 task = progress.add_task("[cyan]构建图结构...", total=3)
                 
-                # 清空并创建Document节点
+                # 清空并一次性创建所有Document节点
                 self.struct_builder.clear_database()
-                for doc in self.processed_documents:
-                    if "chunks" in doc and doc["chunks"]:  # 只处理成功分块的文档
-                        self.struct_builder.create_document(
-                            type="local",
-                            uri=str(FILES_DIR),
-                            file_name=doc["filename"],
-                            domain=theme
-                        )
+                chunked_docs = [doc for doc in self.processed_documents if "chunks" in doc and doc["chunks"]]  # 只处理成功分块的文档
+                self.struct_builder.create_documents([
+                    {
+                        "type": "local",
+                        "uri": str(FILES_DIR),
+                        "file_name": doc["filename"],
+                        "domain": theme
+                    }
+                    for doc in chunked_docs
+                ])
                 progress.advance(task)
                 
-                # 创建Chunk节点和关系 - 优化：使用并行处理大文件
-                for doc in self.processed_documents:
-                    if "chunks" in doc and doc["chunks"]:  # 只处理成功分块的文档
-                        # 根据chunks数量选择处理方法
-                        chunks = doc["chunks"]
-                        if doc.get("chunk_count", 0) > 100:
-                            # 对于大文件使用并行处理
-                            result = self.struct_builder.parallel_process_chunks(
-                                doc["filename"],
-                                chunks,
-                                max_workers=os.cpu_count() or 4
-                            )
-                        else:
-                            # 对于小文件使用标准批处理
-                            result = self.struct_builder.create_relation_between_chunks(
-                                doc["filename"],
-                                chunks
-                            )
+                # 创建Chunk节点和关系 - 大文件并行处理，小文件合并批次写入
+                small_docs = []
+                for doc in chunked_docs:
+                    if doc.get("chunk_count", 0) > 100:
+                        # 对于大文件使用并行处理
+                        doc["graph_result"] = self.struct_builder.parallel_process_chunks(
+                            doc["filename"],
+                            doc["chunks"],
+                            max_workers=os.cpu_count() or 4
+                        )
+                    else:
+                        small_docs.append(doc)
+                
+                # 小文件的chunk跨文件合并，按批次大小写入
+                if small_docs:
+                    results = self.struct_builder.create_relation_between_chunks_batch(
+                        [(doc["filename"], doc["chunks"]) for doc in small_docs]
+                    )
+                    for doc, result in zip(small_docs, results):
                         doc["graph_result"] = result
                 progress.advance(task)
                 progress.advance(task)
             
             self.performance_stats["图结构构建"] = time.time() - struct_start
             
-            # 4. 提取实体和关系
+            # 4-5. 提取实体和关系并写入数据库
+            # 以流水线方式执行：写入线程写入当前文件组时，主线程已开始抽取下一组
+            docs_to_extract = [doc for doc in self.processed_documents if "chunks" in doc and doc["chunks"]]
+            total_chunks = sum(doc.get("chunk_count", 0) for doc in docs_to_extract)
+            # 每组至少凑够让所有抽取线程满载的chunk数，避免小文件逐个处理时并行度不足
+            group_chunks = self.entity_extractor.max_workers * self.entity_extractor.batch_size
+            
+            graph_writer = GraphWriter(
+                self.graph, 
+                batch_size=50,
+                max_workers=os.cpu_count() or 4
+            )
+            write_queue = queue.Queue(maxsize=_WRITE_QUEUE_SIZE)
+            write_errors = []
+            writer = threading.Thread(
+                target=self._write_worker,
+                args=(graph_writer, write_queue, write_errors),
+                daemon=True
+            )
+            
             extract_start = time.time()
-            with self._create_progress() as progress:
-                total_chunks = sum(doc.get("chunk_count", 0) for doc in self.processed_documents)
-                task = progress.add_task("[cyan]提取实体和关系...", total=total_chunks)
-                
-                def progress_callback(chunk_index):
-                    progress.advance(task)
-                
-                # 准备处理的数据格式
-                file_contents_format = []
-                for doc in self.processed_documents:
-                    if "chunks" in doc and doc["chunks"]:
-                        file_contents_format.append([
-                            doc["filename"], 
-                            doc["content"], 
-                            doc["chunks"]
-                        ])
-                
-                # 根据数据集大小选择处理方法
-                if total_chunks > 100:
-                    # 对于大型数据集使用批处理模式
-                    processed_file_contents = self.entity_extractor.process_chunks_batch(
-                        file_contents_format,
-                        progress_callback
-                    )
-                else:
-                    # 对于小型数据集使用标准并行处理
-                    processed_file_contents = self.entity_extractor.process_chunks(
-                        file_contents_format,
-                        progress_callback
-                    )
-                
-                # 将处理结果合并回文档数据
-                file_content_map = {}
-                for processed_file in processed_file_contents:
-                    if len(processed_file) >= 4:  # 确保有足够的元素
-                        filename = processed_file[0]
-                        entity_data = processed_file[3]
-                        file_content_map[filename] = entity_data
-                
-                # 使用映射将结果放回到原始文档中
-                for doc in self.processed_documents:
-                    if "chunks" in doc and doc["chunks"]:
-                        filename = doc["filename"]
-                        if filename in file_content_map:
-                            doc["entity_data"] = file_content_map[filename]
-                        else:
-                            self.console.print(f"[yellow]警告: 文件 {filename} 的实体抽取结果未找到[/yellow]")
+            writer.start()
+            try:
+                with self._create_progress() as progress:
+                    task = progress.add_task("[cyan]提取实体和关系并写入数据库...", total=total_chunks)
+                    
+                    def progress_callback(chunk_index):
+                        progress.advance(task)
+                    
+                    group = []
+                    group_size = 0
+                    for i, doc in enumerate(docs_to_extract):
+                        group.append(doc)
+                        group_size += doc.get("chunk_count", 0)
+                        if group_size < group_chunks and i < len(docs_to_extract) - 1:
+                            continue
+                        
+                        # 写入已失败时停止抽取剩余文件组，避免在注定失败的构建上继续调用LLM
+                        if write_errors:
+                            break
+                        
+                        self._extract_group(group, total_chunks, progress_callback)
+                        
+                        writer_data = self._prepare_writer_data(group)
+                        if writer_data:
+                            # 队列有界：写入落后时阻塞抽取，避免抽取结果在内存中堆积
+                            write_queue.put(writer_data)
+                        
+                        group = []
+                        group_size = 0
+                    
+                    self.performance_stats["实体抽取"] = time.time() - extract_start
+            finally:
+                write_queue.put(_PIPELINE_END)
+                write_wait_start = time.time()
+                writer.join()
+            
+            # 写入与抽取重叠进行，这里只统计抽取结束后等待写入完成的时间
+            self.performance_stats["写入数据库"] = time.time() - write_wait_start
             
-            self.performance_stats["实体抽取"] = time.time() - extract_start
+            if write_errors:
+                raise write_errors[0]
             
             # 输出缓存统计
             cache_hits = getattr(self.entity_extractor, 'cache_hits', 0)
@@ -286,48 +404,6 @@ class KnowledgeGraphBuilder:
             
             self.console.print(f"[blue]LLM调用缓存命中率: {cache_rate:.1f}% ({cache_hits}/{total_requests})[/blue]")
             
-            # 5. 写入数据库
-            write_start = time.time()
-            with self._create_progress() as progress:
-                task = progress.add_task("[cyan]写入数据库...", total=1)
-                
-                # 将处理数据转换为GraphWriter所需格式
-                graph_writer_data = []
-                for doc in self.processed_documents:
-                    if "chunks" in doc and doc["chunks"] and "entity_data" in doc:
-                        # 获取图构建结果（创建的chunk节点列表）
-                        graph_result = doc.get("graph_result", [])
-                        entity_data = doc.get("entity_data", [])
-                        
-                        # 确保graph_result和entity_data存在且长度相等
-                        if not graph_result:
-                            self.console.print(f"[yellow]警告: 文件 {doc['filename']} 的图结构结果缺失[/yellow]")
-                            continue
-                            
-                        if not entity_data or not isinstance(entity_data, list):
-                            self.console.print(f"[yellow]警告: 文件 {doc['filename']} 的实体数据缺失或格式不正确[/yellow]")
-                            continue
-                            
-                        # 调整数据格式以匹配GraphWriter期望的结构
-                        graph_writer_data.append([
-                            doc["filename"],
-                            doc["content"],
-                            doc["chunks"],
-                            graph_result,  # 这应该是chunks_with_hash数据
-                            entity_data,    # 这应该是实体提取结果
-                        ])
-                
-                # 使用优化的GraphWriter
-                graph_writer = GraphWriter(
-                    self.graph, 
-                    batch_size=50,
-                    max_workers=os.cpu_count() or 4
-                )
-                graph_writer.process_and_write_graph_documents(graph_writer_data)
-                progress.update(task, completed=1)
-            
-            self.performance_stats["写入数据库"] = time.time() - write_start
-            
             self.console.print("[green]基础知识图谱构建完成[/green]")
             
             # 显示性能统计
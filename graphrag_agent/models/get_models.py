@@ -1,11 +1,22 @@
+from concurrent.futures import Future
+from functools import lru_cache
+from typing import List
+import asyncio
+import os
+import queue
+import re
+import threading
+import time
+
+from langchain_core.embeddings import Embeddings
 from langchain_openai import OpenAIEmbeddings
 from langchain_openai import ChatOpenAI
-import os
 
 from graphrag_agent.config.settings import (
     TIKTOKEN_CACHE_DIR,
     OPENAI_EMBEDDING_CONFIG,
     OPENAI_LLM_CONFIG,
+    EMBEDDING_BATCH_SIZE,
 )
 
 
@@ -17,19 +28,113 @@ def setup_cache():
 
 setup_cache()
 
+class BatchingEmbeddings(Embeddings):
+    """
+    合并并发单条嵌入请求的代理
+
+    并发的 embed_query 调用先进入队列，由后台线程在短时间窗口内收集，
+    合并为一次 embed_documents 请求，减少嵌入接口的往返次数。
+    其余属性和方法直接委托给被包装的嵌入模型。
+    """
+
+    def __init__(self, embeddings: Embeddings, max_batch_size: int = EMBEDDING_BATCH_SIZE,
+                 max_wait: float = 0.01):
+        """
+        参数:
+            embeddings: 被包装的嵌入模型
+            max_batch_size: 单次合并请求的最大文本数
+            max_wait: 收到第一条请求后等待更多请求的最长时间（秒）
+        """
+        self.embeddings = embeddings
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait
+        self._queue = queue.Queue()
+        self._worker = None
+        self._worker_lock = threading.Lock()
+
+    def __getattr__(self, name):
+        if name == "embeddings":
+            raise AttributeError(name)
+        return getattr(self.embeddings, name)
+
+    def _ensure_worker(self):
+        """按需启动后台合并线程"""
+        if self._worker is not None:
+            return
+        with self._worker_lock:
+            if self._worker is None:
+                worker = threading.Thread(
+                    target=self._run, name="embedding-batcher", daemon=True
+                )
+                worker.start()
+                self._worker = worker
+
+    def _run(self):
+        """后台线程：收集一个时间窗口内的请求并批量计算"""
+        while True:
+            batch = [self._queue.get()]
+            # 时间窗口从收到第一条请求起算，持续到达的请求不会无限延长等待
+            deadline = time.monotonic() + self.max_wait
+            try:
+                while len(batch) < self.max_batch_size:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                pass
+
+            texts = [text for text, _ in batch]
+            try:
+                vectors = self.embeddings.embed_documents(texts)
+            except Exception as exc:
+                for _, future in batch:
+                    future.set_exception(exc)
+                continue
+            for (_, future), vector in zip(batch, vectors):
+                future.set_result(vector)
+
+    def _submit(self, text: str) -> Future:
+        """提交单条文本，返回其向量的 Future"""
+        self._ensure_worker()
+        future = Future()
+        self._queue.put((text, future))
+        return future
+
+    def embed_query(self, text: str) -> List[float]:
+        return self._submit(text).result()
+
+    async def aembed_query(self, text: str) -> List[float]:
+        return await asyncio.wrap_future(self._submit(text))
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self.embeddings.embed_documents(texts)
+
+    async def aembed_documents(self, texts: List[str]) -> List[List[float]]:
+        return await self.embeddings.aembed_documents(texts)
+
+
+# 配置在进程内不变，导入时过滤掉未设置的项
+_EMBEDDING_CONFIG = {k: v for k, v in OPENAI_EMBEDDING_CONFIG.items() if v}
+_LLM_CONFIG = {k: v for k, v in OPENAI_LLM_CONFIG.items() if v is not None and v != ""}
+
+
+@lru_cache(maxsize=1)
 def get_embeddings_model():
-    config = {k: v for k, v in OPENAI_EMBEDDING_CONFIG.items() if v}
-    return OpenAIEmbeddings(**config)
+    """获取进程内共享的嵌入模型，并发的单条查询会被合并为批量请求"""
+    return BatchingEmbeddings(OpenAIEmbeddings(**_EMBEDDING_CONFIG))
 
 
+@lru_cache(maxsize=1)
 def get_llm_model():
-    config = {k: v for k, v in OPENAI_LLM_CONFIG.items() if v is not None and v != ""}
-    return ChatOpenAI(**config)
+    """获取进程内共享的 LLM 模型，复用其 HTTP 连接池"""
+    return ChatOpenAI(**_LLM_CONFIG)
 
 
+@lru_cache(maxsize=1)
 def get_llm_model_with_streaming():
-    """获取支持流式输出的 LLM 模型"""
-    config = {k: v for k, v in OPENAI_LLM_CONFIG.items() if v is not None and v != ""}
+    """获取进程内共享的支持流式输出的 LLM 模型"""
+    config = dict(_LLM_CONFIG)
 
     # LangChain 1.0+ 中，流式处理使用 callbacks 参数
     config["streaming"] = True
@@ -41,6 +146,35 @@ def get_llm_model_with_streaming():
 get_stream_llm_model = get_llm_model_with_streaming
 
 
+_CJK_RE = re.compile(r'[\u4e00-\u9fff]')
+
+
+@lru_cache(maxsize=4)
+def _get_hf_tokenizer(name: str):
+    """加载并缓存 transformers 分词器，不可用时返回 None"""
+    try:
+        from transformers import AutoTokenizer
+        return AutoTokenizer.from_pretrained(name)
+    except Exception:
+        return None
+
+
+@lru_cache(maxsize=4)
+def _get_tiktoken_encoding(model: str):
+    """加载并缓存 tiktoken 编码器，不可用时返回 None"""
+    try:
+        import tiktoken
+        return tiktoken.encoding_for_model(model)
+    except Exception:
+        return None
+
+
+def _estimate_tokens(text: str) -> int:
+    """无分词器时的粗略估算：中文字符按每字一个token，其余按每4个字符一个token"""
+    cjk_count = len(_CJK_RE.findall(text))
+    return cjk_count + (len(text) - cjk_count) // 4
+
+
 def count_tokens(text):
     """简单通用的token计数"""
     if not text:
@@ -49,18 +183,15 @@ def count_tokens(text):
     model_name = (OPENAI_LLM_CONFIG.get("model") or "").lower()
     
     # 如果是deepseek，使用transformers
-    if 'deepseek' in model_name:
-        try:
-            from transformers import AutoTokenizer
-            tokenizer = AutoTokenizer.from_pretrained("deepseek-ai/DeepSeek-V2.5")
-            return len(tokenizer.encode(text))
-        except:
-            pass
+    encoder = _get_hf_tokenizer("deepseek-ai/DeepSeek-V2.5") if 'deepseek' in model_name else None
     
     # 默认使用 tiktoken
+    if encoder is None:
+        encoder = _get_tiktoken_encoding("gpt-4o")
+    
+    if encoder is None:
+        return _estimate_tokens(text)
     try:
-        import tiktoken
-        enc = tiktoken.encoding_for_model("gpt-4o")
-        return len(enc.encode(text))
-    except:
-        return len(text) // 4  # 粗略估算
+        return len(encoder.encode(text))
+    except Exception:
+        return _estimate_tokens(text)
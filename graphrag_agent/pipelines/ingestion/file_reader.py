@@ -93,18 +93,23 @@ class FileReader:
         results = []
         
         try:
-            # 遍历目录内容
-            for item in os.listdir(root_dir):
-                item_path = os.path.join(root_dir, item)
+            # 遍历目录内容：scandir在列目录时即返回条目类型，无需对每个条目再stat
+            with os.scandir(root_dir) as entries:
+                # 先取出全部条目再关闭句柄，避免递归时同时占用多层目录句柄
+                entries = list(entries)
+            
+            for entry in entries:
+                item = entry.name
+                item_path = entry.path
                 
                 # 如果是目录，递归处理
-                if os.path.isdir(item_path):
+                if entry.is_dir():
                     print(f"递归进入子目录: {item_path}")
                     sub_results = self._read_files_recursive(item_path, file_extensions, supported_extensions)
                     results.extend(sub_results)
                 
                 # 如果是文件，处理文件
-                elif os.path.isfile(item_path):
+                elif entry.is_file():
                     file_ext = os.path.splitext(item)[1].lower()
                     
                     if file_ext in file_extensions:
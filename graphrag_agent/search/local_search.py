@@ -1,7 +1,8 @@
-from typing import Dict, Any
+from typing import Dict, Any, List
 import pandas as pd
 from neo4j import Result
 from langchain_community.vectorstores import Neo4jVector
+from langchain_community.vectorstores.neo4j_vector import dict_to_yaml_str
 from langchain_core.prompts import ChatPromptTemplate
 from langchain_core.output_parsers import StrOutputParser
 from graphrag_agent.config.prompts import LC_SYSTEM_PROMPT, LOCAL_SEARCH_CONTEXT_PROMPT
@@ -93,6 +94,32 @@ class LocalSearch:
         return """
         WITH collect(node) as nodes
         WITH
+        """ + self._context_projection + """, 1.0 AS score, {} AS metadata
+        """
+    
+    @property
+    def batch_retrieval_query(self) -> str:
+        """
+        获取批量检索的Neo4j查询语句
+        
+        通过UNWIND在一次查询中对每个查询向量执行向量检索，并按与retrieval_query相同的方式
+        组装上下文，每个查询返回一行，queryIndex为该查询在输入列表中的位置
+        
+        返回:
+            str: Cypher查询语句
+        """
+        return """
+        UNWIND range(0, size($embeddings) - 1) AS i
+        CALL db.index.vector.queryNodes($indexName, $k, $embeddings[i]) YIELD node, score
+        WITH i, collect(node) as nodes
+        WITH i,
+        """ + self._context_projection + """, i AS queryIndex
+        """
+    
+    @property
+    def _context_projection(self) -> str:
+        """由实体节点集合nodes组装文本块、社区报告、关系和实体描述的查询片段"""
+        return """
         collect {
             UNWIND nodes as n
             MATCH (n)<-[:MENTIONS]-(c:__Chunk__)
@@ -134,8 +161,7 @@ class LocalSearch:
             Reports: report_mapping, 
             Relationships: outsideRels + insideRels, 
             Entities: entities
-        } AS text, 1.0 AS score, {} AS metadata
-        """
+        } AS text"""
     
     def as_retriever(self, **kwargs):
         """
@@ -167,6 +193,40 @@ class LocalSearch:
             search_kwargs={"k": self.top_entities}
         )
         
+    def retrieve_batch(self, queries: List[str]) -> List[str]:
+        """
+        批量检索多个查询的上下文
+        
+        一次嵌入请求生成全部查询向量，再通过UNWIND在一次Neo4j往返中完成所有向量检索，
+        代替逐个查询的检索请求
+        
+        参数:
+            queries: 查询字符串列表
+            
+        返回:
+            List[str]: 与queries一一对应的上下文文本，未检索到内容时为空字符串
+        """
+        if not queries:
+            return []
+        
+        records, _, _ = self.driver.execute_query(
+            self.batch_retrieval_query,
+            parameters_={
+                "embeddings": self.embeddings.embed_documents(queries),
+                "indexName": self.index_name,
+                "k": self.top_entities,
+                "topChunks": self.top_chunks,
+                "topCommunities": self.top_communities,
+                "topOutsideRels": self.top_outside_rels,
+                "topInsideRels": self.top_inside_rels,
+            }
+        )
+        
+        contexts = [""] * len(queries)
+        for record in records:
+            contexts[record["queryIndex"]] = dict_to_yaml_str(record["text"])
+        return contexts
+        
     def search(self, query: str) -> str:
         """
         执行本地搜索
@@ -81,6 +81,13 @@ class LocalSearchTool(BaseSearchTool):
         ])
         
         self.keyword_chain = self.keyword_prompt | self.llm | StrOutputParser()
+        
+        # 创建批量查询使用的问答链，上下文由LocalSearch.retrieve_batch批量检索
+        batch_prompt = ChatPromptTemplate.from_messages([
+            ("system", LC_SYSTEM_PROMPT),
+            ("human", LOCAL_SEARCH_CONTEXT_PROMPT),
+        ])
+        self.batch_answer_chain = batch_prompt | self.llm | StrOutputParser()
     
     def extract_keywords(self, query: str) -> Dict[str, List[str]]:
         """
@@ -157,6 +164,50 @@ class LocalSearchTool(BaseSearchTool):
         structured = self.structured_search(query_input)
         return structured.get("answer", "未找到相关信息")
 
+    def search_batch(self, queries: List[str]) -> List[str]:
+        """
+        批量执行本地搜索，返回与queries一一对应的纯文本答案
+        
+        未命中缓存的查询通过LocalSearch.retrieve_batch在一次Neo4j往返中完成检索，
+        再并发生成答案。批量查询彼此独立，不使用聊天历史改写查询。
+        
+        参数:
+            queries: 查询字符串列表
+            
+        返回:
+            List[str]: 各查询的答案
+        """
+        overall_start = time.time()
+        answers = [self.cache_manager.get(query) for query in queries]
+        pending = [i for i, answer in enumerate(answers) if answer is None]
+        if not pending:
+            return answers
+        
+        pending_queries = [queries[i] for i in pending]
+        try:
+            query_start = time.time()
+            contexts = self.local_searcher.retrieve_batch(pending_queries)
+            self.performance_metrics["query_time"] = time.time() - query_start
+            
+            llm_start = time.time()
+            results = self.batch_answer_chain.batch([
+                {"context": context, "input": query, "response_type": "多个段落"}
+                for query, context in zip(pending_queries, contexts)
+            ])
+            self.performance_metrics["llm_time"] = time.time() - llm_start
+        except Exception as e:
+            print(f"批量本地搜索失败，改为逐个查询: {e}")
+            results = [self.search(query) for query in pending_queries]
+        else:
+            for query, answer in zip(pending_queries, results):
+                self.cache_manager.set(query, answer)
+        
+        for i, answer in zip(pending, results):
+            answers[i] = answer
+        
+        self.performance_metrics["total_time"] = time.time() - overall_start
+        return answers
+
     def structured_search(self, query_input: Any) -> Dict[str, Any]:
         """
         执行本地搜索并返回结构化结果，包含标准化的RetrievalResult。
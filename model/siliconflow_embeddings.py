@@ -1,9 +1,45 @@
 """SiliconFlow嵌入模型支持"""
-import requests
+import asyncio
+import hashlib
+import json
+import logging
+import random
+import threading
+from collections import OrderedDict
+import httpx
 import numpy as np
-from typing import List, Optional
+from typing import List, Optional, Tuple
 from langchain_core.embeddings import Embeddings
 
+# HTTP/2需要h2包（httpx[http2]），未安装时退回HTTP/1.1连接池
+try:
+    import h2  # noqa: F401
+    HTTP2_AVAILABLE = True
+except ImportError:
+    HTTP2_AVAILABLE = False
+
+try:
+    import orjson
+    ORJSON_AVAILABLE = True
+except ImportError:
+    ORJSON_AVAILABLE = False
+
+# 可选的磁盘缓存，使嵌入结果在进程重启后仍可复用
+try:
+    import diskcache
+    DISKCACHE_AVAILABLE = True
+except ImportError:
+    DISKCACHE_AVAILABLE = False
+
+# 进程内嵌入缓存："模型:文本sha1" -> float32向量，按访问顺序LRU淘汰，所有实例共享
+_EMBEDDING_CACHE = OrderedDict()
+_EMBEDDING_CACHE_LOCK = threading.Lock()
+
+
+def _loads_json(content: bytes):
+    """解析JSON响应体，安装了orjson时使用其C实现"""
+    return orjson.loads(content) if ORJSON_AVAILABLE else json.loads(content)
+
 
 class SiliconFlowEmbeddings(Embeddings):
     """SiliconFlow嵌入模型"""
@@ -13,14 +49,59 @@ class SiliconFlowEmbeddings(Embeddings):
         model: str = "BAAI/bge-m3",
         api_key: Optional[str] = None,
         base_url: str = "https://api.siliconflow.cn/v1",
+        batch_size: int = 64,
+        max_concurrency: int = 5,
+        max_retries: int = 3,
+        cache_size: int = 4096,
+        cache_dir: Optional[str] = None,
     ):
         self.model = model
         self.api_key = api_key
         self.base_url = base_url.rstrip('/')
         self.url = f"{self.base_url}/embeddings"
+        self.batch_size = batch_size
+        self.max_concurrency = max_concurrency
+        self.max_retries = max_retries
+        self.cache_size = cache_size
+        self._dim = None  # 首次响应后记录向量维度
+        
+        self._disk_cache = None
+        if cache_dir:
+            if DISKCACHE_AVAILABLE:
+                self._disk_cache = diskcache.Cache(cache_dir)
+            else:
+                logging.warning("未安装diskcache，嵌入缓存仅保存在内存中")
         
-    def _call_api(self, texts: List[str]) -> List[List[float]]:
-        """调用SiliconFlow API"""
+        # httpx异步客户端绑定创建它的事件循环，因此由一个后台事件循环线程独占持有，
+        # 同步和异步接口都把请求提交到该循环，所有子批次复用同一组连接
+        self._aclient = None
+        self._loop = None
+        self._loop_lock = threading.Lock()
+    
+    def _get_loop(self) -> asyncio.AbstractEventLoop:
+        """获取（必要时启动）后台事件循环"""
+        with self._loop_lock:
+            if self._loop is None or self._loop.is_closed():
+                loop = asyncio.new_event_loop()
+                threading.Thread(target=loop.run_forever, daemon=True).start()
+                self._loop = loop
+            return self._loop
+    
+    def _get_aclient(self) -> httpx.AsyncClient:
+        """获取异步HTTP客户端，只在后台事件循环中调用"""
+        if self._aclient is None:
+            self._aclient = httpx.AsyncClient(
+                http2=HTTP2_AVAILABLE,
+                timeout=60,
+                limits=httpx.Limits(
+                    max_connections=self.max_concurrency,
+                    max_keepalive_connections=self.max_concurrency
+                )
+            )
+        return self._aclient
+    
+    async def _apost_batch(self, texts: List[str]) -> np.ndarray:
+        """发送单个子批次请求，429/5xx时按Retry-After或指数退避重试"""
         payload = {
             "model": self.model,
             "input": texts
@@ -30,27 +111,180 @@ class SiliconFlowEmbeddings(Embeddings):
             "Content-Type": "application/json"
         }
         
-        response = requests.post(self.url, json=payload, headers=headers)
+        client = self._get_aclient()
+        for attempt in range(self.max_retries + 1):
+            response = await client.post(self.url, json=payload, headers=headers)
+            if response.status_code != 429 and response.status_code < 500:
+                break
+            if attempt < self.max_retries:
+                retry_after = response.headers.get("Retry-After")
+                try:
+                    delay = float(retry_after)
+                except (TypeError, ValueError):
+                    delay = 2 ** attempt
+                await asyncio.sleep(delay)
         
         if response.status_code != 200:
             raise Exception(f"API错误: {response.status_code}, {response.text}")
         
-        result = response.json()
+        result = _loads_json(response.content)
         if "data" not in result:
             raise Exception(f"API返回格式错误: {result}")
         
-        return [item["embedding"] for item in result["data"]]
+        # 直接写入连续的float32矩阵，避免保留逐个装箱的Python浮点数
+        data = result["data"]
+        if self._dim is None and data:
+            self._dim = len(data[0]["embedding"])
+        embeddings = np.empty((len(data), self._dim or 0), dtype=np.float32)
+        for i, item in enumerate(data):
+            embeddings[i] = item["embedding"]
+        return embeddings
+    
+    async def _acall_api(self, texts: List[str]) -> np.ndarray:
+        """按batch_size切分子批次并发请求，结果按输入顺序返回，只在后台事件循环中调用"""
+        if len(texts) <= self.batch_size:
+            return await self._apost_batch(texts)
+        
+        semaphore = asyncio.Semaphore(self.max_concurrency)
+        
+        async def post_with_limit(batch: List[str]) -> np.ndarray:
+            # 少量随机抖动，避免并发请求同时到达触发限流
+            await asyncio.sleep(random.uniform(0, 0.05))
+            async with semaphore:
+                return await self._apost_batch(batch)
+        
+        offsets = range(0, len(texts), self.batch_size)
+        results = await asyncio.gather(*[
+            post_with_limit(texts[offset:offset + self.batch_size])
+            for offset in offsets
+        ])
+        
+        return np.vstack(results)
+    
+    def _call_api(self, texts: List[str]) -> np.ndarray:
+        """调用SiliconFlow API，阻塞等待后台事件循环返回结果"""
+        return asyncio.run_coroutine_threadsafe(self._acall_api(texts), self._get_loop()).result()
+    
+    async def _aembed(self, texts: List[str]) -> np.ndarray:
+        """在调用方的事件循环中等待后台事件循环返回结果"""
+        future = asyncio.run_coroutine_threadsafe(self._acall_api(texts), self._get_loop())
+        return await asyncio.wrap_future(future)
+    
+    def _cache_key(self, text: str) -> str:
+        """缓存键：模型名和文本sha1"""
+        return f"{self.model}:{hashlib.sha1(text.encode('utf-8')).hexdigest()}"
+    
+    def _cache_get(self, key: str) -> Optional[np.ndarray]:
+        """依次查询内存缓存和磁盘缓存，磁盘命中时回填内存"""
+        with _EMBEDDING_CACHE_LOCK:
+            vector = _EMBEDDING_CACHE.get(key)
+            if vector is not None:
+                _EMBEDDING_CACHE.move_to_end(key)
+                return vector
+        
+        if self._disk_cache is not None:
+            vector = self._disk_cache.get(key)
+            if vector is not None:
+                self._cache_put(key, vector, persist=False)
+                return vector
+        return None
+    
+    def _cache_put(self, key: str, vector: np.ndarray, persist: bool = True):
+        """写入内存缓存，超出容量时淘汰最久未使用的条目；persist为True时同时写入磁盘缓存"""
+        with _EMBEDDING_CACHE_LOCK:
+            _EMBEDDING_CACHE[key] = vector
+            _EMBEDDING_CACHE.move_to_end(key)
+            while len(_EMBEDDING_CACHE) > self.cache_size:
+                _EMBEDDING_CACHE.popitem(last=False)
+        
+        if persist and self._disk_cache is not None:
+            try:
+                self._disk_cache.set(key, vector)
+            except Exception as e:
+                logging.warning(f"写入嵌入磁盘缓存失败: {e}")
+    
+    def _split_cached(self, texts: List[str]) -> Tuple[List, OrderedDict]:
+        """
+        用缓存填充结果
+        
+        返回:
+            Tuple[List, OrderedDict]: 与texts对齐的向量列表（未命中处为None），
+                以及未命中文本到其在texts中位置的映射（相同文本只请求一次）
+        """
+        embeddings = [None] * len(texts)
+        misses = OrderedDict()
+        for i, text in enumerate(texts):
+            vector = self._cache_get(self._cache_key(text))
+            if vector is not None:
+                embeddings[i] = vector
+            else:
+                misses.setdefault(text, []).append(i)
+        return embeddings, misses
+    
+    def _merge_fetched(self, embeddings: List, misses: OrderedDict, fetched: np.ndarray) -> np.ndarray:
+        """将API返回的未命中结果写入缓存并放回对应位置，拼接为矩阵"""
+        for (text, indices), embedding in zip(misses.items(), fetched):
+            # 复制出独立的行，避免缓存条目持有整个批次矩阵
+            embedding = embedding.copy()
+            self._cache_put(self._cache_key(text), embedding)
+            for i in indices:
+                embeddings[i] = embedding
+        return self._stack(embeddings)
+    
+    def _stack(self, embeddings: List[np.ndarray]) -> np.ndarray:
+        """拼接为(n, dim)的float32矩阵"""
+        if not embeddings:
+            return np.empty((0, self._dim or 0), dtype=np.float32)
+        return np.vstack(embeddings)
+    
+    def embed_documents_np(self, texts: List[str]) -> np.ndarray:
+        """嵌入文档列表并返回float32矩阵，只请求缓存未命中的文本"""
+        embeddings, misses = self._split_cached(texts)
+        if misses:
+            return self._merge_fetched(embeddings, misses, self._call_api(list(misses)))
+        return self._stack(embeddings)
+    
+    async def aembed_documents_np(self, texts: List[str]) -> np.ndarray:
+        """异步嵌入文档列表并返回float32矩阵，只请求缓存未命中的文本"""
+        embeddings, misses = self._split_cached(texts)
+        if misses:
+            return self._merge_fetched(embeddings, misses, await self._aembed(list(misses)))
+        return self._stack(embeddings)
     
     def embed_documents(self, texts: List[str]) -> List[List[float]]:
         """嵌入文档列表"""
-        return self._call_api(texts)
+        return self.embed_documents_np(texts).tolist()
     
     def embed_query(self, text: str) -> List[float]:
         """嵌入单个查询"""
-        return self._call_api([text])[0]
+        return self.embed_documents_np([text])[0].tolist()
+    
+    async def aembed_documents(self, texts: List[str]) -> List[List[float]]:
+        """异步嵌入文档列表"""
+        return (await self.aembed_documents_np(texts)).tolist()
+    
+    async def aembed_query(self, text: str) -> List[float]:
+        """异步嵌入单个查询"""
+        return (await self.aembed_documents_np([text]))[0].tolist()
+    
+    async def aclose(self):
+        """关闭HTTP客户端并停止后台事件循环"""
+        with self._loop_lock:
+            loop, self._loop = self._loop, None
+        if loop is None:
+            return
+        
+        async def close_client():
+            if self._aclient is not None:
+                await self._aclient.aclose()
+                self._aclient = None
+        
+        await asyncio.wrap_future(asyncio.run_coroutine_threadsafe(close_client(), loop))
+        loop.call_soon_threadsafe(loop.stop)
 
 
-def get_siliconflow_embeddings(model: str = "BAAI/bge-m3", api_key: str = None, base_url: str = None):
+def get_siliconflow_embeddings(model: str = "BAAI/bge-m3", api_key: str = None, base_url: str = None,
+                               cache_dir: str = None):
     """获取SiliconFlow嵌入模型实例"""
     import os
     from dotenv import load_dotenv
@@ -61,4 +295,5 @@ def get_siliconflow_embeddings(model: str = "BAAI/bge-m3", api_key: str = None,
         model=model or os.getenv('OPENAI_EMBEDDINGS_MODEL', 'BAAI/bge-m3'),
         api_key=api_key or os.getenv('OPENAI_API_KEY'),
         base_url=base_url or os.getenv('OPENAI_BASE_URL', 'https://api.siliconflow.cn/v1'),
+        cache_dir=cache_dir,
     )
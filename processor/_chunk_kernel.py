@@ -0,0 +1,68 @@
+import numpy as np
+
+try:
+    from numba import njit
+    NUMBA_AVAILABLE = True
+except ImportError:
+    NUMBA_AVAILABLE = False
+
+
+def _compute_spans(n_tokens: int, ends_idx: np.ndarray, chunk_size: int, overlap: int, slack: int = 100) -> np.ndarray:
+    """
+    计算分块窗口，逻辑与ChineseTextChunker原有的逐块循环一致
+
+    Args:
+        n_tokens: token总数
+        ends_idx: 句子结束符位置，升序int64数组
+        chunk_size: 每个文本块的目标大小
+        overlap: 相邻文本块的重叠大小
+        slack: 为了在句子边界结束，允许块超出chunk_size的最大token数
+
+    Returns:
+        (n_chunks, 2)的int64数组，每行为[start, end)
+    """
+    # 每轮起点至少前进1，块数不超过token数
+    spans = np.empty((n_tokens + 1, 2), dtype=np.int64)
+    n_spans = 0
+    n_ends = ends_idx.shape[0]
+    start = 0
+
+    while start < n_tokens:
+        # 如果不是最后一块，尝试在句子边界结束
+        end = min(start + chunk_size, n_tokens)
+        if end < n_tokens:
+            idx = np.searchsorted(ends_idx, end)
+            sentence_end = ends_idx[idx] + 1 if idx < n_ends else n_tokens
+            if sentence_end <= start + chunk_size + slack:
+                end = sentence_end
+
+        if end > start:
+            spans[n_spans, 0] = start
+            spans[n_spans, 1] = end
+            n_spans += 1
+
+        if end >= n_tokens:
+            break
+
+        # 计算下一块的起始位置（考虑重叠），优先从重叠区之前最近的句子边界开始
+        overlap_start = max(start, end - overlap)
+        idx = np.searchsorted(ends_idx, overlap_start) - 1
+        next_sentence_start = ends_idx[idx] + 1 if idx >= 0 else 0
+
+        if start < next_sentence_start < end:
+            start = next_sentence_start
+        else:
+            start = overlap_start
+
+        if start >= end:
+            start = end
+
+    return spans[:n_spans]
+
+
+if NUMBA_AVAILABLE:
+    compute_spans = njit(cache=True)(_compute_spans)
+    # 导入时先编译一次，避免首次分块时的JIT延迟
+    compute_spans(1, np.zeros(0, dtype=np.int64), 2, 1, 100)
+else:
+    compute_spans = _compute_spans
@@ -1,7 +1,13 @@
+import os
 import re
-from typing import List, Tuple
+import sys
+from itertools import islice
+from typing import Iterator, List, Tuple
+
+import numpy as np
 
 from config.settings import CHUNK_SIZE, OVERLAP, MAX_TEXT_LENGTH
+from processor._chunk_kernel import compute_spans
 
 try:
     import hanlp
@@ -15,11 +21,23 @@ try:
 except ImportError:
     JIEBA_AVAILABLE = False
 
+# 句子结束符
+_SENT_END_SET = frozenset({'。', '！', '？', '.', '!', '?'})
+_SENT_END_RE = re.compile(r'[。！？.!?]')
+
+# Jieba并行分词按行拆分文本并分发到进程池，短文本走进程池反而更慢
+_JIEBA_PARALLEL_MIN_LENGTH = 20000
+_jieba_parallel_enabled = False
+
+# 流式预处理时每次批量分词的段落数
+_TOKENIZE_BATCH_SIZE = 16
+
 
 class ChineseTextChunker:
     """中文文本分块器，将长文本分割成带有重叠的文本块"""
 
-    def __init__(self, chunk_size: int = CHUNK_SIZE, overlap: int = OVERLAP, max_text_length: int = MAX_TEXT_LENGTH):
+    def __init__(self, chunk_size: int = CHUNK_SIZE, overlap: int = OVERLAP, max_text_length: int = MAX_TEXT_LENGTH,
+                 jieba_parallel: bool = False):
         """
         初始化分块器
 
@@ -27,6 +45,8 @@ class ChineseTextChunker:
             chunk_size: 每个文本块的目标大小（tokens数量）
             overlap: 相邻文本块的重叠大小（tokens数量）
             max_text_length: 最大文本长度
+            jieba_parallel: 是否开启Jieba多进程并行分词。开启时会fork子进程并替换全局的jieba.cut，
+                只应在未启动其他线程的独立分块进程中使用
         """
         if chunk_size <= overlap:
             raise ValueError("chunk_size必须大于overlap")
@@ -43,9 +63,23 @@ class ChineseTextChunker:
         elif JIEBA_AVAILABLE:
             print("使用Jieba分词器")
             self.use_hanlp = False
+            self._init_jieba(jieba_parallel)
         else:
             raise ImportError("需要安装hanlp或jieba")
 
+    @staticmethod
+    def _init_jieba(parallel: bool = False):
+        """预先加载Jieba词典，避免首次分词时的冷启动延迟；按需在POSIX平台上开启并行分词"""
+        global _jieba_parallel_enabled
+        jieba.initialize()
+        # enable_parallel依赖fork，Windows下不可用；它会替换模块级的jieba.cut，只需开启一次
+        if parallel and os.name != 'nt' and not _jieba_parallel_enabled:
+            try:
+                jieba.enable_parallel(min(4, os.cpu_count() or 1))
+                _jieba_parallel_enabled = True
+            except Exception as e:
+                print(f"开启Jieba并行分词失败: {e}")
+
     def process_files(self, file_contents: List[Tuple[str, str]]) -> List[Tuple[str, str, List[List[str]]]]:
         """
         处理多个文件的内容
@@ -66,24 +100,38 @@ class ChineseTextChunker:
         """
         预处理过大的文本，将其分割成较小的段落
         """
+        return list(self._iter_segments(text))
+
+    @staticmethod
+    def _iter_paragraphs(text: str, separator: str) -> Iterator[str]:
+        """按分隔符逐个切出段落，不预先生成完整的段落列表"""
+        start = 0
+        while True:
+            end = text.find(separator, start)
+            if end == -1:
+                yield text[start:]
+                return
+            yield text[start:end]
+            start = end + len(separator)
+
+    def _iter_segments(self, text: str) -> Iterator[str]:
+        """
+        逐个产出预处理后的文本段落，内存占用只与目标段落大小相关
+        """
         if len(text) <= self.max_text_length:
-            return [text]
+            yield text
+            return
 
         # 计算合适的段落大小
         target_segment_size = min(self.max_text_length, max(10000, self.max_text_length // 2))
 
-        # 首先按段落分割
-        paragraphs = text.split('\n\n')
-
-        # 如果段落数量很少，尝试按单个换行符分割
-        if len(paragraphs) < 5:
-            paragraphs = text.split('\n')
+        # 首先按段落分割；如果段落数量很少（少于5段），尝试按单个换行符分割
+        separator = '\n\n' if text.count('\n\n') >= 4 else '\n'
 
         # 重新组合段落
-        processed_segments = []
         current_segment = ""
 
-        for para in paragraphs:
+        for para in self._iter_paragraphs(text, separator):
             para = para.strip()
             if not para:
                 continue
@@ -91,16 +139,15 @@ class ChineseTextChunker:
             # 如果当前段落本身就超长
             if len(para) > target_segment_size:
                 if current_segment:
-                    processed_segments.append(current_segment)
+                    yield current_segment
                     current_segment = ""
 
-                split_paras = self._split_long_paragraph(para, target_segment_size)
-                processed_segments.extend(split_paras)
+                yield from self._split_long_paragraph(para, target_segment_size)
 
             else:
                 if len(current_segment) + len(para) + 2 > target_segment_size:
                     if current_segment:
-                        processed_segments.append(current_segment)
+                        yield current_segment
                     current_segment = para
                 else:
                     if current_segment:
@@ -109,25 +156,20 @@ class ChineseTextChunker:
                         current_segment = para
 
         if current_segment:
-            processed_segments.append(current_segment)
-
-        return processed_segments
+            yield current_segment
 
     def _split_long_paragraph(self, text: str, max_size: int) -> List[str]:
         """分割超长段落"""
         if len(text) <= max_size:
             return [text]
 
-        # 按句子分割
-        sentences = re.split(r'([。！？.!?])', text)
-
-        # 重新组合句子和标点
-        combined_sentences = []
-        for i in range(0, len(sentences) - 1, 2):
-            sentence = sentences[i]
-            punctuation = sentences[i + 1] if i + 1 < len(sentences) else ""
-            if sentence.strip():
-                combined_sentences.append(sentence + punctuation)
+        # 单次扫描得到各句子结束位置，直接按偏移切出带标点的句子（含最后一个标点之后的剩余文本）
+        offsets = [match.end() for match in _SENT_END_RE.finditer(text)]
+        combined_sentences = [
+            text[start:end]
+            for start, end in zip([0] + offsets, offsets + [len(text)])
+            if text[start:end].strip()
+        ]
 
         if not combined_sentences:
             result = []
@@ -165,18 +207,38 @@ class ChineseTextChunker:
         try:
             if len(text) > self.max_text_length:
                 # 对于超长文本，简单按字符分割
-                return list(text)
+                return self._intern_tokens(list(text))
 
             if self.use_hanlp:
                 tokens = self.tokenizer(text)
-            else:
-                # 使用jieba分词
+            elif _jieba_parallel_enabled and len(text) >= _JIEBA_PARALLEL_MIN_LENGTH:
+                # 长文本使用并行分词
                 tokens = list(jieba.cut(text))
+            else:
+                # 使用jieba默认分词器，lcut直接返回列表
+                tokens = jieba.dt.lcut(text)
 
-            return tokens if tokens else []
+            return self._intern_tokens(tokens)
         except Exception as e:
             print(f"分词失败: {e}，使用简单字符分割")
-            return list(text)
+            return self._intern_tokens(list(text))
+
+    @staticmethod
+    def _intern_tokens(tokens: List[str]) -> List[str]:
+        """
+        驻留token字符串，重复出现的词共用同一个对象，减少分块结果的内存占用。
+        动态驻留的字符串在不再被引用时会被回收，因此无需额外的淘汰机制。
+        """
+        return [sys.intern(token) for token in tokens] if tokens else []
+
+    def _safe_tokenize_batch(self, texts: List[str]) -> List[List[str]]:
+        """批量分词，HanLP一次处理全部文本，失败时逐条回退"""
+        if self.use_hanlp and all(len(text) <= self.max_text_length for text in texts):
+            try:
+                return [self._intern_tokens(tokens) for tokens in self.tokenizer(texts)]
+            except Exception as e:
+                print(f"批量分词失败: {e}，逐段分词")
+        return [self._safe_tokenize(text) for text in texts]
 
     def chunk_text(self, text: str) -> List[List[str]]:
         """
@@ -186,14 +248,18 @@ class ChineseTextChunker:
             tokens = self._safe_tokenize(text)
             return [tokens] if tokens else []
 
-        # 预处理过大文本
-        text_segments = self._preprocess_large_text(text)
+        # 流式预处理过大文本，按小批量分词和分块
+        text_segments = self._iter_segments(text)
 
         # 处理每个文本段落
         all_chunks = []
-        for segment in text_segments:
-            segment_chunks = self._chunk_single_segment(segment)
-            all_chunks.extend(segment_chunks)
+        while True:
+            batch = list(islice(text_segments, _TOKENIZE_BATCH_SIZE))
+            if not batch:
+                break
+            for tokens in self._safe_tokenize_batch(batch):
+                segment_chunks = self._chunk_tokens(tokens)
+                all_chunks.extend(segment_chunks)
 
         return all_chunks
 
@@ -203,59 +269,20 @@ class ChineseTextChunker:
             return []
 
         # 先将整个文本分词
-        all_tokens = self._safe_tokenize(text)
+        return self._chunk_tokens(self._safe_tokenize(text))
+
+    def _chunk_tokens(self, all_tokens: List[str]) -> List[List[str]]:
+        """将单个文本段落的分词结果分块"""
         if not all_tokens:
             return []
 
-        chunks = []
-        start_pos = 0
-
-        while start_pos < len(all_tokens):
-            # 确定当前块的结束位置
-            end_pos = min(start_pos + self.chunk_size, len(all_tokens))
-
-            # 如果不是最后一块，尝试在句子边界结束
-            if end_pos < len(all_tokens):
-                sentence_end = self._find_next_sentence_end(all_tokens, end_pos)
-                if sentence_end <= start_pos + self.chunk_size + 100:
-                    end_pos = sentence_end
-
-            # 提取当前块
-            chunk = all_tokens[start_pos:end_pos]
-            if chunk:
-                chunks.append(chunk)
-
-            if end_pos >= len(all_tokens):
-                break
-
-            # 计算下一块的起始位置（考虑重叠）
-            overlap_start = max(start_pos, end_pos - self.overlap)
-            next_sentence_start = self._find_previous_sentence_end(all_tokens, overlap_start)
-
-            if next_sentence_start > start_pos and next_sentence_start < end_pos:
-                start_pos = next_sentence_start
-            else:
-                start_pos = overlap_start
-
-            if start_pos >= end_pos:
-                start_pos = end_pos
+        # 预先记录所有句子结束符的位置，查找句子边界时二分查找
+        ends_idx = np.array([i for i, token in enumerate(all_tokens) if token in _SENT_END_SET], dtype=np.int64)
 
-        return chunks
+        # 窗口计算在_chunk_kernel中完成（安装numba时为JIT编译的机器码），这里只做切片
+        spans = compute_spans(len(all_tokens), ends_idx, self.chunk_size, self.overlap)
+        return [all_tokens[start:end] for start, end in spans.tolist()]
 
     def _is_sentence_end(self, token: str) -> bool:
         """判断token是否为句子结束符"""
-        return token in ['。', '！', '？', '.', '!', '?']
-
-    def _find_next_sentence_end(self, tokens: List[str], start_pos: int) -> int:
-        """从指定位置向后查找句子结束位置"""
-        for i in range(start_pos, len(tokens)):
-            if self._is_sentence_end(tokens[i]):
-                return i + 1
-        return len(tokens)
-
-    def _find_previous_sentence_end(self, tokens: List[str], start_pos: int) -> int:
-        """从指定位置向前查找句子结束位置"""
-        for i in range(start_pos - 1, -1, -1):
-            if self._is_sentence_end(tokens[i]):
-                return i + 1
-        return 0
+        return token in _SENT_END_SET
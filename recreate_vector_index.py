@@ -3,59 +3,185 @@
 Recreate Neo4j vector index with correct retrieval query using OPTIONAL MATCH
 """
 import os
+from tqdm import tqdm
 from model.get_models import get_embeddings_model
 from config.neo4jdb import get_db_manager
 from langchain_community.vectorstores import Neo4jVector
 
-# Get the corrected retrieval query
-def get_retrieval_query():
-    return """
+# Indexes backing the MATCH clauses of the retrieval query. They mirror the
+# (unnamed) indexes created by the indexing pipeline, so IF NOT EXISTS is a
+# no-op on a fully built graph; a uniqueness constraint on __Entity__.id would
+# clash with the existing range index on the same property.
+SUPPORTING_INDEXES = [
+    "CREATE INDEX IF NOT EXISTS FOR (e:`__Entity__`) ON (e.id)",
+    "CREATE INDEX IF NOT EXISTS FOR (c:`__Chunk__`) ON (c.id)",
+    "CREATE INDEX IF NOT EXISTS FOR (c:`__Community__`) ON (c.community_rank)",
+]
+
+def create_supporting_indexes(db_manager):
+    for query in SUPPORTING_INDEXES:
+        db_manager.execute_query(query)
+    # Block until the new indexes are online so the first queries use them
+    db_manager.execute_query("CALL db.awaitIndexes(300)")
+
+# Base vector index options, accepted by every Neo4j 5.x release
+VECTOR_INDEX_CONFIG = {
+    "vector.similarity_function": "cosine",
+}
+
+# HNSW build parameters and INT8 quantization for the entity vector index.
+# Quantized vectors cut the memory traffic of every probe, but these keys are
+# only accepted from Neo4j 5.23 on; older servers reject the whole CREATE.
+VECTOR_INDEX_TUNING_CONFIG = {
+    "vector.quantization.enabled": True,
+    "vector.hnsw.m": 16,
+    "vector.hnsw.ef_construction": 200,
+}
+VECTOR_INDEX_TUNING_MIN_VERSION = (5, 23)
+
+# Neo4j has no per-query efSearch; langchain's effective_search_ratio widens
+# the HNSW candidate list to k * ratio before keeping the top k.
+EFFECTIVE_SEARCH_RATIO = 10
+
+def get_server_version(db_manager):
+    result = db_manager.execute_query(
+        "CALL dbms.components() YIELD name, versions "
+        "WHERE name = 'Neo4j Kernel' RETURN versions[0] AS version"
+    )
+    version = str(result["version"][0])
+    return tuple(int(part) for part in version.split("-")[0].split(".")[:2])
+
+def get_vector_index_config(db_manager, dimensions):
+    config = {**VECTOR_INDEX_CONFIG, "vector.dimensions": dimensions}
+    try:
+        version = get_server_version(db_manager)
+    except Exception as e:
+        print(f"Could not read Neo4j version ({e}), creating index without HNSW tuning")
+        return config
+    if version >= VECTOR_INDEX_TUNING_MIN_VERSION:
+        config.update(VECTOR_INDEX_TUNING_CONFIG)
+    else:
+        print(f"Neo4j {version[0]}.{version[1]} predates 5.23, creating index without HNSW tuning")
+    return config
+
+def create_vector_index(db_manager, dimensions, index_name='vector'):
+    # Options are resolved against the server version before the old index is
+    # dropped, so the CREATE below only uses keys this server accepts
+    config = get_vector_index_config(db_manager, dimensions)
+    create_query = f"""
+        CREATE VECTOR INDEX {index_name} IF NOT EXISTS
+        FOR (e:`__Entity__`) ON (e.embedding)
+        OPTIONS {{indexConfig: $config}}
+        """
+    db_manager.execute_query(f"DROP INDEX {index_name} IF EXISTS")
+    try:
+        db_manager.execute_query(create_query, {"config": config})
+    except Exception as e:
+        if not any(key in config for key in VECTOR_INDEX_TUNING_CONFIG):
+            raise
+        # Never leave the graph without a vector index: retry with base options
+        print(f"Tuned vector index rejected ({e}), retrying without HNSW tuning")
+        base_config = {k: v for k, v in config.items() if k not in VECTOR_INDEX_TUNING_CONFIG}
+        db_manager.execute_query(create_query, {"config": base_config})
+    db_manager.execute_query("CALL db.awaitIndexes(300)")
+
+# Entities without an embedding are embedded and written back in pages of this
+# size: one embed_documents call and one UNWIND write per page.
+EMBEDDING_BACKFILL_BATCH_SIZE = 1000
+
+def _entity_text(row):
+    # Same text the indexing pipeline embeds: id and description joined
+    parts = [value for value in (row["id"], row["description"]) if isinstance(value, str) and value]
+    return " ".join(parts).strip() or f"entity_{row['neo4j_id']}"
+
+def backfill_missing_embeddings(db_manager, embeddings, batch_size=EMBEDDING_BACKFILL_BATCH_SIZE):
+    missing = db_manager.execute_query(
+        "MATCH (e:`__Entity__`) WHERE e.embedding IS NULL RETURN count(e) AS missing"
+    )["missing"][0]
+    if not missing:
+        return 0
+
+    # Keyset pagination on id(e): rows drop out of the IS NULL filter once
+    # written, so SKIP-based paging would skip unprocessed entities
+    last_id = -1
+    written = 0
+    with tqdm(total=int(missing), desc="Embedding entities") as progress:
+        while True:
+            rows = db_manager.execute_query(
+                """
+                MATCH (e:`__Entity__`)
+                WHERE e.embedding IS NULL AND id(e) > $last_id
+                RETURN id(e) AS neo4j_id, e.id AS id, e.description AS description
+                ORDER BY neo4j_id
+                LIMIT $limit
+                """,
+                {"last_id": last_id, "limit": batch_size}
+            ).to_dict("records")
+            if not rows:
+                break
+
+            vectors = embeddings.embed_documents([_entity_text(row) for row in rows])
+            db_manager.execute_query(
+                """
+                UNWIND $rows AS row
+                MATCH (e) WHERE id(e) = row.id
+                SET e.embedding = row.embedding
+                """,
+                {"rows": [
+                    {"id": int(row["neo4j_id"]), "embedding": vector}
+                    for row, vector in zip(rows, vectors)
+                ]}
+            )
+
+            last_id = int(rows[-1]["neo4j_id"])
+            written += len(rows)
+            progress.update(len(rows))
+    return written
+
+# Retrieval query, kept as one constant string so Neo4j's plan cache (keyed by
+# query text) reuses the compiled plan; the result limits are parameters that
+# every similarity search must supply, e.g. params=RETRIEVAL_QUERY_PARAMS.
+_RETRIEVAL_QUERY = """
     WITH collect(node) as nodes
-    WITH
-    collect {
-        UNWIND nodes as n
-        MATCH (n)<-[:MENTIONS]-(c:__Chunk__)
-        WITH distinct c, count(distinct n) as freq
-        RETURN {id:c.id, text: c.text} AS chunkText
-        ORDER BY freq DESC
-        LIMIT 3
-    } AS text_mapping,
-    collect {
-        UNWIND nodes as n
-        OPTIONAL MATCH (n)-[:IN_COMMUNITY]->(c:__Community__)
-        WITH distinct c, c.community_rank as rank, c.weight AS weight
-        WHERE c IS NOT NULL
-        RETURN c.summary
-        ORDER BY rank, weight DESC
-        LIMIT 3
-    } AS report_mapping,
-    collect {
-        UNWIND nodes as n
-        MATCH (n)-[r]-(m:__Entity__)
-        WHERE NOT m IN nodes
-        RETURN r.description AS descriptionText
-        ORDER BY r.weight DESC
-        LIMIT 10
-    } as outsideRels,
-    collect {
-        UNWIND nodes as n
-        MATCH (n)-[r]-(m:__Entity__)
-        WHERE m IN nodes
-        RETURN r.description AS descriptionText
-        ORDER BY r.weight DESC
-        LIMIT 10
-    } as insideRels,
-    collect {
-        UNWIND nodes as n
-        RETURN n.description AS descriptionText
-    } as entities
+    // Single pass over the hit entities: pattern comprehensions expand each
+    // neighbourhood once without the cross product of chained OPTIONAL MATCHes
+    UNWIND nodes as n
+    WITH nodes,
+        apoc.coll.toSet([(n:__Entity__)<-[:MENTIONS]-(c:__Chunk__) | c]) AS chunks,
+        [(n:__Entity__)-[:IN_COMMUNITY]->(c:__Community__) | c] AS communities,
+        [(n:__Entity__)-[r]-(m:__Entity__) | {
+            description: r.description,
+            weight: coalesce(r.weight, 0),
+            inside: m IN nodes
+        }] AS rels
+    WITH nodes,
+        apoc.coll.flatten(collect(chunks)) AS chunkHits,
+        apoc.coll.toSet(apoc.coll.flatten(collect(communities))) AS communities,
+        apoc.coll.sortMulti(apoc.coll.flatten(collect(rels)), ['weight']) AS rels
+    // chunks were de-duplicated per entity, so frequency = number of mentioning entities
+    WITH nodes, rels,
+        [hit IN apoc.coll.sortMulti(apoc.coll.frequencies(chunkHits), ['count'], $chunk_limit)
+            | {id: hit.item.id, text: hit.item.text}] AS text_mapping,
+        [c IN apoc.coll.sortMulti(
+            [c IN communities | {
+                summary: c.summary,
+                rank: coalesce(c.community_rank, 0),
+                weight: coalesce(c.weight, 0)
+            }], ['^rank', 'weight'], $community_limit) | c.summary] AS report_mapping
     RETURN {
         Chunks: text_mapping,
         Reports: report_mapping,
-        Relationships: outsideRels + insideRels,
-        Entities: entities
+        Relationships: [rel IN rels WHERE NOT rel.inside | rel.description][..$rel_limit]
+            + [rel IN rels WHERE rel.inside | rel.description][..$rel_limit],
+        Entities: [n IN nodes | n.description]
     } AS text, 1.0 AS score, {} AS metadata
-    """
+"""
+
+RETRIEVAL_QUERY_PARAMS = {"chunk_limit": 3, "community_limit": 3, "rel_limit": 10}
+
+# Get the corrected retrieval query
+def get_retrieval_query():
+    return _RETRIEVAL_QUERY
 
 def main():
     print("Creating Neo4jVector with correct retrieval query...")
@@ -68,13 +194,25 @@ def main():
     db_manager = get_db_manager()
     print(f"DB Manager: {type(db_manager)}")
 
-    # Create Neo4jVector store which will create the index with the correct query
+    print("Creating supporting indexes...")
+    create_supporting_indexes(db_manager)
+
+    print("Backfilling missing entity embeddings...")
+    backfilled = backfill_missing_embeddings(db_manager, embeddings)
+    print(f"Embedded {backfilled} entities")
+
+    print("Recreating quantized vector index...")
+    dimensions = len(embeddings.embed_query("dimension probe"))
+    create_vector_index(db_manager, dimensions)
+
+    # Attach a Neo4jVector store with the correct retrieval query to the index
     vector_store = Neo4jVector.from_existing_embeddings(
         embeddings,
         url=db_manager.neo4j_uri,
         username=db_manager.neo4j_username,
         password=db_manager.neo4j_password,
         index_name='vector',
+        node_label='__Entity__',
         retrieval_query=get_retrieval_query(),
         embedding_property="embedding"
     )
@@ -84,7 +222,10 @@ def main():
 
     # Test the index
     print("\nTesting vector index...")
-    docs = vector_store.similarity_search("旷课学时", k=2)
+    docs = vector_store.similarity_search(
+        "旷课学时", k=2, effective_search_ratio=EFFECTIVE_SEARCH_RATIO,
+        params=RETRIEVAL_QUERY_PARAMS
+    )
     print(f"Found {len(docs)} results:")
     for i, doc in enumerate(docs[:2]):
         print(f"{i+1}. {doc.page_content[:100]}...")
@@ -1,16 +1,22 @@
 # 搜索模块初始化文件
 # 包含基础搜索类和高级搜索工具类
 
-# 导出主要类
-from search.local_search import LocalSearch
-from search.global_search import GlobalSearch
+# 导出的类按需导入：各搜索工具依赖LLM、Neo4j驱动和嵌入模型，
+# 首次访问某个名称时才导入其所在模块，避免导入包时加载全部工具
+import importlib
 
-# 导出工具类
-from search.tool.local_search_tool import LocalSearchTool
-from search.tool.global_search_tool import GlobalSearchTool
-from search.tool.hybrid_tool import HybridSearchTool
-from search.tool.naive_search_tool import NaiveSearchTool
-from search.tool.deep_research_tool import DeepResearchTool
+_LAZY_IMPORTS = {
+    # 导出主要类
+    "LocalSearch": "search.local_search",
+    "GlobalSearch": "search.global_search",
+
+    # 导出工具类
+    "LocalSearchTool": "search.tool.local_search_tool",
+    "GlobalSearchTool": "search.tool.global_search_tool",
+    "HybridSearchTool": "search.tool.hybrid_tool",
+    "NaiveSearchTool": "search.tool.naive_search_tool",
+    "DeepResearchTool": "search.tool.deep_research_tool",
+}
 
 __all__ = [
     "LocalSearch",
@@ -20,4 +26,16 @@ __all__ = [
     "HybridSearchTool",
     "NaiveSearchTool",
     "DeepResearchTool"
-]
\ No newline at end of file
+]
+
+
+def __getattr__(name):
+    if name in _LAZY_IMPORTS:
+        value = getattr(importlib.import_module(_LAZY_IMPORTS[name]), name)
+        globals()[name] = value
+        return value
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+def __dir__():
+    return sorted(set(globals()) | set(__all__))
@@ -1,13 +1,18 @@
 # 搜索工具初始化文件
 # 包含各种搜索工具类
 
-from search.tool.base import BaseSearchTool
-from search.tool.local_search_tool import LocalSearchTool
-from search.tool.global_search_tool import GlobalSearchTool
-from search.tool.hybrid_tool import HybridSearchTool
-from search.tool.naive_search_tool import NaiveSearchTool
-from search.tool.deep_research_tool import DeepResearchTool
-from search.tool.deeper_research_tool import DeeperResearchTool
+# 工具类按需导入，首次访问某个名称时才导入其所在模块
+import importlib
+
+_LAZY_IMPORTS = {
+    "BaseSearchTool": "search.tool.base",
+    "LocalSearchTool": "search.tool.local_search_tool",
+    "GlobalSearchTool": "search.tool.global_search_tool",
+    "HybridSearchTool": "search.tool.hybrid_tool",
+    "NaiveSearchTool": "search.tool.naive_search_tool",
+    "DeepResearchTool": "search.tool.deep_research_tool",
+    "DeeperResearchTool": "search.tool.deeper_research_tool",
+}
 
 __all__ = [
     "BaseSearchTool",
@@ -17,4 +22,16 @@ __all__ = [
     "NaiveSearchTool",
     "DeepResearchTool",
     "DeeperResearchTool",
-]
\ No newline at end of file
+]
+
+
+def __getattr__(name):
+    if name in _LAZY_IMPORTS:
+        value = getattr(importlib.import_module(_LAZY_IMPORTS[name]), name)
+        globals()[name] = value
+        return value
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+def __dir__():
+    return sorted(set(globals()) | set(__all__))
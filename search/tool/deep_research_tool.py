@@ -13,7 +13,8 @@ from search.tool.hybrid_tool import HybridSearchTool
 from search.tool.local_search_tool import LocalSearchTool
 from search.tool.global_search_tool import GlobalSearchTool
 from config.reasoning_prompts import BEGIN_SEARCH_QUERY, BEGIN_SEARCH_RESULT, END_SEARCH_RESULT, MAX_SEARCH_LIMIT, \
-    END_SEARCH_QUERY, RELEVANT_EXTRACTION_PROMPT, SUB_QUERY_PROMPT, FOLLOWUP_QUERY_PROMPT, FINAL_ANSWER_PROMPT
+    END_SEARCH_QUERY, SUB_QUERY_PROMPT, FOLLOWUP_QUERY_PROMPT, \
+    build_relevant_extraction_prompt, build_final_answer_prompt
 from search.tool.reasoning.nlp import extract_between
 from search.tool.reasoning.prompts import kb_prompt
 from search.tool.reasoning.thinking import ThinkingEngine
@@ -368,7 +369,7 @@ class DeepResearchTool(BaseSearchTool):
         """
         try:
             # 调用LLM生成最终答案
-            response = self.llm.invoke(FINAL_ANSWER_PROMPT.format(
+            response = self.llm.invoke(build_final_answer_prompt(
                 query=query,
                 retrieved_content=retrieved_content,
                 thinking_process=thinking_process
@@ -384,13 +385,22 @@ class DeepResearchTool(BaseSearchTool):
             print(f"[最终答案生成错误] {str(e)}")
             return f"生成最终答案时出错: {str(e)}"
     
-    async def _async_generate_next_query(self):
-        """异步生成下一个查询"""
-        def sync_generate():
-            return self.thinking_engine.generate_next_query()
-            
-        # 在线程池中运行同步代码，避免阻塞事件循环
-        return await asyncio.get_event_loop().run_in_executor(None, sync_generate)
+    async def _async_generate_next_query(self, on_search_query=None):
+        """
+        异步生成下一个查询
+        
+        参数:
+            on_search_query: 流式生成中每出现一个完整搜索查询时的回调
+        """
+        # 流式生成，不阻塞事件循环；LLM不支持流式时思考引擎会退回线程池
+        return await self.thinking_engine.agenerate_next_query(on_search_query)
+
+    @staticmethod
+    def _cancel_prefetched(prefetched_searches: dict):
+        """取消并清空未被使用的预取检索任务"""
+        for task in prefetched_searches.values():
+            task.cancel()
+        prefetched_searches.clear()
 
     async def _async_search(self, query: str):
         """异步执行搜索，避免阻塞事件循环"""
@@ -402,7 +412,7 @@ class DeepResearchTool(BaseSearchTool):
 
     async def _async_extract_info(self, search_query, prev_reasoning, kb_prompt_result):
         """异步提取信息，避免阻塞"""
-        extract_prompt = RELEVANT_EXTRACTION_PROMPT.format(
+        extract_prompt = build_relevant_extraction_prompt(
             prev_reasoning=prev_reasoning,
             search_query=search_query,
             document=kb_prompt_result
@@ -592,7 +602,7 @@ class DeepResearchTool(BaseSearchTool):
                 
                 # 构建提取相关信息的提示
                 kb_prompt_result = "\n".join(kb_prompt(kbinfos, 4096))
-                extract_prompt = RELEVANT_EXTRACTION_PROMPT.format(
+                extract_prompt = build_relevant_extraction_prompt(
                     prev_reasoning=truncated_prev_reasoning,
                     search_query=search_query,
                     document=kb_prompt_result
@@ -815,8 +825,18 @@ class DeepResearchTool(BaseSearchTool):
         # 分组返回初始思考内容
         yield initial_thinking
         
+        # 推理流式生成过程中预先发起的检索，查询 -> 检索任务
+        prefetched_searches = {}
+        
+        def prefetch_search(search_query):
+            if search_query not in prefetched_searches and not self.thinking_engine.has_executed_query(search_query):
+                prefetched_searches[search_query] = asyncio.ensure_future(self._async_search(search_query))
+        
         # 迭代思考过程
         for iteration in range(self.max_iterations):
+            # 丢弃上一轮未被使用的预取检索
+            self._cancel_prefetched(prefetched_searches)
+            
             # 发送迭代进度
             if iteration > 0:
                 yield f"\n\n**正在进行第{iteration + 1}轮思考**...\n\n"
@@ -847,8 +867,8 @@ class DeepResearchTool(BaseSearchTool):
                 query_think = "开始根据分解的子问题进行搜索"
                 yield "\n**开始根据分解的子问题进行初始搜索**...\n"
             else:
-                # 非首轮，使用思考引擎生成下一步查询
-                result = await self._async_generate_next_query()
+                # 非首轮，使用思考引擎生成下一步查询，生成过程中闭合的查询立即开始检索
+                result = await self._async_generate_next_query(on_search_query=prefetch_search)
                 
                 # 处理生成结果
                 if result["status"] == "empty":
@@ -963,9 +983,10 @@ class DeepResearchTool(BaseSearchTool):
                 # 让事件循环有机会执行其他任务
                 await asyncio.sleep(0)
                     
-                # 执行实际搜索
+                # 执行实际搜索，优先使用推理生成期间已发起的检索
                 yield "\n**正在查询知识库**...\n"
-                kbinfos = await self._async_search(search_query)
+                prefetched = prefetched_searches.pop(search_query, None)
+                kbinfos = await (prefetched or self._async_search(search_query))
                     
                 # 检查搜索结果是否为空
                 has_results = (
@@ -1050,6 +1071,8 @@ class DeepResearchTool(BaseSearchTool):
                     think += "\n已收集到足够的信息，可以开始整合分析了。"
                     break
         
+        self._cancel_prefetched(prefetched_searches)
+        
         # 确保至少执行了一次搜索
         if not self.thinking_engine.executed_search_queries:
             no_search_msg = f"\n**无法找到与{query}相关的信息，尝试给出基础回答**...\n"
@@ -18,7 +18,7 @@ from config.settings import (
     entity_types,
     relationship_types
 )
-from config.reasoning_prompts import RELEVANT_EXTRACTION_PROMPT
+from config.reasoning_prompts import build_relevant_extraction_prompt
 from search.tool.reasoning.prompts import kb_prompt
 from graph.extraction.entity_extractor import EntityRelationExtractor
 from search.tool.deep_research_tool import DeepResearchTool
@@ -27,6 +27,7 @@ from search.tool.reasoning.community_enhance import CommunityAwareSearchEnhancer
 from search.tool.reasoning.thinking import ThinkingEngine
 from search.tool.reasoning.kg_builder import DynamicKnowledgeGraphBuilder
 from search.tool.reasoning.evidence import EvidenceChainTracker
+from search.tool.reasoning.extraction_cache import SemanticExtractionCache
 from search.tool.reasoning.chain_of_exploration import ChainOfExplorationSearcher
 from search.tool.reasoning.validator import complexity_estimate
 
@@ -127,6 +128,12 @@ class DeeperResearchTool:
         self._stream_search_cache = {}
         self._stream_thinking_cache = {}
         self._subquery_cache = {}
+        
+        # 检索内容信息提取结果的语义缓存，按文档内容的向量相似度复用提取结果
+        self.extraction_cache = SemanticExtractionCache(
+            self.embeddings,
+            pca_path=os.path.join(self.cache_dir, "extraction_cache_pca.pkl")
+        )
     
     def _log(self, message):
         """记录执行日志"""
@@ -1007,11 +1014,23 @@ class DeeperResearchTool:
                 if not hasattr(self, '_extraction_cache'):
                     self._extraction_cache = {}
                     
-                if extract_cache_key in self._extraction_cache:
-                    summary_think = self._extraction_cache[extract_cache_key]
+                summary_think = self._extraction_cache.get(extract_cache_key)
+                document_vector = None
+                if summary_think is not None:
                     self._log(f"\n[深度研究] 使用缓存的提取结果")
                 else:
-                    extract_prompt = RELEVANT_EXTRACTION_PROMPT.format(
+                    # 文档向量只生成一次，未命中时写入缓存复用
+                    document_vector = self.extraction_cache.embed(kb_prompt_result)
+                    summary_think = self.extraction_cache.get(
+                        search_query, kb_prompt_result,
+                        context=truncated_prev_reasoning, vector=document_vector
+                    )
+                    if summary_think is not None:
+                        self._extraction_cache[extract_cache_key] = summary_think
+                        self._log("\n[深度研究] 检索内容与已分析内容相近，复用提取结果")
+
+                if summary_think is None:
+                    extract_prompt = build_relevant_extraction_prompt(
                         prev_reasoning=truncated_prev_reasoning,
                         search_query=search_query,
                         document=kb_prompt_result
@@ -1027,6 +1046,11 @@ class DeeperResearchTool:
                     summary_think = extraction_msg.content if hasattr(extraction_msg, 'content') else str(extraction_msg)
                     # 缓存提取结果
                     self._extraction_cache[extract_cache_key] = summary_think
+                    if document_vector is not None:
+                        self.extraction_cache.put(
+                            search_query, kb_prompt_result, summary_think,
+                            context=truncated_prev_reasoning, vector=document_vector
+                        )
                 
                 # 保存重要信息
                 has_useful_info = (
@@ -10,6 +10,24 @@ from config.prompt import MAP_SYSTEM_PROMPT, REDUCE_SYSTEM_PROMPT
 from config.settings import gl_description
 from search.tool.base import BaseSearchTool
 
+try:
+    import orjson
+    ORJSON_AVAILABLE = True
+except ImportError:
+    ORJSON_AVAILABLE = False
+
+
+def _loads_json(text: str) -> Any:
+    """解析JSON文本，安装了orjson时使用其C实现"""
+    return orjson.loads(text) if ORJSON_AVAILABLE else json.loads(text)
+
+
+def _dumps_json(obj: Any) -> str:
+    """序列化为JSON字符串（保留中文原文），安装了orjson时使用其C实现"""
+    if ORJSON_AVAILABLE:
+        return orjson.dumps(obj).decode("utf-8")
+    return json.dumps(obj, ensure_ascii=False)
+
 
 class GlobalSearchTool(BaseSearchTool):
     """全局搜索工具，基于知识图谱和Map-Reduce模式实现跨社区的广泛查询"""
@@ -97,7 +115,7 @@ class GlobalSearchTool(BaseSearchTool):
             result = self.keyword_chain.invoke({"query": query})
             
             # 解析JSON结果
-            keywords = json.loads(result)
+            keywords = _loads_json(result)
             
             # 记录LLM处理时间
             self.performance_metrics["llm_time"] = time.time() - llm_start
@@ -229,9 +247,9 @@ class GlobalSearchTool(BaseSearchTool):
         返回:
             str: 最终生成的答案
         """
-        # 调用Reduce链生成最终答案
+        # 调用Reduce链生成最终答案，中间结果一次性序列化为JSON数组
         return self.reduce_chain.invoke({
-            "report_data": intermediate_results,
+            "report_data": _dumps_json(intermediate_results),
             "question": query,
             "response_type": "多个段落",
         })
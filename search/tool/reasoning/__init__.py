@@ -6,6 +6,7 @@ from search.tool.reasoning.search import DualPathSearcher, QueryGenerator
 from search.tool.reasoning.community_enhance import CommunityAwareSearchEnhancer
 from search.tool.reasoning.kg_builder import DynamicKnowledgeGraphBuilder
 from search.tool.reasoning.evidence import EvidenceChainTracker
+from search.tool.reasoning.extraction_cache import SemanticExtractionCache
 
 __all__ = [
     "extract_between",
@@ -20,4 +21,5 @@ __all__ = [
     "CommunityAwareSearchEnhancer",
     "DynamicKnowledgeGraphBuilder",
     "EvidenceChainTracker",
+    "SemanticExtractionCache",
 ]
\ No newline at end of file
@@ -0,0 +1,292 @@
+from collections import OrderedDict
+from typing import Optional
+import hashlib
+import logging
+import os
+import pickle
+import threading
+import time
+
+import faiss
+import numpy as np
+from sklearn.decomposition import IncrementalPCA
+
+
+class SemanticExtractionCache:
+    """
+    检索内容信息提取结果的语义缓存
+
+    以检索到的文档内容的嵌入向量为键：不同子查询经常检索到相同或近似的文档块，
+    命中时直接复用已有的提取结果，省去一次LLM调用。提取结果同时取决于搜索查询和
+    之前的推理内容，因此只在二者都相同的条目之间匹配。
+
+    累积足够样本后用PCA将向量降维，并以8位标量量化重建索引，缩小每次查找比较的数据量；
+    索引只用于召回候选，相似度阈值始终按完整维度向量的余弦相似度判断，
+    不受降维和量化误差影响。
+    """
+
+    def __init__(self, embeddings, similarity_threshold: float = 0.9,
+                 duplicate_threshold: float = 0.95, ttl: float = 300,
+                 max_entries: int = 1000, top_k: int = 3,
+                 reduced_dim: Optional[int] = 128, train_size: int = 1024,
+                 pca_path: Optional[str] = None, quantize: bool = True):
+        """
+        初始化语义提取缓存
+
+        参数:
+            embeddings: 嵌入模型，需提供embed_query方法
+            similarity_threshold: 命中缓存所需的最小余弦相似度
+            duplicate_threshold: 写入时超过该相似度视为同一文档，覆盖原有结果而不新增条目
+            ttl: 条目有效期（秒）
+            max_entries: 最大条目数，超出时淘汰最久未使用的条目
+            top_k: 查找时检索的候选数量
+            reduced_dim: PCA降维后的维度，为None时不降维
+            train_size: 累积多少条写入后拟合PCA（未加载已有模型时）并训练量化器；
+                默认1024条，单次研究会话内即可达到，样本数也足以拟合128维的PCA
+            pca_path: 拟合好的PCA模型保存路径，存在时启动即加载
+            quantize: 是否将索引向量量化为8位
+        """
+        self.embeddings = embeddings
+        self.similarity_threshold = similarity_threshold
+        self.duplicate_threshold = duplicate_threshold
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.top_k = top_k
+        self.reduced_dim = reduced_dim
+        self.train_size = train_size
+        self.pca_path = pca_path
+        self.quantize = quantize
+
+        self._index = None  # 首次写入时按向量维度创建
+        self._entries = OrderedDict()  # 向量ID -> (过期时间, 匹配键, 提取结果, 完整维度向量)，按访问顺序排列
+        self._key_ids = {}  # 匹配键 -> 该键下的向量ID集合，查找时只在这些向量中检索
+        self._next_id = 0
+        self._lock = threading.Lock()
+
+        self._pca = None
+        self._samples = []  # 重建索引前累积的完整维度向量
+        self._compacted = not (reduced_dim or quantize)  # 是否已完成降维/量化重建
+        self._compacting = False  # 是否正在锁外拟合PCA/训练量化器
+        if reduced_dim and pca_path and os.path.exists(pca_path):
+            try:
+                with open(pca_path, 'rb') as f:
+                    self._pca = pickle.load(f)
+            except Exception as e:
+                logging.warning(f"加载PCA模型失败: {e}")
+
+    def embed(self, document: str) -> Optional[np.ndarray]:
+        """
+        生成文档的L2归一化嵌入向量，内积即为余弦相似度
+
+        缓存只是优化，嵌入失败时记录日志并返回None，调用方照常走LLM提取。
+        同一文档先get后put时可复用该向量，避免重复调用嵌入模型。
+
+        参数:
+            document: 检索到的文档内容
+
+        返回:
+            Optional[np.ndarray]: 形状为(1, dim)的向量，失败时返回None
+        """
+        try:
+            vector = np.asarray(self.embeddings.embed_query(document), dtype=np.float32).reshape(1, -1)
+        except Exception as e:
+            logging.warning(f"提取缓存生成嵌入向量失败: {e}")
+            return None
+        faiss.normalize_L2(vector)
+        return vector
+
+    @staticmethod
+    def _match_key(search_query: str, context: str) -> tuple:
+        """搜索查询与推理上下文组成的匹配键，上下文只保存摘要"""
+        return search_query, hashlib.sha256(context.encode("utf-8")).hexdigest()
+
+    @staticmethod
+    def _project_with(pca, vector: np.ndarray) -> np.ndarray:
+        """用给定的PCA将完整维度向量投影到低维空间并重新归一化，pca为None时原样返回"""
+        if pca is None:
+            return vector
+        reduced = pca.transform(vector).astype(np.float32)
+        faiss.normalize_L2(reduced)
+        return reduced
+
+    def _project(self, vector: np.ndarray) -> np.ndarray:
+        """使用当前PCA投影向量"""
+        return self._project_with(self._pca, vector)
+
+    def _discard_mismatched_pca(self, dim: int):
+        """加载的PCA与当前嵌入维度不一致（如更换了嵌入模型）时丢弃，之后按新样本重新拟合"""
+        if self._pca is not None and getattr(self._pca, "n_features_in_", dim) != dim:
+            logging.warning(
+                f"PCA模型输入维度({self._pca.n_features_in_})与嵌入维度({dim})不一致，已丢弃"
+            )
+            self._pca = None
+
+    def _compact_index(self, samples: np.ndarray, pca):
+        """
+        用累积的样本拟合PCA、训练8位标量量化器，并将已有条目迁移到新索引
+
+        拟合和训练在锁外进行，期间查找和写入继续使用旧索引；完成后在锁内一次性切换。
+        """
+        try:
+            fitted = False
+            if pca is None and self.reduced_dim and self.reduced_dim < samples.shape[1]:
+                pca = IncrementalPCA(n_components=self.reduced_dim).fit(samples)
+                fitted = True
+
+            training = self._project_with(pca, samples)
+            dim = training.shape[1]
+            if self.quantize:
+                base_index = faiss.IndexScalarQuantizer(dim, faiss.ScalarQuantizer.QT_8bit, faiss.METRIC_INNER_PRODUCT)
+                base_index.train(training)
+            else:
+                base_index = faiss.IndexFlatIP(dim)
+        except Exception as e:
+            logging.warning(f"提取缓存压缩索引失败，继续使用完整维度索引: {e}")
+            with self._lock:
+                self._compacting = False
+                self._compacted = True
+            return
+
+        with self._lock:
+            index = faiss.IndexIDMap2(base_index)
+            if self._entries:
+                entry_ids = np.array(list(self._entries.keys()), dtype=np.int64)
+                vectors = np.vstack([entry[3] for entry in self._entries.values()])
+                index.add_with_ids(self._project_with(pca, vectors), entry_ids)
+            self._pca = pca
+            self._index = index
+            self._compacting = False
+            self._compacted = True
+
+        if fitted and self.pca_path:
+            try:
+                with open(self.pca_path, 'wb') as f:
+                    pickle.dump(pca, f)
+            except Exception as e:
+                logging.warning(f"保存PCA模型失败: {e}")
+
+    def _best_match(self, full_vector: np.ndarray, key: tuple, threshold: float) -> Optional[int]:
+        """在匹配键相同的未过期条目中查找完整维度相似度不低于阈值的最佳匹配，返回向量ID"""
+        key_ids = self._key_ids.get(key)
+        if self._index is None or not key_ids:
+            return None
+
+        now = time.time()
+        # 先按匹配键限定检索范围，其他查询或推理上下文下缓存的同一文档不会占满候选名额。
+        # 降维/量化后的得分与完整维度余弦相似度不一致，只用来召回候选
+        selector = faiss.IDSelectorBatch(np.fromiter(key_ids, dtype=np.int64, count=len(key_ids)))
+        _, ids = self._index.search(
+            self._project(full_vector), min(self.top_k, len(key_ids)),
+            params=faiss.SearchParameters(sel=selector)
+        )
+        best_id, best_score = None, threshold
+        for entry_id in ids[0]:
+            if entry_id == -1:
+                break
+            entry = self._entries.get(int(entry_id))
+            if entry is None:
+                continue
+            if entry[0] < now:
+                self._remove(int(entry_id))
+                continue
+            score = float(np.dot(full_vector[0], entry[3][0]))
+            if score >= best_score:
+                best_id, best_score = int(entry_id), score
+        return best_id
+
+    def _remove(self, entry_id: int):
+        """删除条目及其向量"""
+        entry = self._entries.pop(entry_id, None)
+        if entry is not None:
+            key_ids = self._key_ids.get(entry[1])
+            if key_ids is not None:
+                key_ids.discard(entry_id)
+                if not key_ids:
+                    del self._key_ids[entry[1]]
+        self._index.remove_ids(np.array([entry_id], dtype=np.int64))
+
+    def _add_entry(self, key: tuple, entry: tuple):
+        """新增条目，超出容量时淘汰最久未使用的条目"""
+        entry_id = self._next_id
+        self._next_id += 1
+        self._index.add_with_ids(self._project(entry[3]), np.array([entry_id], dtype=np.int64))
+        self._entries[entry_id] = entry
+        self._key_ids.setdefault(key, set()).add(entry_id)
+
+        while len(self._entries) > self.max_entries:
+            oldest_id = next(iter(self._entries))
+            self._remove(oldest_id)
+
+    def get(self, search_query: str, document: str, context: str = "",
+            vector: Optional[np.ndarray] = None) -> Optional[str]:
+        """
+        查找与文档内容近似、且搜索查询和推理上下文相同的缓存提取结果
+
+        参数:
+            search_query: 当前搜索查询
+            document: 检索到的文档内容
+            context: 提取提示中使用的之前推理内容
+            vector: 已由embed生成的文档向量，为None时重新生成
+
+        返回:
+            Optional[str]: 缓存的提取结果，未命中或嵌入失败时返回None
+        """
+        full_vector = vector if vector is not None else self.embed(document)
+        if full_vector is None:
+            return None
+        key = self._match_key(search_query, context)
+        with self._lock:
+            entry_id = self._best_match(full_vector, key, self.similarity_threshold)
+            if entry_id is None:
+                return None
+            self._entries.move_to_end(entry_id)
+            return self._entries[entry_id][2]
+
+    def put(self, search_query: str, document: str, result: str, context: str = "",
+            vector: Optional[np.ndarray] = None):
+        """
+        写入提取结果，已存在近似重复的文档时覆盖其结果
+
+        参数:
+            search_query: 当前搜索查询
+            document: 检索到的文档内容
+            result: LLM提取结果
+            context: 提取提示中使用的之前推理内容
+            vector: 已由embed生成的文档向量，为None时重新生成
+        """
+        full_vector = vector if vector is not None else self.embed(document)
+        if full_vector is None:
+            return
+        key = self._match_key(search_query, context)
+        expires_at = time.time() + self.ttl
+        samples = None
+        with self._lock:
+            if self._index is None:
+                self._discard_mismatched_pca(full_vector.shape[1])
+                self._index = faiss.IndexIDMap2(faiss.IndexFlatIP(self._project(full_vector).shape[1]))
+
+            if not self._compacted and not self._compacting:
+                self._samples.append(full_vector)
+                if len(self._samples) >= self.train_size:
+                    samples = np.vstack(self._samples)
+                    self._samples = []
+                    self._compacting = True
+                    pca = self._pca
+
+            entry_id = self._best_match(full_vector, key, self.duplicate_threshold)
+            if entry_id is not None:
+                self._entries[entry_id] = (expires_at, key, result, full_vector)
+                self._entries.move_to_end(entry_id)
+            else:
+                self._add_entry(key, (expires_at, key, result, full_vector))
+
+        if samples is not None:
+            self._compact_index(samples, pca)
+
+    def clear(self):
+        """清空缓存"""
+        with self._lock:
+            self._entries.clear()
+            self._key_ids.clear()
+            if self._index is not None:
+                self._index.reset()
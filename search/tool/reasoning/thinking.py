@@ -1,13 +1,14 @@
 import re
 import json
 import time
-from typing import List, Dict, Any
+import asyncio
+from typing import List, Dict, Any, Callable, Optional
 import logging
 import traceback
 from langchain_core.messages import SystemMessage, HumanMessage, AIMessage
 
-from search.tool.reasoning.nlp import extract_between
-from config.reasoning_prompts import BEGIN_SEARCH_QUERY, BEGIN_SEARCH_RESULT, END_SEARCH_RESULT, REASON_PROMPT, END_SEARCH_QUERY
+from config.reasoning_prompts import BEGIN_SEARCH_QUERY, BEGIN_SEARCH_RESULT, END_SEARCH_RESULT, REASON_PROMPT, END_SEARCH_QUERY, \
+    iter_tags, iter_tag_spans, SearchQueryStreamParser
 
 
 class ThinkingEngine:
@@ -595,8 +596,7 @@ class ThinkingEngine:
         返回:
             str: 移除标签后的文本
         """
-        pattern = re.escape(BEGIN_SEARCH_QUERY) + r"(.*?)" + re.escape(END_SEARCH_QUERY)
-        return re.sub(pattern, "", text, flags=re.DOTALL)
+        return self._remove_tagged(text, BEGIN_SEARCH_QUERY, END_SEARCH_QUERY)
     
     def remove_result_tags(self, text: str) -> str:
         """
@@ -608,8 +608,18 @@ class ThinkingEngine:
         返回:
             str: 移除标签后的文本
         """
-        pattern = re.escape(BEGIN_SEARCH_RESULT) + r"(.*?)" + re.escape(END_SEARCH_RESULT)
-        return re.sub(pattern, "", text, flags=re.DOTALL)
+        return self._remove_tagged(text, BEGIN_SEARCH_RESULT, END_SEARCH_RESULT)
+    
+    @staticmethod
+    def _remove_tagged(text: str, begin_tag: str, end_tag: str) -> str:
+        """移除成对标签及其包围的内容"""
+        parts = []
+        last = 0
+        for start, _, _, stop in iter_tag_spans(text, begin_tag, end_tag):
+            parts.append(text[last:start])
+            last = stop
+        parts.append(text[last:])
+        return "".join(parts)
     
     def extract_queries(self, text: str) -> List[str]:
         """
@@ -621,7 +631,10 @@ class ThinkingEngine:
         返回:
             List[str]: 提取的查询列表
         """
-        return extract_between(text, BEGIN_SEARCH_QUERY, END_SEARCH_QUERY)
+        return [
+            text[content_start:content_end]
+            for _, content_start, content_end, _ in iter_tag_spans(text, BEGIN_SEARCH_QUERY, END_SEARCH_QUERY)
+        ]
     
     def generate_next_query(self) -> Dict[str, Any]:
         """
@@ -637,47 +650,88 @@ class ThinkingEngine:
             # 调用LLM生成查询
             msg = self.llm.invoke(formatted_messages)
             query_think = msg.content if hasattr(msg, 'content') else str(msg)
+            return self._parse_query_think(query_think)
             
-            # 清理响应
-            query_think = re.sub(r"<think>.*</think>", "", query_think, flags=re.DOTALL)
-            if not query_think:
-                return {"status": "empty", "content": None, "queries": []}
-                
-            # 更新思考过程
-            clean_think = self.remove_query_tags(query_think)
-            self.add_reasoning_step(query_think)
-            
-            # 从AI响应中提取搜索查询
-            queries = self.extract_queries(query_think)
-            
-            # 如果没有生成搜索查询，检查是否应该结束
-            if not queries:
-                # 检查是否包含最终答案标记
-                if "**回答**" in query_think or "足够的信息" in query_think:
-                    return {
-                        "status": "answer_ready", 
-                        "content": query_think,
-                        "queries": []
-                    }
-                
-                # 没有明确结束标志，就继续
+        except Exception as e:
+            error_msg = f"生成查询时出错: {str(e)}\n{traceback.format_exc()}"
+            logging.error(error_msg)
+            return {"status": "error", "error": error_msg, "queries": []}
+    
+    async def agenerate_next_query(self, on_search_query: Optional[Callable[[str], None]] = None) -> Dict[str, Any]:
+        """
+        流式生成下一步搜索查询，每闭合一个搜索查询标签立即回调，
+        调用方可在LLM继续生成的同时预先发起检索
+        
+        参数:
+            on_search_query: 发现完整搜索查询时的回调；查询以最终解析结果为准，
+                回调的查询可能因位于<think>块内而最终被丢弃
+            
+        返回:
+            Dict: 包含查询和状态信息的字典，与generate_next_query一致
+        """
+        if not hasattr(self.llm, "astream"):
+            return await asyncio.get_running_loop().run_in_executor(None, self.generate_next_query)
+        
+        formatted_messages = [SystemMessage(content=REASON_PROMPT)] + self.msg_history
+        parser = SearchQueryStreamParser()
+        
+        try:
+            async for chunk in self.llm.astream(formatted_messages):
+                content = chunk.content if hasattr(chunk, 'content') else str(chunk)
+                for query in parser.feed(content):
+                    if on_search_query:
+                        on_search_query(query)
+            return self._parse_query_think(parser.buffer)
+            
+        except Exception as e:
+            error_msg = f"生成查询时出错: {str(e)}\n{traceback.format_exc()}"
+            logging.error(error_msg)
+            return {"status": "error", "error": error_msg, "queries": []}
+    
+    def _parse_query_think(self, query_think: str) -> Dict[str, Any]:
+        """
+        解析LLM推理输出，更新思考过程并提取搜索查询
+        
+        参数:
+            query_think: LLM完整输出
+            
+        返回:
+            Dict: 包含查询和状态信息的字典
+        """
+        # 清理响应
+        query_think = re.sub(r"<think>.*</think>", "", query_think, flags=re.DOTALL)
+        if not query_think:
+            return {"status": "empty", "content": None, "queries": []}
+            
+        # 更新思考过程
+        self.add_reasoning_step(query_think)
+        
+        # 从AI响应中提取搜索查询
+        queries = self.extract_queries(query_think)
+        
+        # 如果没有生成搜索查询，检查是否应该结束
+        if not queries:
+            # 检查是否包含最终答案标记
+            if "**回答**" in query_think or "足够的信息" in query_think:
                 return {
-                    "status": "no_query", 
+                    "status": "answer_ready", 
                     "content": query_think,
                     "queries": []
                 }
             
-            # 有查询，继续搜索
+            # 没有明确结束标志，就继续
             return {
-                "status": "has_query", 
+                "status": "no_query", 
                 "content": query_think,
-                "queries": queries
+                "queries": []
             }
-            
-        except Exception as e:
-            error_msg = f"生成查询时出错: {str(e)}\n{traceback.format_exc()}"
-            logging.error(error_msg)
-            return {"status": "error", "error": error_msg, "queries": []}
+        
+        # 有查询，继续搜索
+        return {
+            "status": "has_query", 
+            "content": query_think,
+            "queries": queries
+        }
     
     def add_ai_message(self, content: str):
         """
@@ -752,7 +806,7 @@ class ThinkingEngine:
         # 包含中间包含搜索查询或结果的步骤
         for i in range(1, len(all_reasoning_steps) - 4):
             step = all_reasoning_steps[i]
-            if BEGIN_SEARCH_QUERY in step or BEGIN_SEARCH_RESULT in step:
+            if any(tag in (BEGIN_SEARCH_QUERY, BEGIN_SEARCH_RESULT) for _, tag in iter_tags(step)):
                 important_steps.append((i, step))
         
         # 按原始顺序排序
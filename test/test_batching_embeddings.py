@@ -0,0 +1,74 @@
+import unittest
+import threading
+import time
+import sys
+sys.path.append('.')
+
+try:
+    from graphrag_agent.models.get_models import BatchingEmbeddings
+    BATCHING_AVAILABLE = True
+except ImportError:
+    BATCHING_AVAILABLE = False
+
+
+class _RecordingEmbeddings:
+    """记录每次批量请求的嵌入模型，向量为文本长度"""
+
+    def __init__(self):
+        self.batches = []
+
+    def embed_documents(self, texts):
+        self.batches.append(list(texts))
+        return [[float(len(text))] for text in texts]
+
+
+@unittest.skipUnless(BATCHING_AVAILABLE, "需要安装langchain_core和langchain_openai")
+class TestBatchingEmbeddings(unittest.TestCase):
+    """并发嵌入请求合并的测试"""
+
+    def test_concurrent_queries_are_batched(self):
+        """并发的单条查询合并为批量请求，且每条查询拿到自己的向量"""
+        inner = _RecordingEmbeddings()
+        embeddings = BatchingEmbeddings(inner, max_batch_size=64, max_wait=0.05)
+        texts = ["a" * i for i in range(1, 21)]
+        results = {}
+
+        def worker(text):
+            results[text] = embeddings.embed_query(text)
+
+        threads = [threading.Thread(target=worker, args=(text,)) for text in texts]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(results, {text: [float(len(text))] for text in texts})
+        self.assertLess(len(inner.batches), len(texts))
+
+    def test_window_is_bounded_from_first_request(self):
+        """持续到达的请求不会延长第一条请求的等待时间"""
+        inner = _RecordingEmbeddings()
+        embeddings = BatchingEmbeddings(inner, max_batch_size=1000, max_wait=0.05)
+        stop = threading.Event()
+
+        def trickle():
+            while not stop.is_set():
+                embeddings._submit("x")
+                time.sleep(0.01)
+
+        feeder = threading.Thread(target=trickle)
+        start = time.monotonic()
+        first = embeddings._submit("first")
+        feeder.start()
+        try:
+            first.result(timeout=1)
+            elapsed = time.monotonic() - start
+        finally:
+            stop.set()
+            feeder.join()
+
+        self.assertLess(elapsed, 0.5)
+
+
+if __name__ == '__main__':
+    unittest.main()
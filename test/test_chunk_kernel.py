@@ -0,0 +1,106 @@
+import unittest
+import random
+import sys
+sys.path.append('.')
+
+import numpy as np
+
+from processor._chunk_kernel import compute_spans, _compute_spans
+
+_SENT_END = ['。', '！', '？', '.', '!', '?']
+
+
+def _reference_spans(tokens, chunk_size, overlap):
+    """原ChineseTextChunker._chunk_single_segment的逐token分块循环，作为对照实现"""
+    def find_next_sentence_end(start_pos):
+        for i in range(start_pos, len(tokens)):
+            if tokens[i] in _SENT_END:
+                return i + 1
+        return len(tokens)
+
+    def find_previous_sentence_end(start_pos):
+        for i in range(start_pos - 1, -1, -1):
+            if tokens[i] in _SENT_END:
+                return i + 1
+        return 0
+
+    spans = []
+    start_pos = 0
+    while start_pos < len(tokens):
+        end_pos = min(start_pos + chunk_size, len(tokens))
+        if end_pos < len(tokens):
+            sentence_end = find_next_sentence_end(end_pos)
+            if sentence_end <= start_pos + chunk_size + 100:
+                end_pos = sentence_end
+
+        if end_pos > start_pos:
+            spans.append((start_pos, end_pos))
+
+        if end_pos >= len(tokens):
+            break
+
+        overlap_start = max(start_pos, end_pos - overlap)
+        next_sentence_start = find_previous_sentence_end(overlap_start)
+        if start_pos < next_sentence_start < end_pos:
+            start_pos = next_sentence_start
+        else:
+            start_pos = overlap_start
+
+        if start_pos >= end_pos:
+            start_pos = end_pos
+
+    return spans
+
+
+def _random_tokens(rng, n_tokens, sentence_end_rate):
+    """生成随机token序列，按给定概率插入句子结束符"""
+    return [
+        rng.choice(_SENT_END) if rng.random() < sentence_end_rate else f"词{rng.randrange(50)}"
+        for _ in range(n_tokens)
+    ]
+
+
+class TestChunkKernel(unittest.TestCase):
+    """分块窗口计算测试"""
+
+    def _assert_parity(self, tokens, chunk_size, overlap):
+        ends_idx = np.array([i for i, token in enumerate(tokens) if token in _SENT_END], dtype=np.int64)
+        expected = _reference_spans(tokens, chunk_size, overlap)
+        for kernel in (compute_spans, _compute_spans):
+            spans = kernel(len(tokens), ends_idx, chunk_size, overlap, 100)
+            self.assertEqual([tuple(span) for span in spans.tolist()], expected)
+
+    def test_parity_with_original_loop(self):
+        """随机文本上与原分块循环的结果完全一致"""
+        rng = random.Random(42)
+        for _ in range(200):
+            n_tokens = rng.randrange(0, 3000)
+            chunk_size = rng.randrange(2, 600)
+            overlap = rng.randrange(0, chunk_size)
+            sentence_end_rate = rng.choice([0.0, 0.005, 0.05, 0.3])
+            self._assert_parity(_random_tokens(rng, n_tokens, sentence_end_rate), chunk_size, overlap)
+
+    def test_edge_cases(self):
+        """空文本、无句子结束符和全部为结束符的情况"""
+        self._assert_parity([], 10, 2)
+        self._assert_parity(["词"] * 1000, 50, 10)
+        self._assert_parity(["。"] * 1000, 50, 10)
+        self._assert_parity(["词"] * 49 + ["。"], 50, 10)
+
+    def test_spans_cover_all_tokens(self):
+        """相邻块首尾相接或重叠，最后一块结束于文本末尾"""
+        rng = random.Random(7)
+        tokens = _random_tokens(rng, 5000, 0.05)
+        ends_idx = np.array([i for i, token in enumerate(tokens) if token in _SENT_END], dtype=np.int64)
+        spans = compute_spans(len(tokens), ends_idx, 500, 100, 100).tolist()
+
+        self.assertEqual(spans[0][0], 0)
+        self.assertEqual(spans[-1][1], len(tokens))
+        for (prev_start, prev_end), (start, end) in zip(spans, spans[1:]):
+            self.assertLess(prev_start, start)
+            self.assertLessEqual(start, prev_end)
+            self.assertLess(start, end)
+
+
+if __name__ == '__main__':
+    unittest.main()
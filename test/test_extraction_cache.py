@@ -0,0 +1,160 @@
+import unittest
+import hashlib
+import os
+import sys
+import tempfile
+from unittest import mock
+sys.path.append('.')
+
+import numpy as np
+
+try:
+    import faiss
+    from search.tool.reasoning.extraction_cache import SemanticExtractionCache
+    EXTRACTION_CACHE_AVAILABLE = True
+except ImportError:
+    EXTRACTION_CACHE_AVAILABLE = False
+
+
+class _FakeEmbeddings:
+    """按文本哈希生成确定性向量的嵌入模型，可为指定文本登记向量"""
+
+    def __init__(self, dim=64, rank=None):
+        self.dim = dim
+        self.vectors = {}
+        # rank不为None时向量都落在rank维子空间内，PCA降到rank维不损失信息
+        self.basis = np.random.RandomState(0).randn(rank, dim) if rank else None
+
+    def _random_vector(self, text):
+        rng = np.random.RandomState(int(hashlib.sha256(text.encode("utf-8")).hexdigest()[:8], 16))
+        if self.basis is None:
+            return rng.randn(self.dim)
+        return rng.randn(self.basis.shape[0]) @ self.basis
+
+    def near(self, text, source, noise=0.05):
+        """为text登记一个与source高度相似的向量"""
+        rng = np.random.RandomState(1)
+        vector = self._random_vector(source)
+        self.vectors[text] = vector + noise * np.linalg.norm(vector) / np.sqrt(self.dim) * rng.randn(self.dim)
+
+    def embed_query(self, text):
+        vector = self.vectors.get(text)
+        if vector is None:
+            vector = self._random_vector(text)
+        return vector.tolist()
+
+
+@unittest.skipUnless(EXTRACTION_CACHE_AVAILABLE, "需要安装faiss、scikit-learn和langchain相关依赖")
+class TestSemanticExtractionCache(unittest.TestCase):
+    """提取结果语义缓存的测试"""
+
+    def setUp(self):
+        self.embeddings = _FakeEmbeddings()
+
+    def test_hit_and_miss(self):
+        """查询、上下文和文档都匹配时命中，任一不同时未命中"""
+        cache = SemanticExtractionCache(self.embeddings)
+        cache.put("查询", "文档A", "结果A", context="推理")
+
+        self.assertEqual(cache.get("查询", "文档A", context="推理"), "结果A")
+        self.assertIsNone(cache.get("查询", "文档B", context="推理"))
+        self.assertIsNone(cache.get("其他查询", "文档A", context="推理"))
+        self.assertIsNone(cache.get("查询", "文档A", context="其他推理"))
+
+    def test_near_duplicate_hit_and_overwrite(self):
+        """近似文档命中已有结果，写入时覆盖原条目而不新增"""
+        self.embeddings.near("文档A'", "文档A")
+        cache = SemanticExtractionCache(self.embeddings)
+        cache.put("查询", "文档A", "结果A")
+
+        self.assertEqual(cache.get("查询", "文档A'"), "结果A")
+        cache.put("查询", "文档A'", "结果B")
+        self.assertEqual(len(cache._entries), 1)
+        self.assertEqual(cache.get("查询", "文档A"), "结果B")
+
+    def test_same_document_under_other_keys(self):
+        """同一文档在其他查询下的大量条目不影响当前查询的命中"""
+        cache = SemanticExtractionCache(self.embeddings, top_k=3)
+        for i in range(10):
+            cache.put(f"查询{i}", "文档", f"结果{i}")
+        cache.put("目标查询", "文档", "目标结果")
+
+        self.assertEqual(cache.get("目标查询", "文档"), "目标结果")
+        for i in range(10):
+            self.assertEqual(cache.get(f"查询{i}", "文档"), f"结果{i}")
+
+    def test_ttl_expiry(self):
+        """超过有效期的条目不再命中并被删除"""
+        now = [1000.0]
+        with mock.patch("search.tool.reasoning.extraction_cache.time.time", side_effect=lambda: now[0]):
+            cache = SemanticExtractionCache(self.embeddings, ttl=60)
+            cache.put("查询", "文档", "结果")
+            now[0] += 59
+            self.assertEqual(cache.get("查询", "文档"), "结果")
+            now[0] += 2
+            self.assertIsNone(cache.get("查询", "文档"))
+            self.assertEqual(len(cache._entries), 0)
+
+    def test_lru_eviction(self):
+        """超出容量时淘汰最久未使用的条目，命中会刷新使用顺序"""
+        cache = SemanticExtractionCache(self.embeddings, max_entries=2)
+        cache.put("查询", "文档A", "结果A")
+        cache.put("查询", "文档B", "结果B")
+        cache.get("查询", "文档A")
+        cache.put("查询", "文档C", "结果C")
+
+        self.assertEqual(len(cache._entries), 2)
+        self.assertEqual(cache.get("查询", "文档A"), "结果A")
+        self.assertIsNone(cache.get("查询", "文档B"))
+        self.assertEqual(cache.get("查询", "文档C"), "结果C")
+
+    def test_compaction_at_train_size(self):
+        """写入达到train_size后降维并量化索引，已有条目仍可命中"""
+        embeddings = _FakeEmbeddings(dim=64, rank=8)
+        cache = SemanticExtractionCache(embeddings, train_size=50, reduced_dim=8)
+        for i in range(49):
+            cache.put("查询", f"文档{i}", f"结果{i}")
+        self.assertEqual(cache._index.d, 64)
+
+        for i in range(49, 60):
+            cache.put("查询", f"文档{i}", f"结果{i}")
+        self.assertEqual(cache._index.d, 8)
+        self.assertIsInstance(faiss.downcast_index(cache._index.index), faiss.IndexScalarQuantizer)
+        self.assertIsNotNone(cache._pca)
+        self.assertEqual(cache._samples, [])
+        for i in range(60):
+            self.assertEqual(cache.get("查询", f"文档{i}"), f"结果{i}")
+
+    def test_pca_reload(self):
+        """保存的PCA模型在新缓存中加载复用，维度不一致时丢弃"""
+        embeddings = _FakeEmbeddings(dim=64, rank=8)
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            pca_path = os.path.join(tmp_dir, "pca.pkl")
+            cache = SemanticExtractionCache(embeddings, train_size=50, reduced_dim=8, pca_path=pca_path)
+            for i in range(50):
+                cache.put("查询", f"文档{i}", f"结果{i}")
+            self.assertTrue(os.path.exists(pca_path))
+
+            reloaded = SemanticExtractionCache(embeddings, reduced_dim=8, pca_path=pca_path)
+            self.assertEqual(reloaded._pca.n_features_in_, 64)
+            reloaded.put("查询", "文档", "结果")
+            self.assertEqual(reloaded._index.d, 8)
+            self.assertEqual(reloaded.get("查询", "文档"), "结果")
+
+            mismatched = SemanticExtractionCache(_FakeEmbeddings(dim=32), reduced_dim=8, pca_path=pca_path)
+            with self.assertLogs(level="WARNING"):
+                mismatched.put("查询", "文档", "结果")
+            self.assertIsNone(mismatched._pca)
+            self.assertEqual(mismatched._index.d, 32)
+            self.assertEqual(mismatched.get("查询", "文档"), "结果")
+
+    def test_clear(self):
+        """清空后所有条目都不再命中"""
+        cache = SemanticExtractionCache(self.embeddings)
+        cache.put("查询", "文档", "结果")
+        cache.clear()
+        self.assertIsNone(cache.get("查询", "文档"))
+
+
+if __name__ == '__main__':
+    unittest.main()
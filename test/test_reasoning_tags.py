@@ -0,0 +1,74 @@
+import unittest
+import random
+import re
+import sys
+sys.path.append('.')
+
+from config.reasoning_prompts import (
+    BEGIN_SEARCH_QUERY, END_SEARCH_QUERY, BEGIN_SEARCH_RESULT, END_SEARCH_RESULT,
+    iter_tags, iter_tag_spans, SearchQueryStreamParser
+)
+
+
+class TestReasoningTags(unittest.TestCase):
+    """推理输出中搜索标签扫描的测试"""
+
+    def setUp(self):
+        self.text = (
+            "先思考一下。"
+            f"{BEGIN_SEARCH_QUERY}第一个查询{END_SEARCH_QUERY}"
+            f"{BEGIN_SEARCH_RESULT}检索结果{END_SEARCH_RESULT}"
+            "继续推理"
+            f"{BEGIN_SEARCH_QUERY}第二个查询{END_SEARCH_QUERY}"
+            f"多余的结束标签{END_SEARCH_QUERY}"
+            f"{BEGIN_SEARCH_QUERY}未闭合的查询"
+        )
+
+    def test_iter_tags_order_and_offsets(self):
+        """按出现顺序返回标签及其结束偏移"""
+        tags = list(iter_tags(self.text))
+        self.assertEqual([tag for _, tag in tags], [
+            BEGIN_SEARCH_QUERY, END_SEARCH_QUERY, BEGIN_SEARCH_RESULT, END_SEARCH_RESULT,
+            BEGIN_SEARCH_QUERY, END_SEARCH_QUERY, END_SEARCH_QUERY, BEGIN_SEARCH_QUERY
+        ])
+        for end, tag in tags:
+            self.assertEqual(self.text[end - len(tag):end], tag)
+
+    def test_iter_tag_spans_matches_non_greedy_regex(self):
+        """起止标签配对结果与非贪婪正则一致"""
+        for begin_tag, end_tag in ((BEGIN_SEARCH_QUERY, END_SEARCH_QUERY),
+                                   (BEGIN_SEARCH_RESULT, END_SEARCH_RESULT)):
+            pattern = re.compile(re.escape(begin_tag) + "(.*?)" + re.escape(end_tag), re.DOTALL)
+            expected = [(m.start(), m.start(1), m.end(1), m.end()) for m in pattern.finditer(self.text)]
+            self.assertEqual(list(iter_tag_spans(self.text, begin_tag, end_tag)), expected)
+
+    def test_stream_parser_matches_full_text(self):
+        """任意切分输入时，流式解析得到的查询与整段解析一致"""
+        expected = [
+            self.text[content_start:content_end]
+            for _, content_start, content_end, _ in iter_tag_spans(self.text, BEGIN_SEARCH_QUERY, END_SEARCH_QUERY)
+        ]
+        self.assertEqual(expected, ["第一个查询", "第二个查询"])
+
+        rng = random.Random(0)
+        for _ in range(100):
+            parser = SearchQueryStreamParser()
+            queries = []
+            position = 0
+            while position < len(self.text):
+                size = rng.randint(1, 8)
+                queries.extend(parser.feed(self.text[position:position + size]))
+                position += size
+            self.assertEqual(queries, expected)
+
+    def test_stream_parser_returns_query_when_closed(self):
+        """结束标签到达时立即返回该查询"""
+        parser = SearchQueryStreamParser()
+        self.assertEqual(parser.feed(f"思考{BEGIN_SEARCH_QUERY}查询"), [])
+        self.assertEqual(parser.feed("内容"), [])
+        self.assertEqual(parser.feed(END_SEARCH_QUERY), ["查询内容"])
+        self.assertEqual(parser.feed(""), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
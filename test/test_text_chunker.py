@@ -0,0 +1,86 @@
+import unittest
+import sys
+sys.path.append('.')
+
+from processor.text_chunker_fallback import ChineseTextChunker
+
+
+def _make_chunker(max_text_length: int) -> ChineseTextChunker:
+    """创建只用于文本切分的分块器，段落与句子切分不依赖分词器，跳过分词器加载"""
+    chunker = ChineseTextChunker.__new__(ChineseTextChunker)
+    chunker.chunk_size = 500
+    chunker.overlap = 100
+    chunker.max_text_length = max_text_length
+    return chunker
+
+
+class TestTextChunker(unittest.TestCase):
+    """中文文本分块器的段落与句子切分测试"""
+
+    def test_split_long_paragraph_keeps_all_text(self):
+        """切分结果按顺序拼接后与原文一致，且每段不超过上限"""
+        chunker = _make_chunker(100000)
+        text = "第一句话。第二句话！" * 40 + "没有标点的一段很长的结尾" * 10
+        segments = chunker._split_long_paragraph(text, 50)
+
+        self.assertEqual("".join(segments), text)
+        self.assertTrue(all(len(segment) <= 50 for segment in segments))
+
+    def test_split_long_paragraph_keeps_text_after_last_terminator(self):
+        """最后一个句子结束符之后的文本不会丢失"""
+        chunker = _make_chunker(100000)
+        segments = chunker._split_long_paragraph("甲乙。丙丁！" * 20 + "尾巴", 30)
+        self.assertTrue(segments[-1].endswith("尾巴"))
+
+    def test_split_long_paragraph_without_terminators(self):
+        """没有句子结束符时按固定长度切分"""
+        chunker = _make_chunker(100000)
+        text = "字" * 125
+        self.assertEqual(chunker._split_long_paragraph(text, 50), [text[:50], text[50:100], text[100:]])
+
+    def test_split_short_paragraph(self):
+        """未超过上限的段落原样返回"""
+        chunker = _make_chunker(100000)
+        self.assertEqual(chunker._split_long_paragraph("短句。", 50), ["短句。"])
+
+    def test_iter_segments_short_text(self):
+        """未超过最大长度的文本作为单个段落返回"""
+        chunker = _make_chunker(100000)
+        self.assertEqual(list(chunker._iter_segments("短文本\n\n第二段")), ["短文本\n\n第二段"])
+
+    def test_iter_segments_regroups_paragraphs(self):
+        """超长文本按段落重新组合，段落内容和顺序保持不变"""
+        chunker = _make_chunker(20000)
+        paragraphs = [f"第{i}段。" + "内容" * (i % 50 + 1) for i in range(2000)]
+        text = "\n\n".join(paragraphs)
+        segments = list(chunker._iter_segments(text))
+
+        target_size = min(20000, max(10000, 20000 // 2))
+        self.assertGreater(len(segments), 1)
+        self.assertTrue(all(len(segment) <= target_size for segment in segments))
+        self.assertEqual("\n\n".join(segments).split("\n\n"), paragraphs)
+        self.assertEqual(chunker._preprocess_large_text(text), segments)
+
+    def test_iter_segments_falls_back_to_single_newline(self):
+        """双换行段落少于5个时改按单个换行切分"""
+        chunker = _make_chunker(20000)
+        lines = [f"第{i}行。" + "文字" * 20 for i in range(1000)]
+        segments = list(chunker._iter_segments("\n".join(lines)))
+
+        self.assertGreater(len(segments), 1)
+        self.assertEqual("\n\n".join(segments).split("\n\n"), lines)
+
+    def test_iter_segments_splits_oversized_paragraph(self):
+        """单个段落超过目标大小时按句子继续切分"""
+        chunker = _make_chunker(20000)
+        long_paragraph = "很长的句子内容。" * 3000
+        text = "\n\n".join(["开头。", long_paragraph, "结尾。"] + ["补充段落。"] * 3)
+        segments = list(chunker._iter_segments(text))
+
+        self.assertEqual(segments[0], "开头。")
+        self.assertTrue(all(len(segment) <= 10000 for segment in segments))
+        self.assertIn(long_paragraph, "".join(segments))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,63 @@
+import unittest
+import sys
+from unittest import mock
+sys.path.append('.')
+
+from agent.utils import TTLCache
+
+
+class TestTTLCache(unittest.TestCase):
+    """带过期时间的LRU缓存测试"""
+
+    def setUp(self):
+        self.now = 1000.0
+        patcher = mock.patch("agent.utils.time.monotonic", side_effect=lambda: self.now)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_get_and_set(self):
+        """基本读写"""
+        cache = TTLCache(maxsize=10, ttl=60)
+        cache["a"] = 1
+        self.assertIn("a", cache)
+        self.assertEqual(cache["a"], 1)
+        self.assertEqual(cache.get("a"), 1)
+        self.assertIsNone(cache.get("b"))
+        self.assertEqual(cache.get("b", "default"), "default")
+        with self.assertRaises(KeyError):
+            cache["b"]
+
+    def test_expiry(self):
+        """超过ttl的项视为不存在并被删除"""
+        cache = TTLCache(maxsize=10, ttl=60)
+        cache["a"] = 1
+        self.now += 59
+        self.assertEqual(cache.get("a"), 1)
+        self.now += 2
+        self.assertNotIn("a", cache)
+        self.assertEqual(len(cache), 0)
+
+    def test_overwrite_refreshes_expiry(self):
+        """重新写入时刷新过期时间"""
+        cache = TTLCache(maxsize=10, ttl=60)
+        cache["a"] = 1
+        self.now += 50
+        cache["a"] = 2
+        self.now += 50
+        self.assertEqual(cache.get("a"), 2)
+
+    def test_lru_eviction(self):
+        """超出容量时淘汰最久未使用的项，读取会刷新使用顺序"""
+        cache = TTLCache(maxsize=2, ttl=60)
+        cache["a"] = 1
+        cache["b"] = 2
+        cache.get("a")
+        cache["c"] = 3
+        self.assertEqual(len(cache), 2)
+        self.assertIn("a", cache)
+        self.assertNotIn("b", cache)
+        self.assertIn("c", cache)
+
+
+if __name__ == '__main__':
+    unittest.main()